@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=[],
+    hiddenimports=['fitz', 'pyarrow', 'pyarrow.parquet'],  # PyMuPDF (report pages) and pyarrow (datasets), imported optionally
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,124 @@
+"""
+Micro-benchmark for the table extraction of get_quantity_over_jv.
+
+Builds a synthetic archive payload (default: 50 000 JV curves) and compares the old row by row
+construction (df.loc[len(df.index)] = row) with extract_quantity_over_jv, which collects the columns first
+and builds the DataFrames once. No server is needed.
+
+run from the repository root:
+    python TestingFolder/benchmark_get_quantity_over_jv.py --curves 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from functions.api_calls_get_data import extract_quantity_over_jv, return_value
+
+KEY = ["peroTF_CR_SpinBox_SpinCoating"]
+QUANTITIES = ["name"]
+JV_QUANTITIES = ["efficiency", "fill_factor", "open_circuit_voltage", "short_circuit_current_density"]
+
+
+def make_payload(n_curves, pixels=4, cycles=5):
+    """creates samples_of_batch and linked archives with n_curves jv curves (2 scan directions per measurement)."""
+    rng = np.random.default_rng(0)
+    n_samples = max(1, n_curves // (pixels * cycles * 2))
+    samples_of_batch = pd.DataFrame({
+        "entry_id": [f"entry_{i}" for i in range(n_samples)],
+        "entry_name": [f"KIT_BENCH_{i}" for i in range(n_samples)],
+    })
+    linked_archives = {}
+    for entry_id in samples_of_batch["entry_id"]:
+        links = [{"archive": {"metadata": {"entry_type": KEY[0]}, "data": {"name": f"spin coating {entry_id}"}}}]
+        for px in range(1, pixels + 1):
+            for cycle in range(1, cycles + 1):
+                curves = [{
+                    "cell_name": f"Current density [{direction}] [mA/cm^2]",
+                    "efficiency": rng.uniform(10, 20),
+                    "fill_factor": rng.uniform(0.5, 0.8),
+                    "open_circuit_voltage": rng.uniform(1.0, 1.2),
+                    "short_circuit_current_density": rng.uniform(18, 22),
+                } for direction in (1, 2)]
+                links.append({"archive": {
+                    "metadata": {"entry_type": "peroTF_JVmeasurement"},
+                    "data": {
+                        "description": f"Notes: px{px} Cycle_{cycle}",
+                        "datetime": "2025-08-21T12:01:28+00:00",
+                        "measurement_programm": "standard",
+                        "jv_curve": curves,
+                    }}})
+        linked_archives[entry_id] = links
+    return samples_of_batch, linked_archives
+
+
+def extract_row_by_row(samples_of_batch, linked_archives, key_1, quantities, jv_quantities):
+    """the previous implementation of get_quantity_over_jv, without the network part."""
+    df_q = pd.DataFrame(columns=["entry_id", "sample_id"] + quantities)
+    df_jv = pd.DataFrame(columns=["entry_id"] + ["px#"] + ['Cycle#'] + ["scan_direction"] + ["datetime"] + ["programm"] + jv_quantities)
+
+    for index, row in samples_of_batch.iterrows():
+        sample_id = row['entry_id']
+        row = {"entry_id": sample_id, "sample_id": row['entry_name']}
+        linked_data = linked_archives[sample_id]
+        for link in linked_data:
+            if any([kk == link["archive"]["metadata"]["entry_type"] for kk in key_1]):
+                data = link["archive"]["data"]
+                for q in quantities:
+                    row.update({q: return_value(data.copy(), q.split("/"))})
+        df_q.loc[len(df_q.index)] = row
+        for link in linked_data:
+            if "JVmeasurement" in link["archive"]["metadata"]["entry_type"]:
+                row = {"entry_id": sample_id}
+                jv_curves = link["archive"]["data"].get("jv_curve")
+                if not jv_curves:
+                    continue
+                for curve in jv_curves:
+                    row['px#'] = link["archive"]["data"]["description"].split(': ')[1][0:3]
+                    row['Cycle#'] = link["archive"]["data"]["description"].split('Cycle_')[1] if 'Cycle_' in link["archive"]["data"]["description"] else None
+                    row["scan_direction"] = (
+                        "backwards" if curve["cell_name"] == "Current density [1] [mA/cm^2]" else
+                        "forwards" if curve["cell_name"] == "Current density [2] [mA/cm^2]" else
+                        None)
+                    row["datetime"] = link["archive"]["data"]["datetime"]
+                    row["programm"] = link["archive"]["data"]["measurement_programm"]
+                    for quantity in jv_quantities:
+                        row.update({quantity: curve.get(quantity)})
+                    df_jv.loc[len(df_jv.index)] = row
+    df_q = df_q.set_index("entry_id")
+    df_jv = df_jv.set_index("entry_id")
+    return df_q.merge(df_jv, on="entry_id")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--curves", type=int, default=50000, help="number of jv curves in the synthetic payload")
+    parser.add_argument("--skip-old", action="store_true", help="only time the new implementation")
+    args = parser.parse_args()
+
+    samples_of_batch, linked_archives = make_payload(args.curves)
+    print(f"{len(samples_of_batch)} samples, {args.curves} jv curves")
+
+    start = time.perf_counter()
+    df_new = extract_quantity_over_jv(samples_of_batch, linked_archives, KEY, QUANTITIES, JV_QUANTITIES)
+    time_new = time.perf_counter() - start
+    print(f"columnar:   {time_new:8.3f} s  ({len(df_new)} rows)")
+
+    if args.skip_old:
+        return
+
+    start = time.perf_counter()
+    df_old = extract_row_by_row(samples_of_batch, linked_archives, KEY, QUANTITIES, JV_QUANTITIES)
+    time_old = time.perf_counter() - start
+    print(f"row by row: {time_old:8.3f} s  ({len(df_old)} rows)")
+
+    pd.testing.assert_frame_equal(df_new, df_old, check_dtype=False, check_index_type=False)
+    print(f"same result, speedup x{time_old / time_new:.1f}")
+
+
+if __name__ == "__main__":
+    main()
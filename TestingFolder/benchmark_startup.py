@@ -0,0 +1,83 @@
+"""
+Startup benchmark for main_gui.
+
+Imports main_gui in a fresh interpreter with "python -X importtime" (the GUI itself is only built under
+__main__, so nothing is opened), prints the slowest imports and checks two things:
+    - the import time of main_gui stays below the budget (--budget, seconds)
+    - none of the heavy libraries (scipy, statsmodels, sympy, PyMuPDF, kedro, matplotlib, openpyxl, numpy, requests, PIL)
+      is loaded at startup
+Exits with 1 if one of the checks fails.
+
+run from the repository root:
+    python TestingFolder/benchmark_startup.py --budget 1.0
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#modules that must only be imported when a function needs them
+HEAVY_MODULES = ["scipy", "statsmodels", "sympy", "fitz", "kedro", "matplotlib", "openpyxl", "numpy", "requests", "PIL"]
+
+
+def run_import(runs):
+    """imports main_gui in a new interpreter, returns the importtime lines and the loaded heavy modules of the fastest run."""
+    check = f"import main_gui, sys; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    best = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", check], cwd=ROOT, capture_output=True, text=True)
+        if result.returncode != 0:
+            error = "\n".join(line for line in result.stderr.splitlines() if not line.startswith("import time:"))
+            sys.exit(f"import main_gui failed:\n{error}")
+        profile = parse_importtime(result.stderr)
+        loaded = [module for module in result.stdout.strip().split(",") if module]
+        if best is None or profile["main_gui"][1] < best[0]["main_gui"][1]:
+            best = (profile, loaded)
+    return best
+
+
+def parse_importtime(output):
+    """returns {module: (self_us, cumulative_us, depth)} of the -X importtime output."""
+    profile = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        profile[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=1.0, help="maximal import time of main_gui in seconds")
+    parser.add_argument("--runs", type=int, default=3, help="number of runs, the fastest one counts")
+    parser.add_argument("--top", type=int, default=15, help="number of imports shown in the profile")
+    args = parser.parse_args()
+
+    profile, loaded = run_import(args.runs)
+    total = profile["main_gui"][1] / 1e6
+    main_depth = profile["main_gui"][2]
+
+    print("slowest imports of main_gui (cumulative):")
+    direct = [(name, values) for name, values in profile.items() if values[2] == main_depth + 1]
+    for name, (self_us, cumulative_us, _) in sorted(direct, key=lambda item: -item[1][1])[:args.top]:
+        print(f"  {cumulative_us / 1e3:9.1f} ms  {name}")
+    print(f"import main_gui: {total:.3f} s (budget {args.budget:.3f} s)")
+
+    failed = False
+    if total > args.budget:
+        print("FAIL: startup is over the budget")
+        failed = True
+    if loaded:
+        print(f"FAIL: heavy modules loaded at startup: {', '.join(loaded)}")
+        failed = True
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
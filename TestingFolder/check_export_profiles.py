@@ -0,0 +1,57 @@
+"""
+Check of the export profile changes of generate_pdf_report (merge_export_profiles).
+
+Both forms of a dpi change ({'svg': {'dpi': 150}} and {'svg': {'savefig': {'dpi': 150}}}) have to reach savefig
+without losing the other savefig options, and the rasterized layer of a dense scatter plot has to get smaller with
+the lower dpi. No server is needed. Exits with 1 if a check fails.
+
+run from the repository root:
+    python TestingFolder/check_export_profiles.py
+"""
+import io
+import os
+import re
+import sys
+
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from functions.generate_report import EXPORT_PROFILES, merge_export_profiles, export_figure
+
+
+def raster_size(fig, profile):
+    """size in bytes of the png images embedded in the svg export."""
+    buffer = io.StringIO()
+    export_figure(fig, buffer, profile)
+    return sum(len(image) for image in re.findall(r'data:image/png;base64,([^"]+)', buffer.getvalue()))
+
+
+def main():
+    failed = []
+    for changes in ({'svg': {'dpi': 150}}, {'svg': {'savefig': {'dpi': 150}}}):
+        savefig = merge_export_profiles(changes)['svg']['savefig']
+        if savefig != {**EXPORT_PROFILES['svg']['savefig'], 'dpi': 150}:
+            failed.append(f"{changes}: savefig is {savefig}")
+    if EXPORT_PROFILES['svg']['savefig']['dpi'] != 300:
+        failed.append("the defaults were changed")
+
+    fig, ax = plt.subplots()
+    ax.scatter(*np.random.default_rng(0).random((2, 20000)))
+    full = raster_size(fig, merge_export_profiles()['svg'])
+    half = raster_size(fig, merge_export_profiles({'svg': {'dpi': 150}})['svg'])
+    print(f"rasterized scatter: {full / 1e3:.0f} kB at 300 dpi, {half / 1e3:.0f} kB at 150 dpi")
+    if not 0 < half < full:
+        failed.append("the dpi change does not reach the rasterized layer")
+
+    for message in failed:
+        print(f"FAIL: {message}")
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
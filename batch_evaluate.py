@@ -0,0 +1,162 @@
+"""
+Headless batch evaluation: Load -> Filter -> Statistics -> Report for one or many Excel files, without the GUI.
+
+Every Excel file is evaluated in its own worker process, the results are written to the output folder:
+    <name>_report.pdf      PDF report (plots selected with --plots)
+    <name>_statistics.csv  statistics per variation (calculate_statistics)
+    <name>_filtered.csv    filtered JV data (with --csv)
+    <name>_hysteresis.csv  hysteresis index of every scan pair and JV metric (with the report part Hysteresis)
+    <name>_mpp_metrics.csv T80/T90, burn-in and decay rates of every MPP entry (with --mpp-metrics)
+
+With --mpp-metrics the metrics of the best MPP entry of every sample are added as columns mpp_<metric> before filtering,
+so the filter can use them too, e.g. {"ranges": {"mpp_T80": [3600, null]}}.
+
+The filter is a JSON file with the form of FilterSpec.to_dict, e.g.
+    {"ranges": {"PCE": [10, null], "FF": [0.6, 0.9]}, "cycles": [1, 2], "best_cycle": true}
+
+Login: --token or the environment variable NOMAD_TOKEN, otherwise --username and the password from
+NOMAD_PASSWORD (or asked on the command line).
+
+example:
+    python batch_evaluate.py batch_1.xlsx batch_2.xlsx -o reports --filter filter.json --workers 2
+"""
+import argparse
+import getpass
+import json
+import multiprocessing
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import matplotlib
+matplotlib.use("Agg")  # no display needed
+
+from functions.api_calls_get_data import get_token, CACHE_MODES
+from functions.archive_cache import ArchiveCache, DEFAULT_CACHE_PATH
+from functions.get_data import get_data_excel_to_df
+from functions.filter_spec import FilterSpec
+from functions.calculate_statistics import calculate_statistics, hysteresis_index
+from functions.generate_report import generate_pdf_report
+from functions.generate_csv_data import generate_csv_filtered_file
+from functions.mpp_metrics import get_mpp_metrics, add_mpp_metrics
+
+NOMAD_URL = "http://elnserver.lti.kit.edu/nomad-oasis/api/v1"
+REPORT_PARTS = ("JV", "Box+Scatter", "SeparateScan", "Hysteresis", "EQE", "MPP", "Table", "Statistics")
+DEFAULT_PARTS = ("JV", "Box+Scatter", "SeparateScan", "Table")
+JV_COLUMNS = ["efficiency", "fill_factor", "open_circuit_voltage", "short_circuit_current_density"]
+
+
+def evaluate_batch(excel_file_path, output_dir, nomad_url, token, filter_spec=None, include_plots=None, cache=None,
+                   cache_mode="revalidate", write_csv=False, mpp_metrics=False):
+    """
+    Runs the whole evaluation of one Excel file: load the data, filter, calculate the statistics and write the report.
+    filter_spec: FilterSpec or None (no filter)
+    include_plots: dict of the report parts like in the GUI, see generate_pdf_report
+    mpp_metrics: add the degradation metrics of the MPP tracking as columns mpp_<metric> and write them as csv
+
+    returns: dict with the written files and the number of rows before and after filtering
+    """
+    name = os.path.splitext(os.path.basename(excel_file_path))[0]
+    os.makedirs(output_dir, exist_ok=True)
+
+    data = get_data_excel_to_df(excel_file_path, nomad_url, token, cache=cache, cache_mode=cache_mode)
+    data[JV_COLUMNS] = data[JV_COLUMNS].replace('nan', np.nan)
+
+    files = {}
+    if mpp_metrics:
+        metrics = get_mpp_metrics(data['sample_id'], nomad_url, token, cache=cache)
+        data = add_mpp_metrics(data, metrics)
+        files["mpp_metrics"] = os.path.join(output_dir, f"{name}_mpp_metrics.csv")
+        metrics.to_csv(files["mpp_metrics"], sep=";", index=False)
+
+    filtered_data = data
+    filter_cycle_boolean = None
+    if filter_spec is not None:
+        # like main_filter: rows without JV values are removed first
+        filtered_data = filter_spec.apply(data.dropna(subset=JV_COLUMNS))
+        filter_cycle_boolean = filter_spec.best_cycle
+
+    stats, best = calculate_statistics(filtered_data)
+
+    files["statistics"] = os.path.join(output_dir, f"{name}_statistics.csv")
+    stats.to_csv(files["statistics"], sep=";", index=False)
+    if write_csv:
+        files["filtered"] = os.path.join(output_dir, f"{name}_filtered.csv")
+        generate_csv_filtered_file(files["filtered"], data, filtered_data)
+    if (include_plots or {}).get("Hysteresis"):
+        files["hysteresis"] = os.path.join(output_dir, f"{name}_hysteresis.csv")
+        hysteresis_index(filtered_data).to_csv(files["hysteresis"], sep=";", index=False)
+
+    # the batches already run in parallel processes, so the figures are rendered in this process
+    directory, file_name = generate_pdf_report(filtered_data, stats, best, include_plots or {}, os.path.join(output_dir, f"{name}_report.pdf"),
+                                               nomad_url, token, filter_cycle_boolean, cache=cache, render_workers=1)
+    files["report"] = os.path.join(directory, file_name)
+    return {"excel": excel_file_path, "files": files, "rows": len(data), "filtered_rows": len(filtered_data)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("excel_files", nargs="+", help="Excel files of the batches")
+    parser.add_argument("-o", "--output-dir", default="reports", help="folder for the reports (default: reports)")
+    parser.add_argument("--filter", help="JSON file with the filter spec (default: no filter)")
+    parser.add_argument("--plots", default=",".join(DEFAULT_PARTS),
+                        help=f"comma separated report parts out of {', '.join(REPORT_PARTS)} (default: %(default)s)")
+    parser.add_argument("--csv", action="store_true", help="write the filtered data as csv too")
+    parser.add_argument("--mpp-metrics", action="store_true", help="add the MPP degradation metrics (T80, burn-in, ...) and write them as csv")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="batches evaluated at the same time")
+    parser.add_argument("--nomad-url", default=NOMAD_URL)
+    parser.add_argument("--token", default=os.environ.get("NOMAD_TOKEN"), help="NOMAD access token (default: $NOMAD_TOKEN)")
+    parser.add_argument("--username", help="NOMAD user name, if no token is given")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="archive cache file, 'none' to switch it off")
+    parser.add_argument("--cache-mode", default="revalidate", choices=CACHE_MODES)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    token = args.token
+    if not token:
+        if not args.username:
+            sys.exit("Please give --token (or NOMAD_TOKEN) or --username.")
+        password = os.environ.get("NOMAD_PASSWORD") or getpass.getpass(f"NOMAD password for {args.username}: ")
+        token = get_token(args.nomad_url, args.username, password)
+
+    filter_spec = None
+    if args.filter:
+        with open(args.filter, encoding="utf-8") as file:
+            filter_spec = FilterSpec.from_dict(json.load(file))
+
+    parts = [part.strip() for part in args.plots.split(",") if part.strip()]
+    unknown = [part for part in parts if part not in REPORT_PARTS]
+    if unknown:
+        sys.exit(f"Unknown report parts: {', '.join(unknown)}")
+    include_plots = {part: part in parts for part in REPORT_PARTS}
+
+    cache = None if args.cache.lower() == "none" else ArchiveCache(args.cache)
+
+    failed = []
+    jobs = dict(excel_file_path=None, output_dir=args.output_dir, nomad_url=args.nomad_url, token=token, filter_spec=filter_spec,
+                include_plots=include_plots, cache=cache, cache_mode=args.cache_mode, write_csv=args.csv,
+                mpp_metrics=args.mpp_metrics)
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {executor.submit(evaluate_batch, **{**jobs, "excel_file_path": path}): path for path in args.excel_files}
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                result = future.result()
+                print(f"{path}: {result['filtered_rows']} / {result['rows']} rows -> {result['files']['report']}")
+            except Exception:
+                failed.append(path)
+                print(f"{path}: failed\n{traceback.format_exc()}", file=sys.stderr)
+
+    print(f"{len(args.excel_files) - len(failed)} of {len(args.excel_files)} batches evaluated.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -9,7 +9,7 @@ from scipy.signal import argrelextrema, savgol_filter
 from scipy.optimize import curve_fit
 from scipy.stats import linregress
 
-from functions.api_calls_get_data import get_specific_data_of_sample
+from functions.api_calls_get_data import get_specific_data_of_sample, build_entry_index
 
 def find_best_tauc_fit(x, y, min_range=0.15, max_range=0.35):
     best_fit = None
@@ -80,7 +80,7 @@ def find_peaks_and_fit_gaussian(x, y):
             y_masked[fitting_range] = 0
         return results
 
-def plot_tauc(data, file_path, nomad_url, token):
+def plot_tauc(data, file_path, nomad_url, token, entry_index=None):
     #alpha = 1/d * ln( (1-R)^2 / T )
     thickness_nm = 550  # Schichtdicke in nm
 
@@ -95,7 +95,8 @@ def plot_tauc(data, file_path, nomad_url, token):
                 sample_id=data["sample_id"][i],
                 entry_type='peroTF_UVvisMeasurement',
                 nomad_url=nomad_url,
-                token=token
+                token=token,
+                entry_index=entry_index
             )
 
             uvvis_data = uvvis_entries[0]
@@ -174,7 +175,7 @@ def plot_tauc(data, file_path, nomad_url, token):
         plt.show()
 
 
-def plot_uvvis_photon_energy(data, file_path, nomad_url, token):
+def plot_uvvis_photon_energy(data, file_path, nomad_url, token, entry_index=None):
     # === Plot-Setup ===
 
     fig, axs = plt.subplots(1, 2, figsize=(14, 7))
@@ -188,7 +189,8 @@ def plot_uvvis_photon_energy(data, file_path, nomad_url, token):
                 sample_id=data["sample_id"][i],
                 entry_type='peroTF_UVvisMeasurement',
                 nomad_url=nomad_url,
-                token=token
+                token=token,
+                entry_index=entry_index
             )
 
             uvvis_data = uvvis_entries[0]
@@ -261,7 +263,7 @@ def plot_uvvis_photon_energy(data, file_path, nomad_url, token):
 
     return
 
-def plot_uvvis_wavelength(data, file_path, nomad_url, token):
+def plot_uvvis_wavelength(data, file_path, nomad_url, token, entry_index=None):
     # === Plot-Setup ===
     
 
@@ -276,7 +278,8 @@ def plot_uvvis_wavelength(data, file_path, nomad_url, token):
                 sample_id=data["sample_id"][i],
                 entry_type='peroTF_UVvisMeasurement',
                 nomad_url=nomad_url,
-                token=token
+                token=token,
+                entry_index=entry_index
             )
 
             uvvis_data = uvvis_entries[0]
@@ -357,11 +360,13 @@ def plot_uvvis_wavelength(data, file_path, nomad_url, token):
     return
 
 def UVVis_plotting(data, file_path, nomad_url, token, unit):
+    # lab_id -> entry_id of the loaded data, so the entry ids don't have to be looked up again for every sample
+    entry_index = build_entry_index(data)
     if unit == "tauc_plot":
-        return plot_tauc(data, file_path, nomad_url, token)
+        return plot_tauc(data, file_path, nomad_url, token, entry_index)
     elif unit == "photon_energy":
-        return plot_uvvis_photon_energy(data, file_path, nomad_url, token)
+        return plot_uvvis_photon_energy(data, file_path, nomad_url, token, entry_index)
     elif unit == "wavelength":
-        return plot_uvvis_wavelength(data, file_path, nomad_url, token)
+        return plot_uvvis_wavelength(data, file_path, nomad_url, token, entry_index)
     else:
         raise ValueError(f"Unknown unit: {unit}")
\ No newline at end of file
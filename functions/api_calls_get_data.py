@@ -4,10 +4,111 @@
 
 """
 
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
 import numpy as np
 
+from functions.archive_cache import ArchiveCache, entry_version, VERSION_FIELDS
+
+
+#number of requests that are sent to the NOMAD server at the same time
+DEFAULT_MAX_WORKERS = 8
+#number of samples whose linked entries are fetched with one (paginated) query
+DEFAULT_CHUNK_SIZE = 20
+#how the archive cache is used:
+#   'revalidate': ask the server only for the versions of the linked entries and download changed/new archives
+#   'offline': use the cached archives of a sample without asking the server, revalidate only unknown samples
+#   'refresh': download everything again and overwrite the cache
+CACHE_MODES = ("revalidate", "offline", "refresh")
+
+#everything of an archive, used if nothing more specific is requested
+FULL_ARCHIVE = {'metadata': '*', 'data': '*'}
+
+#data sections that hold the measured curves of an entry type (matched as part of the entry type)
+CURVE_SECTIONS = {
+    'JVmeasurement': {'jv_curve': '*'},
+    'EQEmeasurement': {'eqe_data': '*'},
+    'MPPTracking': {'time': '*', 'efficiency': '*', 'voltage': '*', 'properties': '*'},
+}
+
+_session = None
+_session_pool_size = 0
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size: int = DEFAULT_MAX_WORKERS) -> requests.Session:
+    """returns one shared requests session, so that all api calls reuse the same open connections.
+    pool_size: number of connections that are kept open per host, should be at least the number of parallel requests
+
+    returns: the shared requests.Session
+    """
+    global _session, _session_pool_size
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+        if _session_pool_size < pool_size:
+            # a larger pool is mounted on the same session, requests that are still running in other threads keep the old adapter
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+            _session_pool_size = pool_size
+        return _session
+
+
+def get_token(nomad_url: str, username: str, password: str) -> str:
+    """logs in at the NOMAD server and returns the access token (same request as the login of the GUI)."""
+    response = get_session().post(f"{nomad_url}/auth/token", data={"grant_type": "password", "username": username, "password": password})
+    response.raise_for_status()
+    return response.json().get('access_token', None)
+
+
+def _add_path(required: dict, path: list[str]):
+    """adds one quantity path (e.g. ['layer', '0', 'thickness']) to a nested 'required' dict.
+    Repeated sections can not be projected by index, so a numeric part requests the whole section."""
+    key = path[0]
+    if len(path) == 1 or path[1].isdigit():
+        required[key] = '*'
+        return
+    if required.get(key) == '*':
+        return
+    _add_path(required.setdefault(key, {}), path[1:])
+
+
+def build_table_required(quantities: list[str], jv_quantities: list[str]) -> dict:
+    """builds the 'required' part of an archive query that only contains what get_quantity_over_jv reads:
+    the given quantities of the process entries and the scalar jv_quantities of every JV curve, but no voltage
+    or current arrays and no EQE/MPP data.
+    quantities: paths into the data of the process entries, parts separated by '/'
+    jv_quantities: quantities of each jv_curve, e.g. 'efficiency'
+
+    returns: a dict for the 'required' field of /entries/archive/query
+    """
+    data = {
+        'description': '*',
+        'datetime': '*',
+        'measurement_programm': '*',
+        'jv_curve': {'cell_name': '*', **{quantity: '*' for quantity in jv_quantities}},
+    }
+    for quantity in quantities:
+        _add_path(data, quantity.split("/"))
+    return {'metadata': '*', 'data': data}
+
+
+def build_curve_required(entry_type: str) -> dict:
+    """builds the 'required' part of an archive query that contains the curves needed to plot an entry type,
+    for unknown entry types the complete data is requested.
+    entry_type: (part of) the entry type, e.g. 'JVmeasurement'
+    """
+    for key, sections in CURVE_SECTIONS.items():
+        if key in entry_type:
+            return {'metadata': '*', 'data': dict(sections)}
+    return dict(FULL_ARCHIVE)
+
 
 def get_entryid(sample_ids: list[str], nomad_url: str, token) -> pd.DataFrame:
     """gets all entry ids for a given list of batch identifiers.
@@ -27,7 +128,8 @@ def get_entryid(sample_ids: list[str], nomad_url: str, token) -> pd.DataFrame:
             'page_size': 100
         }
     }
-    response = requests.post(
+    session = get_session()
+    response = session.post(
         f'{nomad_url}/entries/query', headers={'Authorization': f'Bearer {token}'}, json=query).json()
     data = response["data"]
     queried_ids = pd.DataFrame(data=data)
@@ -36,7 +138,7 @@ def get_entryid(sample_ids: list[str], nomad_url: str, token) -> pd.DataFrame:
     while (response['pagination'].get('next_page_after_value')):
         next_page = response['pagination'].get('next_page_after_value')
         query['pagination']['page_after_value'] = next_page
-        response = requests.post(
+        response = session.post(
         f'{nomad_url}/entries/query', headers={'Authorization': f'Bearer {token}'}, json=query).json()
         data = response['data']
         queried_ids = pd.concat([queried_ids, pd.DataFrame(data)], ignore_index=True)
@@ -44,6 +146,43 @@ def get_entryid(sample_ids: list[str], nomad_url: str, token) -> pd.DataFrame:
     return queried_ids
 
 
+def resolve_entry_ids(sample_ids: list[str], nomad_url: str, token, entry_index: dict | None = None) -> dict[str, str]:
+    """maps lab ids to nomad entry ids, ids that are already in entry_index are not asked from the server.
+    entry_index: known lab_id -> entry_id pairs, e.g. from build_entry_index of the loaded data
+
+    returns: a dict lab_id -> entry_id for all ids that were found
+    """
+    entry_index = entry_index or {}
+    resolved = {sample_id: entry_index[sample_id] for sample_id in sample_ids if sample_id in entry_index}
+    unknown = [sample_id for sample_id in dict.fromkeys(sample_ids) if sample_id not in resolved]
+    if unknown:
+        queried_ids = get_entryid(unknown, nomad_url, token)
+        if not queried_ids.empty:
+            queried_ids = queried_ids.drop_duplicates(subset='entry_name')  #keep the first hit
+            resolved.update(zip(queried_ids['entry_name'], queried_ids['entry_id']))
+    return resolved
+
+
+def build_entry_index(df: pd.DataFrame) -> dict[str, str]:
+    """builds the lab_id -> entry_id index from a loaded dataset with the columns 'sample_id' and 'entry_id'."""
+    if df is None or 'entry_id' not in df.columns:
+        return {}
+    pairs = df[['sample_id', 'entry_id']].dropna().drop_duplicates(subset='sample_id')
+    return dict(zip(pairs['sample_id'], pairs['entry_id']))
+
+
+def save_entry_index(entry_index: dict[str, str], file_path):
+    """writes a lab_id -> entry_id index to a json file."""
+    with open(file_path, "w", encoding="utf-8") as file:
+        json.dump(entry_index, file, indent=1)
+
+
+def load_entry_index(file_path) -> dict[str, str]:
+    """reads a lab_id -> entry_id index written by save_entry_index."""
+    with open(file_path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
 def return_value(data, path):
     if path:
         try:
@@ -53,100 +192,404 @@ def return_value(data, path):
     return data
 
 
-def get_quantity_over_jv(samples_of_batch: pd.DataFrame, key_1, quantities: list[str], jv_quantities: list[str], nomad_url: str, token) -> pd.DataFrame:
+def _post_paginated(url: str, query: dict, token) -> list[dict]:
+    """sends a query to the server and collects the 'data' of all result pages."""
+    session = get_session()
+    response = session.post(url, headers={'Authorization': f'Bearer {token}'}, json=query)
+    response.raise_for_status()
+    response = response.json()
+    data = response["data"]
+
+    #get remaining pages
+    while (response['pagination'].get('next_page_after_value')):
+        query['pagination']['page_after_value'] = response['pagination'].get('next_page_after_value')
+        response = session.post(url, headers={'Authorization': f'Bearer {token}'}, json=query)
+        response.raise_for_status()
+        response = response.json()
+        data.extend(response["data"])
+
+    return data
+
+
+def query_linked_archives(entry_id: str | list[str], nomad_url: str, token, required: dict | None = None,
+                          since: str | None = None) -> list[dict]:
+    """gets the archives of all entries that reference the given entry (e.g. all measurements of a sample).
+    entry_id: nomad entry id of the referenced entry, or a list of entry ids to query them all in one request
+    token: access token for the database
+    required: parts of the archives to download, see build_table_required/build_curve_required (default: everything)
+    since: if given, only entries created at or after this time (ISO string, see HIGH_WATER_FIELD)
+
+    returns: a list with one dict per linked entry, each with the key 'archive'
+    """
+    if isinstance(entry_id, list):
+        entry_id = {'any': entry_id}
+    query = {
+        'required': required or FULL_ARCHIVE,
+        'owner': 'visible',
+        'query': {'entry_references.target_entry_id': entry_id},
+        'pagination': {
+            'page_size': 100
+        }
+    }
+    if since is not None:
+        query['query'][HIGH_WATER_FIELD] = {'gte': since}
+    return _post_paginated(f'{nomad_url}/entries/archive/query', query, token)
+
+
+def query_linked_entries(entry_id: str | list[str], nomad_url: str, token) -> list[dict]:
+    """gets only the metadata needed to check the cache (id, type, references, versions) of all linked entries.
+    entry_id: nomad entry id of the referenced entry, or a list of entry ids
+
+    returns: a list with one metadata dict per linked entry
+    """
+    if isinstance(entry_id, list):
+        entry_id = {'any': entry_id}
+    query = {
+        'required': {
+            'include': ['entry_id', 'entry_type', 'entry_references', *VERSION_FIELDS]
+        },
+        'owner': 'visible',
+        'query': {'entry_references.target_entry_id': entry_id},
+        'pagination': {
+            'page_size': 100
+        }
+    }
+    return _post_paginated(f'{nomad_url}/entries/query', query, token)
+
+
+def query_archives(entry_ids: list[str], nomad_url: str, token, required: dict | None = None) -> list[dict]:
+    """gets the archives of the given entries themselves.
+    required: parts of the archives to download (default: everything)
+
+    returns: a list with one dict per entry, each with the key 'archive'
+    """
+    query = {
+        'required': required or FULL_ARCHIVE,
+        'owner': 'visible',
+        'query': {'entry_id': {'any': entry_ids}},
+        'pagination': {
+            'page_size': 100
+        }
+    }
+    return _post_paginated(f'{nomad_url}/entries/archive/query', query, token)
+
+
+def split_linked_archives(linked_data: list[dict], entry_ids: list[str]) -> dict[str, list[dict]]:
+    """sorts the result of a query over several entries back to the single entries.
+    linked_data: linked archives as returned by query_linked_archives
+    entry_ids: the entry ids that were queried
+
+    returns: a dict that maps every entry id to the linked archives that reference it
+    """
+    split = {entry_id: [] for entry_id in entry_ids}
+    for link in linked_data:
+        for target in _referenced_ids(link["archive"]["metadata"]):
+            if target in split:
+                split[target].append(link)
+    return split
+
+
+def _referenced_ids(metadata: dict) -> list[str]:
+    """returns the entry ids that an entry references, every id only once."""
+    references = metadata.get("entry_references") or []
+    return list(dict.fromkeys(ref.get("target_entry_id") for ref in references))
+
+
+def _make_chunks(entry_ids: list, chunk_size: int | None) -> list:
+    if chunk_size:
+        return [entry_ids[i:i + chunk_size] for i in range(0, len(entry_ids), chunk_size)]
+    return entry_ids
+
+
+def fetch_linked_archives(entry_ids: list[str], nomad_url: str, token, max_workers: int = DEFAULT_MAX_WORKERS,
+                          chunk_size: int | None = None, cache: ArchiveCache | None = None,
+                          cache_mode: str = "revalidate", required: dict | None = None) -> dict[str, list[dict]]:
+    """gets the linked archives for many entries with parallel requests over one shared connection pool.
+    entry_ids: nomad entry ids of the samples
+    max_workers: maximal number of requests that are sent at the same time
+    chunk_size: if given, the linked archives of this many entries are fetched with one query and split afterwards,
+                otherwise every entry gets its own query
+    cache: optional ArchiveCache, archives that did not change since they were cached are not downloaded again
+    cache_mode: one of CACHE_MODES, see there
+    required: parts of the archives to download (default: everything)
+
+    returns: a dict that maps every given entry id to the list of its linked archives
+    """
+    unique_ids = list(dict.fromkeys(entry_ids))  #remove duplicates but keep the order
+    if not unique_ids:
+        return {}
+    if cache is not None:
+        return _fetch_linked_archives_cached(unique_ids, nomad_url, token, max_workers, chunk_size, cache, cache_mode,
+                                             required or FULL_ARCHIVE)
+
+    chunks = _make_chunks(unique_ids, chunk_size)
+    results = _run_parallel(lambda chunk: query_linked_archives(chunk, nomad_url, token, required), chunks, max_workers)
+
+    if not chunk_size:
+        return dict(zip(unique_ids, results))
+
+    linked_archives = {}
+    for chunk, linked_data in zip(chunks, results):
+        linked_archives.update(split_linked_archives(linked_data, chunk))
+    return linked_archives
+
+
+def _run_parallel(function, items: list, max_workers: int) -> list:
+    """calls function for every item on a thread pool and returns the results in the same order."""
+    if not items:
+        return []
+    max_workers = max(1, min(max_workers, len(items)))
+    get_session(max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(function, items))
+
+
+def _fetch_linked_archives_cached(entry_ids: list[str], nomad_url: str, token, max_workers: int,
+                                  chunk_size: int | None, cache: ArchiveCache, cache_mode: str,
+                                  required: dict) -> dict[str, list[dict]]:
+    if cache_mode not in CACHE_MODES:
+        raise ValueError(f"Unknown cache mode '{cache_mode}', use one of {CACHE_MODES}")
+
+    linked_archives = {}
+    if cache_mode == "offline":
+        for entry_id in entry_ids:
+            archives = cache.get_linked_archives(entry_id, required)
+            if archives is not None:
+                linked_archives[entry_id] = [{"archive": archive} for archive in archives]
+
+    #ask the server only which entries are linked and in which version
+    to_check = [entry_id for entry_id in entry_ids if entry_id not in linked_archives]
+    chunks = [[entry_id] for entry_id in to_check] if not chunk_size else _make_chunks(to_check, chunk_size)
+    listings = _run_parallel(lambda chunk: query_linked_entries(chunk, nomad_url, token), chunks, max_workers)
+
+    links = {entry_id: [] for entry_id in to_check}
+    for linked_entries in listings:
+        for metadata in linked_entries:
+            for target in _referenced_ids(metadata):
+                if target in links:
+                    links[target].append((metadata["entry_id"], entry_version(metadata)))
+
+    #take what is still valid from the cache and download the rest
+    archives = {}
+    to_download = []
+    for linked in links.values():
+        for linked_id, version in linked:
+            if linked_id in archives or linked_id in to_download:
+                continue
+            archive = cache.get(linked_id, version, required) if cache_mode != "refresh" else None
+            if archive is None:
+                to_download.append(linked_id)
+            else:
+                archives[linked_id] = archive
+
+    downloads = _run_parallel(lambda chunk: query_archives(chunk, nomad_url, token, required),
+                              _make_chunks(to_download, chunk_size or DEFAULT_CHUNK_SIZE), max_workers)
+    for downloaded in downloads:
+        for entry in downloaded:
+            metadata = entry["archive"]["metadata"]
+            archives[metadata["entry_id"]] = entry["archive"]
+            cache.put(metadata["entry_id"], entry_version(metadata), entry["archive"], required)
+
+    for entry_id, linked in links.items():
+        linked = [(linked_id, version) for linked_id, version in linked if linked_id in archives]
+        cache.put_links(entry_id, linked)
+        linked_archives[entry_id] = [{"archive": archives[linked_id]} for linked_id, _ in linked]
+    cache.evict()
+
+    return {entry_id: linked_archives[entry_id] for entry_id in entry_ids}
+
+
+#metadata field of the linked entries that is the high-water mark of a sample for the incremental refresh,
+#newer entries were not loaded yet
+HIGH_WATER_FIELD = "entry_create_time"
+
+
+def _latest(times: list[str]) -> str | None:
+    return max(times, key=pd.Timestamp) if times else None
+
+
+def high_water_marks(linked_archives: dict[str, list[dict]]) -> dict[str, dict]:
+    """returns the high-water mark of every sample: the creation time of its newest linked entry and the ids of all
+    linked entries of every type (entries created in the same second are told apart by their id).
+    linked_archives: linked archives per entry id, as returned by fetch_linked_archives
+
+    returns: a dict entry_id -> {'time': ISO string or None, 'entries': [linked entry ids]}, json serializable
+    """
+    marks = {}
+    for entry_id, links in linked_archives.items():
+        metadata = [link["archive"]["metadata"] for link in links]
+        marks[entry_id] = {"time": _latest([m[HIGH_WATER_FIELD] for m in metadata if m.get(HIGH_WATER_FIELD)]),
+                           "entries": [m["entry_id"] for m in metadata]}
+    return marks
+
+
+def fetch_new_linked_archives(high_water: dict[str, dict], nomad_url: str, token, max_workers: int = DEFAULT_MAX_WORKERS,
+                              chunk_size: int | None = DEFAULT_CHUNK_SIZE, cache: ArchiveCache | None = None,
+                              required: dict | None = None) -> tuple[dict[str, list[dict]], dict[str, dict]]:
+    """gets only the linked archives that were created after the high-water marks of the samples.
+    The samples are grouped by their mark, every group is queried (in chunks) from its mark on, so a sample without mark
+    does not make the others download everything again. Entries that are already known are dropped.
+    Entries that were changed (reprocessed) after loading are not found, that needs a full load.
+    high_water: entry_id -> mark of the loaded samples, see high_water_marks (other keys of the marks are kept)
+    cache: optional ArchiveCache, the new archives are added to it
+
+    returns: the new linked archives per entry id and the updated high-water marks
+    """
+    required = required or FULL_ARCHIVE
+    groups = {}  # mark time -> entry ids, samples without entries (None) are queried without time
+    for entry_id, mark in high_water.items():
+        groups.setdefault(mark["time"], []).append(entry_id)
+    chunks = [(since, chunk) for since, entry_ids in groups.items() for chunk in _make_chunks(entry_ids, chunk_size or DEFAULT_CHUNK_SIZE)]
+
+    def query_chunk(job):
+        since, chunk = job
+        return query_linked_archives(chunk, nomad_url, token, required, since=since)
+
+    new_archives = {}
+    for (_, chunk), linked_data in zip(chunks, _run_parallel(query_chunk, chunks, max_workers)):
+        for entry_id, links in split_linked_archives(linked_data, chunk).items():
+            known = set(high_water[entry_id]["entries"])
+            new_archives[entry_id] = [link for link in links if link["archive"]["metadata"]["entry_id"] not in known]
+
+    updated = {}
+    for entry_id, mark in high_water_marks(new_archives).items():
+        old = high_water[entry_id]
+        updated[entry_id] = {**old, "time": _latest([time for time in (old["time"], mark["time"]) if time]),
+                             "entries": old["entries"] + mark["entries"]}
+
+    if cache is not None:
+        for links in new_archives.values():
+            for link in links:
+                metadata = link["archive"]["metadata"]
+                cache.put(metadata["entry_id"], entry_version(metadata), link["archive"], required)
+        cache.evict()
+    return new_archives, updated
+
+
+#scan direction of a jv_curve, given by the name of its current density column
+SCAN_DIRECTIONS = {
+    "Current density [1] [mA/cm^2]": "backwards",
+    "Current density [2] [mA/cm^2]": "forwards",
+}
+
+
+def get_quantity_over_jv(samples_of_batch: pd.DataFrame, key_1, quantities: list[str], jv_quantities: list[str], nomad_url: str, token,
+                         max_workers: int = DEFAULT_MAX_WORKERS, chunk_size: int | None = DEFAULT_CHUNK_SIZE,
+                         cache: ArchiveCache | None = None, cache_mode: str = "revalidate", high_water: dict | None = None) -> pd.DataFrame:
     """ samples_of_batch: Dataframe with at least a column 'entry_id' with nomad entry ids
         jv_quantities: features to extract for each sample
+        max_workers: maximal number of parallel requests to the server
+        chunk_size: number of samples that share one query, None for one query per sample
+        cache: optional ArchiveCache to skip downloading unchanged archives, cache_mode: one of CACHE_MODES
+        high_water: optional dict, filled with the high-water mark of every sample for a later refresh (see high_water_marks)
+        Only the quantities and the scalar jv_quantities are downloaded (see build_table_required), not the curves.
+    """
+    #download the linked archives of all samples at once
+    linked_archives = fetch_linked_archives(samples_of_batch['entry_id'].tolist(), nomad_url, token,
+                                            max_workers=max_workers, chunk_size=chunk_size,
+                                            cache=cache, cache_mode=cache_mode,
+                                            required=build_table_required(quantities, jv_quantities))
+    if high_water is not None:
+        marks = high_water_marks(linked_archives)
+        for entry_id, sample_name in zip(samples_of_batch['entry_id'], samples_of_batch['entry_name']):
+            marks[entry_id]["sample_id"] = sample_name  # samples without JV rows have no entry_id in the merged table
+        high_water.update(marks)
+
+    return extract_quantity_over_jv(samples_of_batch, linked_archives, key_1, quantities, jv_quantities)
+
+
+def extract_quantity_over_jv(samples_of_batch: pd.DataFrame, linked_archives: dict[str, list[dict]], key_1,
+                             quantities: list[str], jv_quantities: list[str]) -> pd.DataFrame:
+    """builds the table of get_quantity_over_jv from already downloaded archives.
+    samples_of_batch: Dataframe with the columns 'entry_id' and 'entry_name'
+    linked_archives: linked archives per entry id, as returned by fetch_linked_archives
+
+    returns: one row per jv curve with the quantities of its sample, indexed by 'entry_id'
     """
     if not isinstance(key_1, list):
         key_1 = [key_1]
-    # collect the results of the sample, in this case it are all the annealing temperatures
-    df_q = pd.DataFrame(columns=["entry_id","sample_id"]+quantities)
-    df_jv = pd.DataFrame(columns=["entry_id"]+["px#"]+['Cycle#']+["scan_direction"]+["datetime"]+["programm"]+jv_quantities)
-
-    for index, row in samples_of_batch.iterrows():
-        sample_id = row['entry_id']
-        row = {"entry_id": sample_id, "sample_id":row['entry_name']}
-        query = {
-            'required': {
-                'metadata': '*',
-                'data': '*',
-            },
-            'owner': 'visible',
-            'query': {'entry_references.target_entry_id': sample_id},
-            'pagination': {
-                'page_size': 100
-            }
-        }
-        response = requests.post(f'{nomad_url}/entries/archive/query',
-                                 headers={'Authorization': f'Bearer {token}'}, json=query)
-        #print(response.json())
-        linked_data = response.json()["data"]
 
-        # Change code here!!!!
+    # the values are collected column wise and turned into DataFrames once at the end
+    q_columns = {column: [] for column in ["entry_id", "sample_id"] + quantities}
+    jv_columns = {column: [] for column in ["entry_id", "px#", "Cycle#", "scan_direction", "datetime", "programm"] + jv_quantities}
+
+    for entry_id, sample_name in zip(samples_of_batch['entry_id'], samples_of_batch['entry_name']):
+        linked_data = linked_archives[entry_id]
+
+        # collect the results of the sample, in this case it are all the annealing temperatures
+        row = {}
         for link in linked_data:
-            if any([kk == link["archive"]["metadata"]["entry_type"] for kk in key_1]):
+            if link["archive"]["metadata"]["entry_type"] in key_1:
                 data = link["archive"]["data"]
                 for q in quantities:
-                    q_split = q.split("/")
+                    row[q] = return_value(data, q.split("/"))
+        q_columns["entry_id"].append(entry_id)
+        q_columns["sample_id"].append(sample_name)
+        for q in quantities:
+            q_columns[q].append(row.get(q, np.nan))
 
-                    row.update({q: return_value(data.copy(), q_split.copy())})
-
-        df_q.loc[len(df_q.index)] = row
         for link in linked_data:
-            if "JVmeasurement" in link["archive"]["metadata"]["entry_type"]:
-                row = {"entry_id": sample_id}
-                jv_curves = link["archive"]["data"].get("jv_curve")
-                if not jv_curves:
-                    continue
-                for curve in jv_curves:
-                    row['px#'] = link["archive"]["data"]["description"].split(': ')[1][0:3]  # extract pixel nr from notes
-                    row['Cycle#'] = link["archive"]["data"]["description"].split('Cycle_')[1] if 'Cycle_' in link["archive"]["data"]["description"] else None  # extract cycle number if present
-                    row["scan_direction"] = (  #scan direction
-                        "backwards" if curve["cell_name"] == "Current density [1] [mA/cm^2]" else
-                        "forwards" if curve["cell_name"] == "Current density [2] [mA/cm^2]" else
-                        None)  #scan direction
-                    row["datetime"] = link["archive"]["data"]["datetime"]
-                    row["programm"] = link["archive"]["data"]["measurement_programm"]
-                    for quantity in jv_quantities:
-                        row.update({quantity: curve.get(quantity)})
-
-                    df_jv.loc[len(df_jv.index)] = row
-                    #print(row)
-    df_q = df_q.set_index("entry_id")
-    df_jv = df_jv.set_index("entry_id")
+            if "JVmeasurement" not in link["archive"]["metadata"]["entry_type"]:
+                continue
+            data = link["archive"]["data"]
+            jv_curves = data.get("jv_curve")
+            if not jv_curves:
+                continue
+            description = data["description"]
+            n_curves = len(jv_curves)
+            jv_columns["entry_id"].extend([entry_id] * n_curves)
+            jv_columns["px#"].extend([description.split(': ')[1][0:3]] * n_curves)  # extract pixel nr from notes
+            jv_columns["Cycle#"].extend([description.split('Cycle_')[1] if 'Cycle_' in description else None] * n_curves)  # extract cycle number if present
+            jv_columns["scan_direction"].extend(SCAN_DIRECTIONS.get(curve["cell_name"]) for curve in jv_curves)
+            jv_columns["datetime"].extend([data["datetime"]] * n_curves)
+            jv_columns["programm"].extend([data["measurement_programm"]] * n_curves)
+            for quantity in jv_quantities:
+                jv_columns[quantity].extend(curve.get(quantity) for curve in jv_curves)
+
+    df_q = pd.DataFrame(q_columns).set_index("entry_id")
+    df_jv = pd.DataFrame(jv_columns).set_index("entry_id")
 
     df = df_q.merge(df_jv, on="entry_id")
-    
+
     return df
 
 
+def get_specific_data_of_samples(sample_ids: list[str], entry_type, nomad_url, token, with_meta=False,
+                                 max_workers: int = DEFAULT_MAX_WORKERS, chunk_size: int | None = DEFAULT_CHUNK_SIZE,
+                                 cache: ArchiveCache | None = None, cache_mode: str = "revalidate",
+                                 required: dict | None = None, entry_index: dict | None = None) -> dict:
+    """gets the data of all linked entries of one type for several samples at once.
+    sample_ids: lab ids of the samples
+    entry_type: (part of) the entry type of the wanted entries, e.g. 'JVmeasurement'
+    with_meta: if True every result is a tuple (data, metadata)
+    cache: optional ArchiveCache to skip downloading unchanged archives, cache_mode: one of CACHE_MODES
+    required: parts of the archives to download, by default only the curves of entry_type (see build_curve_required)
+    entry_index: known lab_id -> entry_id pairs (see build_entry_index), only unknown ids are looked up on the server
 
-def get_specific_data_of_sample(sample_id, entry_type, nomad_url, token, with_meta=False):
-    # collect the results of the sample, in this case it are all the annealing temperatures
+    returns: a dict that maps every sample id to the list of its matching entries
+    """
+    entry_ids = resolve_entry_ids(sample_ids, nomad_url, token, entry_index)
 
-    entry_id = get_entryid([sample_id], nomad_url, token)['entry_id'][0] #modified to work with updated get_entryid function
+    linked_archives = fetch_linked_archives([entry_ids[s] for s in sample_ids if s in entry_ids], nomad_url, token,
+                                            max_workers=max_workers, chunk_size=chunk_size,
+                                            cache=cache, cache_mode=cache_mode,
+                                            required=required or build_curve_required(entry_type))
 
-    query = {
-        'required': {
-            'metadata': '*',
-            'data': '*',
-        },
-        'owner': 'visible',
-        'query': {'entry_references.target_entry_id': entry_id},
-        'pagination': {
-            'page_size': 100
-        }
-    }
-    response = requests.post(f'{nomad_url}/entries/archive/query',
-                             headers={'Authorization': f'Bearer {token}'}, json=query)
-    linked_data = response.json()["data"]
-    res = []
-
-    for ldata in linked_data:
-        if entry_type not in ldata["archive"]["metadata"]["entry_type"]:
-            continue
-        if with_meta:
-            res.append((ldata["archive"]["data"],ldata["archive"]["metadata"]))
-        else:
-            res.append(ldata["archive"]["data"])
+    res = {}
+    for sample_id in sample_ids:
+        res[sample_id] = []
+        for ldata in linked_archives.get(entry_ids.get(sample_id), []):
+            if entry_type not in ldata["archive"]["metadata"]["entry_type"]:
+                continue
+            if with_meta:
+                res[sample_id].append((ldata["archive"].get("data", {}),ldata["archive"]["metadata"]))
+            else:
+                res[sample_id].append(ldata["archive"].get("data", {}))
     return res
+
+
+def get_specific_data_of_sample(sample_id, entry_type, nomad_url, token, with_meta=False, cache=None, cache_mode="revalidate",
+                                entry_index=None):
+    # collect the results of the sample, in this case it are all the annealing temperatures
+    return get_specific_data_of_samples([sample_id], entry_type, nomad_url, token, with_meta=with_meta, chunk_size=None,
+                                        cache=cache, cache_mode=cache_mode, entry_index=entry_index)[sample_id]
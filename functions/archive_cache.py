@@ -0,0 +1,158 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+
+#default place and size of the local archive cache
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".eln_evaluate", "archive_cache.sqlite")
+DEFAULT_MAX_SIZE = 1024**3  # 1 GB
+
+#metadata fields that change when an entry is uploaded again or reprocessed
+VERSION_FIELDS = ("upload_create_time", "last_processing_time")
+
+
+def entry_version(metadata: dict) -> str:
+    """builds the version string of an entry from its metadata, a changed version means the cached archive is stale."""
+    return "|".join(str(metadata.get(field, "")) for field in VERSION_FIELDS)
+
+
+def spec_key(required) -> str:
+    """turns a 'required' specification of an archive query into a stable string key."""
+    return json.dumps(required, sort_keys=True)
+
+
+class ArchiveCache:
+    """Local SQLite cache for NOMAD archives.
+
+    Archives are stored per entry_id and per 'required' specification together with the version of the entry
+    (see entry_version). A lookup with another version counts as a miss. In addition the cache remembers which
+    entries are linked to a sample, so a batch can be loaded completely without network access.
+    If the stored archives grow bigger than max_size, the least recently used ones are removed.
+    A pickled cache opens its own connection to the same file, so it can be handed to worker processes.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_size=DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._connect()
+
+    def _connect(self):
+        """opens the database and creates the tables if needed."""
+        self._lock = threading.Lock()
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS archives ("
+            "entry_id TEXT, spec TEXT, version TEXT, size INTEGER, last_access REAL, payload BLOB, "
+            "PRIMARY KEY (entry_id, spec))")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS links (entry_id TEXT PRIMARY KEY, linked TEXT, last_update REAL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS archives_last_access ON archives (last_access)")
+
+    def __getstate__(self):
+        # only the location is pickled, e.g. for worker processes, they open their own connection
+        return {"path": self.path, "max_size": self.max_size}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._connect()
+
+    def get(self, entry_id: str, version: str, required=None) -> dict | None:
+        """returns the cached archive of the entry or None if it is missing or was stored for another version."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT version, payload FROM archives WHERE entry_id = ? AND spec = ?",
+                (entry_id, spec_key(required))).fetchone()
+            if row is None or row[0] != version:
+                return None
+            self._connection.execute(
+                "UPDATE archives SET last_access = ? WHERE entry_id = ? AND spec = ?",
+                (time.time(), entry_id, spec_key(required)))
+        return json.loads(zlib.decompress(row[1]))
+
+    def put(self, entry_id: str, version: str, archive: dict, required=None):
+        """stores the archive of an entry, an older version of the same entry is replaced."""
+        payload = zlib.compress(json.dumps(archive).encode("utf-8"))
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO archives (entry_id, spec, version, size, last_access, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                (entry_id, spec_key(required), version, len(payload), time.time(), payload))
+
+    def get_links(self, entry_id: str) -> list[tuple[str, str]] | None:
+        """returns the (entry_id, version) pairs of all entries linked to the given entry, or None if unknown."""
+        with self._lock:
+            row = self._connection.execute("SELECT linked FROM links WHERE entry_id = ?", (entry_id,)).fetchone()
+        if row is None:
+            return None
+        return [tuple(link) for link in json.loads(row[0])]
+
+    def put_links(self, entry_id: str, links: list[tuple[str, str]]):
+        """remembers which entries (with their versions) are linked to the given entry."""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO links (entry_id, linked, last_update) VALUES (?, ?, ?)",
+                (entry_id, json.dumps([list(link) for link in links]), time.time()))
+
+    def get_linked_archives(self, entry_id: str, required=None) -> list[dict] | None:
+        """returns all linked archives of an entry from the cache alone, or None if anything is missing."""
+        links = self.get_links(entry_id)
+        if links is None:
+            return None
+        archives = []
+        for linked_id, version in links:
+            archive = self.get(linked_id, version, required)
+            if archive is None:
+                return None
+            archives.append(archive)
+        return archives
+
+    def size(self) -> int:
+        """returns the size of all stored archives in bytes (compressed)."""
+        with self._lock:
+            return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM archives").fetchone()[0]
+
+    def evict(self, max_size=None):
+        """removes the least recently used archives until the cache is smaller than max_size."""
+        max_size = self.max_size if max_size is None else max_size
+        with self._lock:
+            total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM archives").fetchone()[0]
+            if total <= max_size:
+                return
+            to_delete = []
+            for entry_id, spec, size in self._connection.execute(
+                    "SELECT entry_id, spec, size FROM archives ORDER BY last_access ASC"):
+                if total <= max_size:
+                    break
+                to_delete.append((entry_id, spec))
+                total -= size
+            self._connection.executemany("DELETE FROM archives WHERE entry_id = ? AND spec = ?", to_delete)
+
+    def clear(self):
+        """removes everything from the cache."""
+        with self._lock:
+            self._connection.execute("DELETE FROM archives")
+            self._connection.execute("DELETE FROM links")
+            self._connection.execute("VACUUM")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> ArchiveCache:
+    """returns the archive cache in the users home directory (created on first use)."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ArchiveCache()
+        return _default_cache
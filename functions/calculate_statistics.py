@@ -1,11 +1,11 @@
 import numpy as np
 import pandas as pd
-from scipy.stats import f_oneway
-from statsmodels.stats.multicomp import pairwise_tukeyhsd
+# scipy.stats and statsmodels are imported in the functions, they take long to load
 
-def calculate_statistics(df: pd.DataFrame):    
+def calculate_statistics(df: pd.DataFrame, metric: str = 'efficiency'):    
     """
-    Calculates statistical measures for efficiency values grouped by the 'variation' column.
+    Calculates statistical measures for a JV metric (by default the efficiency) grouped by the 'variation' column.
+    All categories are handled in one groupby pass.
 
     Input:
     -----------
@@ -18,6 +18,9 @@ def calculate_statistics(df: pd.DataFrame):
         - 'open_circuit_voltage' (float): Open circuit voltage values.
         - 'fill_factor' (float): Fill factor values.
         - 'short_circuit_current_density' (float): Short-circuit current density.
+    metric : str
+        Column the statistics are calculated for, e.g. 'fill_factor'.
+        The maximum columns are named 'maximum_<metric>' and 'maximum_<metric>_id'.
 
     Returns:
     --------
@@ -25,99 +28,267 @@ def calculate_statistics(df: pd.DataFrame):
         - result_df: DataFrame with statistical measures per category.
         - best_df: DataFrame with the best-performing sample per category.
     """
+    max_col = f'maximum_{metric}'
 
-    result_df = pd.DataFrame(columns=[
-        'category',
-        'standard_deviation',
-        'median',
-        'closest_median',
-        'closest_median_id',
-        'maximum_efficiency',
-        'maximum_efficiency_id'
-    ])
-    
-    best_df = pd.DataFrame(columns=[
-        'category',
-        'sample_id',
-        'px',
-        'PCE',
-        'Voc',
-        'FF',
-        'Jsc'
-    ])
-    
-    for category in pd.unique(df['variation']):
-        category_data = df[df['variation'] == category]
-
-        if category_data.empty or category_data['efficiency'].dropna().empty:
-            # If no data, add a row with None values and skip further calculations
-            temp_df = pd.DataFrame({
-                'category': [category],
-                'standard_deviation': [None],
-                'median': [None],
-                'closest_median': [None],
-                'closest_median_id': [None],
-                'median_px': [None],
-                'maximum_efficiency': [None],
-                'maximum_efficiency_id': [None],
-                'max_px': [None]
-            })
-            
-            best_df_temp = pd.DataFrame({
-                'category': [category],
-                'sample_id': [None],
-                'px': [None],
-                'PCE': [None],
-                'Voc': [None],
-                'FF': [None],
-                'Jsc': [None]
-            })
+    # Categories in the order of their first appearance, rows without value or category don't count
+    categories = pd.unique(df['variation'])
+    valid = df[df['variation'].notna() & df[metric].notna()].reset_index(drop=True)
+    # Group by integer codes, the strings are factorized only once
+    codes, uniques = pd.factorize(valid['variation'], sort=False)
+    grouped = valid[metric].groupby(codes)
 
-        else:
-            # Normal statistics calculations
-            std_dev = category_data['efficiency'].std()
-            med_eff = category_data['efficiency'].median()
-            closest_med_eff_value = sorted(category_data['efficiency'].dropna(),
-                                           key=lambda x: abs(x - med_eff - 0.000000001))[:1]
-            med_id = category_data[category_data['efficiency'] == closest_med_eff_value[0]]['sample_id'].values[0]
-            max_eff = category_data['efficiency'].max()
-            max_id = category_data[category_data['efficiency'] == max_eff]['sample_id'].values[0]
-
-            temp_df = pd.DataFrame({
-                'category': [category],
-                'standard_deviation': [np.round(std_dev,2)],
-                'median': [np.round(med_eff,2)],
-                'closest_median': [closest_med_eff_value[0]],
-                'closest_median_id': [med_id],
-                'median_px': [category_data[category_data['efficiency'] == closest_med_eff_value[0]]['px#'].values[0]],
-                'maximum_efficiency': [max_eff],
-                'maximum_efficiency_id': [max_id],
-                'max_px': [category_data[category_data['efficiency'] == max_eff]['px#'].values[0]]
-            })
-
-            best_df_temp = pd.DataFrame({
-                'category': [category],
-                'sample_id': [max_id],
-                'px': [category_data[category_data['efficiency'] == max_eff]['px#'].values[0]],
-                'PCE': [max_eff],
-                'Voc' : [category_data[category_data['efficiency'] == max_eff]['open_circuit_voltage'].values[0]],
-                'FF' : [category_data[category_data['efficiency'] == max_eff]['fill_factor'].values[0]],
-                'Jsc' : [category_data[category_data['efficiency'] == max_eff]['short_circuit_current_density'].values[0]]
-            })
-
-        # Concatenate the results
-        result_df = pd.concat([result_df, temp_df], ignore_index=True)
-        best_df = pd.concat([best_df, best_df_temp], ignore_index=True)
+    std_dev = grouped.std()
+    med = grouped.median()
+    # Value closest to the median (ties go to the value above the median) and the maximum, as row positions
+    distance = (valid[metric] - med.values[codes] - 0.000000001).abs()
+    med_idx = distance.groupby(codes).idxmin()
+    max_idx = grouped.idxmax()
+
+    med_rows = valid.loc[med_idx.values].set_index(uniques[med_idx.index])
+    max_rows = valid.loc[max_idx.values].set_index(uniques[max_idx.index])
+
+    result_df = pd.DataFrame({
+        'category': uniques[med.index],
+        'standard_deviation': np.round(std_dev.values, 2),
+        'median': np.round(med.values, 2),
+        'closest_median': med_rows[metric].values,
+        'closest_median_id': med_rows['sample_id'].values,
+        max_col: max_rows[metric].values,
+        f'{max_col}_id': max_rows['sample_id'].values,
+        'median_px': med_rows['px#'].values,
+        'max_px': max_rows['px#'].values,
+    })
+
+    best_df = pd.DataFrame({
+        'category': max_rows.index,
+        'sample_id': max_rows['sample_id'].values,
+        'px': max_rows['px#'].values,
+        'PCE': max_rows['efficiency'].values,
+        'Voc': max_rows['open_circuit_voltage'].values,
+        'FF': max_rows['fill_factor'].values,
+        'Jsc': max_rows['short_circuit_current_density'].values,
+    })
+
+    # Categories without data get a row with None values
+    result_df = _reindex_categories(result_df, categories)
+    best_df = _reindex_categories(best_df, categories)
 
     # Perform ANOVA test
-    if len(df['variation'].unique()) > 1 and not df['efficiency'].dropna().empty:
-        f_statistic, p_value = f_oneway(*[group['efficiency'].dropna().values for _, group in df.groupby('variation')])
+    if len(uniques) > 1:
+        from scipy.stats import f_oneway
+        from statsmodels.stats.multicomp import pairwise_tukeyhsd
+        # Values per category, split from one sorted array
+        order = np.argsort(codes, kind='stable')
+        groups = np.split(valid[metric].values[order], np.cumsum(np.bincount(codes))[:-1])
+        f_statistic, p_value = f_oneway(*groups)
         
         if p_value < 0.05:
             # Perform Tukey HSD test
-            tukey_results = pairwise_tukeyhsd(df['efficiency'], df['variation'], alpha=0.05)
+            tukey_results = pairwise_tukeyhsd(valid[metric], valid['variation'], alpha=0.05)
             print(tukey_results)
         else:
             print("No significant differences between group means.")
 
     return result_df, best_df
+
+
+def _reindex_categories(stats_df: pd.DataFrame, categories) -> pd.DataFrame:
+    """brings a per-category frame into the given category order, missing categories get None values."""
+    stats_df = stats_df.set_index('category').reindex(pd.Index(categories, name='category')).reset_index()
+    stats_df = stats_df.astype(object)
+    return stats_df.where(stats_df.notna(), None)
+
+
+### Multi-metric statistics engine ###_________________________________________________________________________________________________
+
+# JV metrics and their short names in the tables
+JV_METRICS = {
+    'efficiency': 'PCE',
+    'fill_factor': 'FF',
+    'open_circuit_voltage': 'Voc',
+    'short_circuit_current_density': 'Jsc',
+}
+
+
+def calculate_summary_statistics(df: pd.DataFrame, metrics: dict = JV_METRICS, by=('variation', 'scan_direction', 'Cycle#'),
+                                 n_boot: int = 1000, confidence: float = 0.95, seed=None) -> pd.DataFrame:
+    """
+    Calculates summary statistics and bootstrap confidence intervals of the mean for several metrics at once.
+
+    Input:
+    -----------
+    df : pd.DataFrame
+        JV data with the metric columns and the grouping columns.
+    metrics : dict
+        Column name -> name used in the result, by default PCE, FF, Voc and Jsc.
+    by : tuple
+        Grouping columns, columns that are missing in df are skipped.
+    n_boot : int
+        Number of bootstrap resamples, 0 to skip the confidence intervals.
+    confidence : float
+        Confidence level of the intervals.
+
+    Returns:
+    --------
+    pd.DataFrame with one row per metric and group and the columns
+    count, mean, std, median, min, max, ci_low, ci_high.
+    """
+    by = [column for column in by if column in df.columns]
+    long_df = df.melt(id_vars=by, value_vars=[m for m in metrics if m in df.columns], var_name='metric', value_name='value')
+    long_df = long_df.dropna(subset=['value'])
+    long_df['value'] = long_df['value'].astype(float)
+    long_df['metric'] = long_df['metric'].map(metrics)
+
+    keys = ['metric'] + by
+    summary = long_df.groupby(keys, sort=False, dropna=False)['value'].agg(
+        count='count', mean='mean', std='std', median='median', min='min', max='max').reset_index()
+
+    if n_boot and not long_df.empty:
+        # Group codes in the same order as the summary rows
+        codes = long_df.groupby(keys, sort=False, dropna=False).ngroup().to_numpy()
+        ci_low, ci_high = bootstrap_mean_ci(long_df['value'].to_numpy(), codes, n_boot=n_boot, confidence=confidence, seed=seed)
+        summary['ci_low'] = ci_low
+        summary['ci_high'] = ci_high
+    else:
+        summary['ci_low'] = np.nan
+        summary['ci_high'] = np.nan
+
+    return summary
+
+
+def bootstrap_mean_ci(values: np.ndarray, codes: np.ndarray, n_boot: int = 1000, confidence: float = 0.95,
+                      seed=None, max_block: int = 5_000_000):
+    """
+    Percentile bootstrap confidence intervals of the mean for many groups at once.
+
+    Every resample draws, for every value, a random value of the same group, so all groups are resampled
+    together with one random array. The resamples are processed in blocks of at most max_block numbers.
+
+    Input:
+    -----------
+    values : np.ndarray
+        Values of all groups.
+    codes : np.ndarray
+        Group number (0 ... n_groups-1) of every value.
+
+    Returns:
+    --------
+    tuple[np.ndarray, np.ndarray] lower and upper bound per group.
+    """
+    rng = np.random.default_rng(seed)
+    order = np.argsort(codes, kind='stable')
+    sorted_values = values[order]
+    sorted_codes = codes[order]
+    sizes = np.bincount(sorted_codes)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    # reduceat needs the start of every non-empty group
+    group_starts = starts[sizes > 0]
+
+    value_starts = starts[sorted_codes]
+    value_sizes = sizes[sorted_codes]
+
+    means = np.empty((n_boot, len(sizes)))
+    means[:, sizes == 0] = np.nan
+    block = max(1, max_block // max(1, len(values)))
+    for first in range(0, n_boot, block):
+        n = min(block, n_boot - first)
+        idx = value_starts + (rng.random((n, len(values))) * value_sizes).astype(np.int64)
+        sums = np.add.reduceat(sorted_values[idx], group_starts, axis=1)
+        means[first:first + n, sizes > 0] = sums / sizes[sizes > 0]
+
+    alpha = (1 - confidence) / 2
+    ci_low, ci_high = np.quantile(means, [alpha, 1 - alpha], axis=0)
+    return ci_low, ci_high
+
+
+def anova_tukey_tables(df: pd.DataFrame, metrics: dict = JV_METRICS, group: str = 'variation', alpha: float = 0.05):
+    """
+    One-way ANOVA between the groups for every metric, and Tukey HSD comparisons for the significant ones.
+
+    Returns:
+    --------
+    tuple[pd.DataFrame, pd.DataFrame]
+        - anova_df: one row per metric with F statistic, p value and whether it is significant.
+        - tukey_df: pairwise comparisons of all significant metrics (empty if there are none).
+    """
+    from scipy.stats import f_oneway
+    from statsmodels.stats.multicomp import pairwise_tukeyhsd
+
+    anova_rows = []
+    tukey_tables = []
+    for metric, name in metrics.items():
+        if metric not in df.columns:
+            continue
+        valid = df[df[group].notna() & df[metric].notna()]
+        codes, uniques = pd.factorize(valid[group], sort=False)
+        if len(uniques) < 2:
+            continue
+        order = np.argsort(codes, kind='stable')
+        groups = np.split(valid[metric].to_numpy(dtype=float)[order], np.cumsum(np.bincount(codes))[:-1])
+        f_statistic, p_value = f_oneway(*groups)
+        anova_rows.append({'metric': name, 'F': f_statistic, 'p_value': p_value, 'significant': bool(p_value < alpha)})
+
+        if p_value < alpha:
+            tukey = pairwise_tukeyhsd(valid[metric].astype(float), valid[group].astype(str), alpha=alpha).summary().data
+            tukey_df = pd.DataFrame(tukey[1:], columns=tukey[0])
+            tukey_df.insert(0, 'metric', name)
+            tukey_tables.append(tukey_df)
+
+    anova_df = pd.DataFrame(anova_rows, columns=['metric', 'F', 'p_value', 'significant'])
+    tukey_df = pd.concat(tukey_tables, ignore_index=True) if tukey_tables else pd.DataFrame()
+    return anova_df, tukey_df
+
+
+### Hysteresis index ###_____________________________________________________________________________________________________________
+
+# A backwards and a forwards scan belong together if they have the same device and cycle
+HYSTERESIS_KEYS = ('sample_id', 'px#', 'Cycle#')
+
+
+def hysteresis_index(df: pd.DataFrame, metrics: dict = JV_METRICS, keys=HYSTERESIS_KEYS, by=('variation',)) -> pd.DataFrame:
+    """
+    Calculates the hysteresis index (backwards - forwards) / backwards for every device, cycle and metric.
+
+    The backwards and forwards scans are joined on the keys with one merge, devices with only one scan direction get no value.
+    If a key has several scans of one direction (e.g. no cycle numbers), the pairs are not known and its scans are left out,
+    pairing them by their order would shift every later pair when one scan is missing.
+
+    Input:
+    -----------
+    df : pd.DataFrame
+        JV data with the metric columns, 'scan_direction', the keys and the by columns.
+    metrics : dict
+        Column name -> name used in the result, by default PCE, FF, Voc and Jsc.
+    keys : tuple
+        Columns that identify one measurement of a device.
+    by : tuple
+        Further columns that are kept in the result, e.g. 'variation'.
+
+    Returns:
+    --------
+    pd.DataFrame (tidy) with one row per scan pair and metric and the columns
+    keys, by, metric, backwards, forwards, hysteresis_index.
+    """
+    by = [column for column in by if column in df.columns]
+    columns = list(dict.fromkeys([*keys, *by]))
+    metric_columns = [m for m in metrics if m in df.columns]
+    scans = df.loc[df['scan_direction'].isin(['backwards', 'forwards']), columns + ['scan_direction'] + metric_columns]
+    scans = scans[~scans.duplicated(subset=[*keys, 'scan_direction'], keep=False)]  # ambiguous scans
+
+    # NaN keys (e.g. missing cycle numbers) are matched with each other by merge
+    backwards = scans[scans['scan_direction'] == 'backwards'].drop(columns='scan_direction')
+    forwards = scans[scans['scan_direction'] == 'forwards'].drop(columns=['scan_direction', *[c for c in by if c not in keys]])
+    pairs = backwards.merge(forwards, on=list(keys), suffixes=('_backwards', '_forwards'))
+
+    # long format: the pairs are repeated once per metric
+    n_pairs = len(pairs)
+    back_values = pairs[[f'{m}_backwards' for m in metric_columns]].to_numpy(dtype=float).T.ravel()
+    forward_values = pairs[[f'{m}_forwards' for m in metric_columns]].to_numpy(dtype=float).T.ravel()
+    result = pairs[columns].iloc[np.tile(np.arange(n_pairs), len(metric_columns))].reset_index(drop=True)
+    result['metric'] = np.repeat([metrics[m] for m in metric_columns], n_pairs)
+    result['backwards'] = back_values
+    result['forwards'] = forward_values
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result['hysteresis_index'] = (back_values - forward_values) / back_values
+
+    return result
@@ -0,0 +1,70 @@
+import numpy as np
+
+from functions.api_calls_get_data import get_specific_data_of_samples, CURVE_SECTIONS, DEFAULT_MAX_WORKERS
+
+
+#array quantities of each entry type that are converted to numpy arrays, per (sub)section
+ARRAY_QUANTITIES = {
+    'JVmeasurement': {'jv_curve': ['voltage', 'current_density']},
+    'EQEmeasurement': {'eqe_data': ['wavelength_array', 'eqe_array']},
+    'MPPTracking': {None: ['time', 'efficiency', 'voltage']},
+}
+
+
+def _to_numpy(data: dict, entry_type: str) -> dict:
+    """converts the curve lists of an entry to numpy arrays, everything else is kept as it is."""
+    for section, quantities in ARRAY_QUANTITIES.get(entry_type, {}).items():
+        parts = [data] if section is None else (data.get(section) or [])
+        for part in parts:
+            for quantity in quantities:
+                if part.get(quantity) is not None:
+                    part[quantity] = np.asarray(part[quantity], dtype=float)
+    return data
+
+
+class CurveStore:
+    """Collects the JV, EQE and MPP curves of all samples a report needs.
+
+    prefetch downloads the curves of many samples with one parallel fetch (all entry types at once),
+    get hands them to the plotting functions. Samples that were not prefetched are fetched on first access.
+    With an entry_index (lab_id -> entry_id) of the loaded data no lab ids have to be resolved on the server.
+    """
+
+    def __init__(self, nomad_url, token, entry_types=tuple(CURVE_SECTIONS), cache=None, max_workers=DEFAULT_MAX_WORKERS,
+                 entry_index=None):
+        self.nomad_url = nomad_url
+        self.token = token
+        self.entry_index = entry_index or {}
+        self.entry_types = list(entry_types)
+        self.cache = cache
+        self.max_workers = max_workers
+        self._curves = {}  # sample_id -> {entry_type: [data, ...]}
+
+        # one projection that contains the curve sections of all entry types
+        data = {}
+        for entry_type in self.entry_types:
+            data.update(CURVE_SECTIONS.get(entry_type, {}))
+        self._required = {'metadata': '*', 'data': data}
+
+    def prefetch(self, sample_ids):
+        """downloads the curves of all given samples that are not in the store yet."""
+        missing = [sample_id for sample_id in dict.fromkeys(sample_ids)
+                   if sample_id is not None and sample_id == sample_id and sample_id not in self._curves]  # skip None/NaN
+        if not missing:
+            return
+        entries = get_specific_data_of_samples(missing, "", self.nomad_url, self.token, with_meta=True,
+                                               max_workers=self.max_workers, cache=self.cache, required=self._required,
+                                               entry_index=self.entry_index)
+        for sample_id in missing:
+            curves = {entry_type: [] for entry_type in self.entry_types}
+            for data, metadata in entries.get(sample_id, []):
+                for entry_type in self.entry_types:
+                    if entry_type in metadata["entry_type"]:
+                        curves[entry_type].append(_to_numpy(data, entry_type))
+            self._curves[sample_id] = curves
+
+    def get(self, sample_id, entry_type) -> list[dict]:
+        """returns the data of all entries of entry_type of the sample, like get_specific_data_of_sample."""
+        if sample_id not in self._curves:
+            self.prefetch([sample_id])
+        return self._curves.get(sample_id, {}).get(entry_type, [])
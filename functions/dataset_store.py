@@ -0,0 +1,104 @@
+import json
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only needed to save and open datasets
+    pa = None
+    pq = None
+
+from functions.filter_spec import FilterSpec
+
+
+### Evaluated datasets as Parquet ###_______________________________________________________________________________________________
+# A dataset is a folder with one Parquet file per table (raw, filtered, stats, best). The filter spec, the yields and the high-water marks are stored
+# as metadata of raw.parquet, so the columns keep their types and nothing has to be appended to the data like in the csv export.
+
+DATASET_EXTENSION = ".evaldataset"
+DATASET_TABLES = ("raw", "filtered", "stats", "best")
+METADATA_KEY = b"eln_evaluation"
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Saving and opening datasets needs pyarrow (pip install pyarrow).")
+
+
+def data_yield(raw_data: pd.DataFrame, filtered_data: pd.DataFrame = None) -> dict:
+    """the yields of the csv export in percent: measurements with efficiency / all and filtered / all."""
+    total = len(raw_data)
+    yields = {"raw": 100 * raw_data["efficiency"].notna().sum() / total if total else None}
+    if filtered_data is not None:
+        yields["filtered"] = 100 * len(filtered_data) / total if total else None
+    return yields
+
+
+def _to_table(df: pd.DataFrame, metadata: dict = None):
+    """pyarrow table of df. Object columns with mixed types (e.g. numbers and text from the excel sheet) are stored as text."""
+    df = df.copy(deep=False)
+    for column in df.columns[df.dtypes == object]:
+        try:
+            pa.array(df[column], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df[column] = df[column].map(lambda value: value if value is None or value != value else str(value))
+    table = pa.Table.from_pandas(df)
+    if metadata:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), METADATA_KEY: json.dumps(metadata).encode()})
+    return table
+
+
+def save_dataset(path, raw_data, filtered_data=None, stats=None, best=None, filter_spec=None, filter_cycle_boolean=None,
+                 high_water=None):
+    """
+    saves an evaluation as dataset folder, reopen it with load_dataset.
+    path: folder of the dataset, DATASET_EXTENSION is added if missing
+    filter_spec: FilterSpec of the filtered data or None
+    high_water: high-water marks of the samples (see get_data.refresh_batch_data), a reopened dataset can load only new measurements
+    returns: path of the folder
+    """
+    _require_pyarrow()
+    if not path.endswith(DATASET_EXTENSION):
+        path += DATASET_EXTENSION
+    os.makedirs(path, exist_ok=True)
+
+    tables = {"raw": raw_data, "filtered": filtered_data, "stats": stats, "best": best}
+    metadata = {
+        "tables": [name for name, df in tables.items() if df is not None],
+        "yield": data_yield(raw_data, filtered_data),
+        "filter_spec": filter_spec.to_dict() if filter_spec is not None else None,
+        "filter_cycle_boolean": filter_cycle_boolean,
+        "high_water": high_water or {},
+    }
+    for name, df in tables.items():
+        file_path = os.path.join(path, f"{name}.parquet")
+        if df is None:
+            if os.path.exists(file_path):  # table of an older save
+                os.remove(file_path)
+            continue
+        pq.write_table(_to_table(df, metadata if name == "raw" else None), file_path)
+    return path
+
+
+def load_dataset(path) -> dict:
+    """
+    opens a dataset folder of save_dataset.
+    returns: dict with the DataFrames raw, filtered, stats and best (None if not saved), the FilterSpec filter_spec,
+    filter_cycle_boolean, the yield and the high_water marks
+    """
+    _require_pyarrow()
+    raw = pq.read_table(os.path.join(path, "raw.parquet"))
+    metadata = json.loads(raw.schema.metadata[METADATA_KEY])
+
+    dataset = {name: None for name in DATASET_TABLES}
+    dataset["raw"] = raw.to_pandas()
+    for name in metadata["tables"]:
+        if name != "raw":
+            dataset[name] = pq.read_table(os.path.join(path, f"{name}.parquet")).to_pandas()
+    dataset["filter_spec"] = FilterSpec.from_dict(metadata["filter_spec"]) if metadata["filter_spec"] else None
+    dataset["filter_cycle_boolean"] = metadata["filter_cycle_boolean"]
+    dataset["yield"] = metadata["yield"]
+    dataset["high_water"] = metadata.get("high_water") or {}
+    return dataset
@@ -0,0 +1,314 @@
+import numpy as np
+import pandas as pd
+
+
+#slider parameters and the columns they filter
+PARAMETER_COLUMNS = {
+    'Datetime': 'datetime',
+    'PCE': 'efficiency',
+    'FF': 'fill_factor',
+    'Voc': 'open_circuit_voltage',
+    'Jsc': 'short_circuit_current_density',
+}
+
+#groups in which the best cycle is kept
+BEST_CYCLE_GROUP = ['sample_id', 'variation', 'px#', 'scan_direction']
+
+
+def _as_numbers(values):
+    """numpy view of a column for comparisons, datetimes as int64 (NaT becomes the smallest int64)."""
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').view(np.int64)
+    return values
+
+
+def _as_utc(value) -> pd.Timestamp:
+    """timestamp without timezone in UTC like the compared column: times with timezone are converted, the others are taken as UTC."""
+    timestamp = pd.Timestamp(value)
+    return timestamp.tz_convert(None) if timestamp.tz is not None else timestamp
+
+
+def _as_bound(value, values):
+    """converts a filter bound to the type of the compared numpy values."""
+    if np.issubdtype(np.asarray(values).dtype, np.datetime64):
+        return np.datetime64(_as_utc(value), 'ns').view(np.int64)
+    return value
+
+
+def _cycle_values(cycles, dtype) -> list:
+    """cycles in the type of the Cycle# column, which holds strings when loaded and numbers after the filter window."""
+    if pd.api.types.is_numeric_dtype(dtype):
+        return list(pd.to_numeric(pd.Series(list(cycles), dtype=object)))
+    return [str(cycle) for cycle in cycles]
+
+
+class FilterSpec:
+    """Declarative description of the data filters (sliders, cycle buttons, exclusions).
+
+    ranges:     column -> (min, max), rows outside the range or without value are removed
+    cycles:     cycles that are kept, None keeps all
+    exclude:    column -> values, rows with one of these values are removed
+    best_cycle: keep only the cycle with the best efficiency per sample, pixel and scan direction
+
+    mask evaluates all range, cycle and exclusion rules in one pass into a single boolean array, without copying
+    the data. The spec does not depend on the filter window, so it can be reused, e.g. for a headless evaluation.
+    """
+
+    def __init__(self, ranges=None, cycles=None, exclude=None, best_cycle=False):
+        self.ranges = dict(ranges or {})
+        self.cycles = None if cycles is None else list(cycles)
+        self.exclude = dict(exclude or {})
+        self.best_cycle = best_cycle
+
+    @classmethod
+    def from_bounds(cls, df_min_max: pd.DataFrame, cycles=None, exclude=None, best_cycle=False):
+        """builds the spec from the bounds DataFrame of the slider window (columns Parameter, Min, Max)."""
+        ranges = {PARAMETER_COLUMNS[parameter]: (minimum, maximum)
+                  for parameter, minimum, maximum in zip(df_min_max['Parameter'], df_min_max['Min'], df_min_max['Max'])
+                  if parameter in PARAMETER_COLUMNS}
+        return cls(ranges=ranges, cycles=cycles, exclude=exclude, best_cycle=best_cycle)
+
+    def to_dict(self) -> dict:
+        """JSON compatible form of the spec, datetimes as ISO strings."""
+        def plain(value):
+            if value is None or (isinstance(value, (float, np.floating)) and np.isinf(value)) \
+                    or (isinstance(value, pd.Timestamp) and value in (pd.Timestamp.min, pd.Timestamp.max)):
+                return None  # open bound
+            if isinstance(value, (pd.Timestamp, np.datetime64)) or hasattr(value, 'isoformat'):
+                return pd.Timestamp(value).isoformat()
+            return value.item() if isinstance(value, np.generic) else value
+        return {
+            'ranges': {column: [plain(minimum), plain(maximum)] for column, (minimum, maximum) in self.ranges.items()},
+            'cycles': None if self.cycles is None else [plain(cycle) for cycle in self.cycles],
+            'exclude': {column: [plain(value) for value in values] for column, values in self.exclude.items()},
+            'best_cycle': bool(self.best_cycle),
+        }
+
+    @classmethod
+    def from_dict(cls, spec: dict):
+        """
+        builds the spec from its dict form (e.g. a JSON file). Range keys can be column names or the slider
+        parameters (PCE, FF, Voc, Jsc, Datetime), missing bounds (null) are open.
+        """
+        ranges = {}
+        for key, (minimum, maximum) in (spec.get('ranges') or {}).items():
+            column = PARAMETER_COLUMNS.get(key, key)
+            if column == 'datetime':
+                minimum = pd.Timestamp.min if minimum is None else _as_utc(minimum)
+                maximum = pd.Timestamp.max if maximum is None else _as_utc(maximum)
+            else:
+                minimum = -np.inf if minimum is None else minimum
+                maximum = np.inf if maximum is None else maximum
+            ranges[column] = (minimum, maximum)
+        return cls(ranges=ranges, cycles=spec.get('cycles'), exclude=spec.get('exclude'),
+                   best_cycle=spec.get('best_cycle', False))
+
+    def mask(self, df: pd.DataFrame, out: np.ndarray = None) -> np.ndarray:
+        """returns the boolean mask of the rows that pass all rules (the best cycle rule is applied in apply)."""
+        mask = np.ones(len(df), dtype=bool) if out is None else out
+        if out is not None:
+            mask[:] = True
+        for column, (minimum, maximum) in self.ranges.items():
+            if column not in df.columns:
+                continue
+            mask &= self.range_mask(df, column, minimum, maximum)
+        if self.cycles is not None and 'Cycle#' in df.columns:
+            mask &= df['Cycle#'].isin(_cycle_values(self.cycles, df['Cycle#'].dtype)).to_numpy()
+        for column, values in self.exclude.items():
+            if column in df.columns:
+                mask &= ~df[column].isin(list(values)).to_numpy()
+        return mask
+
+    @staticmethod
+    def range_mask(df: pd.DataFrame, column: str, minimum, maximum) -> np.ndarray:
+        """boolean mask of one range rule, NaN/NaT values are outside of every range."""
+        column_values = df[column]
+        if isinstance(column_values.dtype, pd.DatetimeTZDtype):
+            column_values = column_values.dt.tz_convert(None)  # UTC without timezone, compared as numpy datetime64
+        raw = column_values.to_numpy()
+        values = _as_numbers(raw)
+        mask = values >= _as_bound(minimum, raw)
+        mask &= values <= _as_bound(maximum, raw)
+        return mask
+
+    def apply(self, df: pd.DataFrame, selector=None) -> pd.DataFrame:
+        """
+        returns the filtered DataFrame (one copy of the remaining rows).
+        selector: optional CycleSelector of df, reused for the best cycle rule instead of ranking df again.
+        """
+        mask = self.mask(df)
+        if self.best_cycle and 'Cycle#' in df.columns and df['Cycle#'].notna().any():
+            selector = selector if selector is not None else CycleSelector(df)
+            return df.iloc[selector.select(mask=mask)]
+        return df[mask]
+
+
+### Cycle selection ###_____________________________________________________________________________________________________________
+
+class CycleSelector:
+    """Ranks the JV curves of every group (sample, variation, pixel, scan direction) once by efficiency.
+
+    select then answers 'best cycle', 'cycle N' and 'best of cycles {a, b}' without sorting again:
+    without a mask from a table with the best rank of every group and cycle (O(groups)),
+    with a mask of filtered rows by one pass over the ranked rows.
+    Rows without efficiency or without group values are never selected, like groupby().idxmax().
+    """
+
+    def __init__(self, df: pd.DataFrame, metric: str = 'efficiency', group=BEST_CYCLE_GROUP):
+        group_codes = df.groupby(group, sort=False).ngroup().to_numpy()  # -1 for missing group values
+        values = df[metric].to_numpy(dtype=float)
+        rows = np.flatnonzero((group_codes >= 0) & ~np.isnan(values))
+        # groups one after the other, the best row first; lexsort is stable, ties keep the order like idxmax
+        self._ranked = rows[np.lexsort((-values[rows], group_codes[rows]))]
+        self._groups = group_codes[self._ranked]
+        self._group_first = np.flatnonzero(np.r_[True, self._groups[1:] != self._groups[:-1]]) if len(rows) else np.array([], dtype=np.int64)
+        self.n_groups = int(group_codes.max()) + 1 if len(rows) else 0
+
+        # Cycles as codes, rows without cycle get the last code
+        cycle_codes, self.cycles = pd.factorize(df['Cycle#'], sort=True)
+        cycle_codes[cycle_codes < 0] = len(self.cycles)
+        self._ranked_cycles = cycle_codes[self._ranked]
+
+        # best rank of every (group, cycle) pair, len(ranked) where the group has no such cycle
+        n_columns = len(self.cycles) + 1
+        self._best_rank = np.full((self.n_groups, n_columns), len(self._ranked), dtype=np.int64)
+        pairs = self._groups * n_columns + self._ranked_cycles
+        _, first = np.unique(pairs, return_index=True)
+        self._best_rank.flat[pairs[first]] = first
+
+    def _cycle_columns(self, cycles) -> np.ndarray:
+        columns = self.cycles.get_indexer(pd.Index(_cycle_values(cycles, self.cycles.dtype), dtype=object))
+        return columns[columns >= 0]
+
+    def select(self, cycles=None, mask: np.ndarray = None) -> np.ndarray:
+        """
+        returns the positions (in the row order of df) of the best row of every group.
+
+        cycles: only these cycles are considered ('cycle N' is [N]), None considers all
+        mask: boolean array over the rows of df, only these rows are considered
+        """
+        if mask is None:
+            if cycles is None:
+                ranks = self._group_first
+            else:
+                ranks = self._best_rank[:, self._cycle_columns(cycles)].min(axis=1, initial=len(self._ranked))
+                ranks = ranks[ranks < len(self._ranked)]
+            return np.sort(self._ranked[ranks])
+
+        keep = mask[self._ranked]
+        if cycles is not None:
+            keep &= np.isin(self._ranked_cycles, self._cycle_columns(cycles))
+        candidates = np.flatnonzero(keep)
+        groups = self._groups[candidates]
+        first = candidates[np.r_[True, groups[1:] != groups[:-1]]] if len(candidates) else candidates
+        return np.sort(self._ranked[first])
+
+
+def filter_best_efficiency(df):
+    # Zeilen mit maximaler Effizienz je Gruppe (Reihenfolge bleibt wie im Original-DF)
+    return df.iloc[CycleSelector(df).select()]
+
+
+### Live preview of the filters ###_______________________________________________________________________________________________
+
+class FilterPreview:
+    """Counts how many JV curves and cells (sample + pixel) pass a FilterSpec while the sliders are moved.
+
+    Every rule keeps its own cached mask. A change of one rule only recomputes that mask and ANDs it with the
+    combined mask of the other rules, which is cached too while the same slider is dragged.
+    With the best cycle rule the best rows are taken from a CycleSelector that is ranked only once.
+    """
+
+    def __init__(self, df: pd.DataFrame, spec: FilterSpec):
+        self.df = df
+        self.spec = spec
+        self._masks = {column: FilterSpec.range_mask(df, column, minimum, maximum)
+                       for column, (minimum, maximum) in spec.ranges.items() if column in df.columns}
+        if spec.cycles is not None:
+            self._masks['Cycle#'] = df['Cycle#'].isin(_cycle_values(spec.cycles, df['Cycle#'].dtype)).to_numpy()
+        self._others = (None, None)  # (rule, combined mask of all other rules)
+
+        # Cells and their variation, as integer codes for bincount
+        self._cell_codes = df.groupby(['sample_id', 'px#'], sort=False, dropna=False).ngroup().to_numpy()
+        self.n_cells = int(self._cell_codes.max()) + 1 if len(df) else 0
+        variation_codes, self.variations = pd.factorize(df['variation'].astype(str), sort=False)
+        self._cell_variation = np.zeros(self.n_cells, dtype=np.int64)
+        self._cell_variation[self._cell_codes] = variation_codes
+        self._cells_per_variation = np.bincount(self._cell_variation, minlength=len(self.variations))
+
+        self.mask = self._combine(self._masks.values())
+        self.selector = None  # created when the best cycle rule is used for the first time
+
+    def _combine(self, masks) -> np.ndarray:
+        mask = np.ones(len(self.df), dtype=bool)
+        for other in masks:
+            mask &= other
+        return mask
+
+    def _update(self, rule, new_mask):
+        if self._others[0] != rule:
+            self._others = (rule, self._combine(mask for name, mask in self._masks.items() if name != rule))
+        self._masks[rule] = new_mask
+        self.mask = self._others[1] & new_mask
+
+    def update_range(self, column: str, minimum, maximum):
+        """changes the range of one column and recomputes only its mask."""
+        self.spec.ranges[column] = (minimum, maximum)
+        if column in self.df.columns:
+            self._update(column, FilterSpec.range_mask(self.df, column, minimum, maximum))
+
+    def update_cycles(self, cycles):
+        """changes the kept cycles (None keeps all)."""
+        self.spec.cycles = None if cycles is None else list(cycles)
+        if self.spec.cycles is None:
+            self._update('Cycle#', np.ones(len(self.df), dtype=bool))
+        else:
+            self._update('Cycle#', self.df['Cycle#'].isin(_cycle_values(self.spec.cycles, self.df['Cycle#'].dtype)).to_numpy())
+
+    def update_best_cycle(self, best_cycle: bool):
+        """switches the best cycle rule on or off."""
+        self.spec.best_cycle = best_cycle
+
+    def selected_mask(self) -> np.ndarray:
+        """mask of the rows that remain, including the best cycle rule."""
+        if not self.spec.best_cycle or 'Cycle#' not in self.df.columns:
+            return self.mask
+        if self.selector is None:
+            self.selector = CycleSelector(self.df)
+        selected = np.zeros(len(self.df), dtype=bool)
+        selected[self.selector.select(mask=self.mask)] = True
+        return selected
+
+    def summary(self) -> dict:
+        """
+        returns the counts of the current mask:
+        rows, total_rows, cells, total_cells and per_variation (DataFrame with remaining cells and yield per variation).
+        A cell counts as remaining if at least one of its JV curves passes the filters.
+        """
+        mask = self.selected_mask()
+        cell_alive = np.bincount(self._cell_codes[mask], minlength=self.n_cells) > 0
+        cells_per_variation = np.bincount(self._cell_variation[cell_alive], minlength=len(self.variations))
+        per_variation = pd.DataFrame({
+            'variation': self.variations,
+            'cells': cells_per_variation,
+            'total_cells': self._cells_per_variation,
+        })
+        per_variation['yield'] = per_variation['cells'] / per_variation['total_cells'].where(per_variation['total_cells'] > 0)
+        return {
+            'rows': int(mask.sum()),
+            'total_rows': len(self.df),
+            'cells': int(cell_alive.sum()),
+            'total_cells': self.n_cells,
+            'per_variation': per_variation,
+        }
+
+    def summary_text(self) -> str:
+        """short text of the summary for the filter window."""
+        summary = self.summary()
+        removed = 1 - summary['cells'] / summary['total_cells'] if summary['total_cells'] else 0
+        lines = [f"Remaining: {summary['rows']} / {summary['total_rows']} JV curves, "
+                 f"{summary['cells']} / {summary['total_cells']} cells ({removed:.1%} of the cells removed)"]
+        for row in summary['per_variation'].itertuples():
+            lines.append(f"  {row.variation}: {row.cells} / {row.total_cells} cells ({row.cells / max(row.total_cells, 1):.0%})")
+        return "\n".join(lines)
@@ -1,92 +1,182 @@
 import tkinter as tk
 from tkinter import ttk
+import numpy as np
 import pandas as pd
 
+#JV parameters, rows where all of them have a value are complete solar cells (no halfstacks)
+NAN_RELEVANT_COLS = [
+    "efficiency",
+    "fill_factor",
+    "open_circuit_voltage",
+    "short_circuit_current_density"
+]
+
+def full_device_mask(df):
+    """boolean array of the rows that are complete solar cells (all four JV parameters have a value)."""
+    return df[[col for col in NAN_RELEVANT_COLS if col in df.columns]].notna().all(axis=1).to_numpy()
+
+
+class VirtualGrid:
+    """Table view for DataFrames of any length.
+
+    Only the visible rows exist as Treeview items, they are filled again from the DataFrame when scrolling.
+    Selection and exclusion (grayed rows) are boolean arrays over the rows of the DataFrame.
+    Click selects a row, Shift+Click a range and Ctrl+Click toggles a row.
+    """
+
+    def __init__(self, parent, df, visible_rows=20):
+        self.df = df
+        self.columns = ['Index'] + list(df.columns)
+        self.selected = np.zeros(len(df), dtype=bool)
+        self.excluded = np.zeros(len(df), dtype=bool)
+        self.first = 0  # Position der obersten sichtbaren Zeile
+        self.anchor = None  # Startzeile für Shift-Auswahl
+        self.items = []
+
+        self.tree = ttk.Treeview(parent, columns=self.columns, show='headings', selectmode='none', height=visible_rows)
+        self.tree.heading('Index', text='Index')
+        self.tree.column('Index', width=50)
+        for col in df.columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=120)
+        self.tree.tag_configure('grayed', foreground='gray')
+        self.tree.tag_configure('selected', background='lightblue')
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree.bind('<Configure>', self.on_resize)
+        self.tree.bind('<Button-1>', self.on_click)
+        self.tree.bind('<MouseWheel>', lambda event: self.scroll(-3 * int(event.delta / 120)))  # Windows und macOS
+        self.tree.bind('<Button-4>', lambda event: self.scroll(-3))  # Linux
+        self.tree.bind('<Button-5>', lambda event: self.scroll(3))
+
+        self.set_visible_rows(visible_rows)
+
+    def set_visible_rows(self, n_rows):
+        """creates one Treeview item per visible row."""
+        self.tree.delete(*self.items)
+        self.items = [self.tree.insert("", tk.END, values=()) for _ in range(n_rows)]
+        self.refresh()
+
+    def refresh(self):
+        """fills the visible items with the rows at the current scroll position."""
+        self.first = clamp_first_row(self.first, len(self.df), len(self.items))
+        block = self.df.iloc[self.first:self.first + len(self.items)]
+        rows = list(block.itertuples(index=True, name=None))
+        for slot, item in enumerate(self.items):
+            if slot < len(rows):
+                position = self.first + slot
+                tags = ('grayed',) if self.excluded[position] else ()
+                if self.selected[position]:
+                    tags += ('selected',)
+                self.tree.item(item, values=list(rows[slot]), tags=tags)
+            else:
+                self.tree.item(item, values=(), tags=())
+        if len(self.df):
+            self.scrollbar.set(self.first / len(self.df), min(1.0, (self.first + len(self.items)) / len(self.df)))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def yview(self, *args):
+        """command of the scrollbar: ('moveto', fraction) or ('scroll', number, 'units'/'pages')."""
+        if args[0] == 'moveto':
+            self.first = int(float(args[1]) * len(self.df))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            self.first += step * len(self.items) if args[2] == 'pages' else step
+        self.refresh()
+
+    def scroll(self, n_rows):
+        self.first += n_rows
+        self.refresh()
+        return "break"  # nicht zusätzlich das Hauptfenster scrollen
+
+    def on_resize(self, event):
+        row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        n_rows = max(1, (event.height - 25) // row_height)  # 25 px für die Überschriften
+        if n_rows != len(self.items):
+            self.set_visible_rows(n_rows)
+
+    def on_click(self, event):
+        self.tree.focus_set()
+        if self.tree.identify_region(event.x, event.y) != 'cell':
+            return
+        item = self.tree.identify_row(event.y)
+        if item not in self.items:
+            return
+        position = self.first + self.items.index(item)
+        if position >= len(self.df):
+            return "break"
+        shift = event.state & 0x0001
+        control = event.state & 0x0004
+        if shift and self.anchor is not None:
+            self.selected[:] = False
+            self.selected[min(self.anchor, position):max(self.anchor, position) + 1] = True
+        elif control:
+            self.selected[position] = not self.selected[position]
+            self.anchor = position
+        else:
+            self.selected[:] = False
+            self.selected[position] = True
+            self.anchor = position
+        self.refresh()
+        return "break"
+
+    def exclude_selected(self):
+        """grays the selected rows out."""
+        self.excluded |= self.selected
+        self.selected[:] = False
+        self.refresh()
+
+    def exclude(self, mask):
+        """grays all rows of the boolean mask out."""
+        self.excluded |= mask
+        self.refresh()
+
+    def restore(self):
+        """removes all exclusions."""
+        self.excluded[:] = False
+        self.refresh()
+
+
+def clamp_first_row(first, n_rows, n_visible):
+    """keeps the top row in the range that still fills the view."""
+    return max(0, min(first, n_rows - n_visible))
+
+
 def freier_filter(df, master):
     filter_window = tk.Toplevel(master)
     filter_window.title("Datenansicht")
     filter_window.geometry("800x400")
 
     # Zustand
-    grayed_indices = set()
     auto_nan_checked = tk.BooleanVar(value=False)
-    nan_relevant_cols = [
-        "efficiency",
-        "fill_factor",
-        "open_circuit_voltage",
-        "short_circuit_current_density"
-    ]
-
-    # Treeview erstellen
+
+    # Tabelle erstellen, nur die sichtbaren Zeilen werden angelegt
     frame = tk.Frame(filter_window)
     frame.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
-
-    tree = ttk.Treeview(frame, columns=['Index'] + list(df.columns), show='headings', selectmode='extended')
-    tree.heading('Index', text='Index')
-    tree.column('Index', width=50)
-
-    for col in df.columns:
-        tree.heading(col, text=col)
-        tree.column(col, width=120)
-
-    for i, row in df.iterrows():
-        tree.insert("", tk.END, values=[i] + list(row))
-
-    tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-    scrollbar = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
-    tree.configure(yscroll=scrollbar.set)
-    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-    # Unterstütze Shift-Auswahl mit Maus
-    def on_click(event):
-        tree.focus_set()
-    tree.bind('<Button-1>', on_click, add="+")
+    grid = VirtualGrid(frame, df)
 
     # Funktionen
     def remove_selected():
-        selected_items = tree.selection()
-        for item in selected_items:
-            tree.item(item, tags=('grayed',))
-            tree.tag_configure('grayed', foreground='gray')
-            grayed_indices.add(item)
-        tree.selection_remove(selected_items)
+        grid.exclude_selected()
 
     def restore_grayed_rows():
-        for item in grayed_indices:
-            tree.item(item, tags=())
-        grayed_indices.clear()
-        tree.tag_configure('grayed', foreground='black')
+        grid.restore()
         auto_nan_checked.set(False)
 
     def remove_grayed_rows():
         nonlocal df
-        indices_to_drop = []
-        for item in grayed_indices:
-            tree_values = tree.item(item, "values")
-            index_in_df = int(tree_values[0])
-            indices_to_drop.append(index_in_df)
-        df = df.drop(index=indices_to_drop).reset_index(drop=True)
+        df = df[~grid.excluded].reset_index(drop=True)
         filter_window.destroy()
         return df
 
     def auto_select_full_devices():
-        tree.selection_remove(tree.selection())
-        for item in tree.get_children():
-            values = tree.item(item, "values")
-            row_dict = dict(zip(['Index'] + list(df.columns), values))
-
-            # String "nan" als NaN behandeln
-            cell_values = [row_dict[col] for col in nan_relevant_cols]
-            cell_values = [None if v == "nan" else v for v in cell_values]
-
-            # Prüfen, ob alle vier Zellen einen Wert haben
-            if all(v is not None for v in cell_values):
-                tree.selection_add(item)
-
-        remove_selected()
-
-
+        # Alle Zeilen, bei denen alle vier Werte vorhanden sind (fertige Solarzellen), ausgrauen
+        grid.selected[:] = False
+        grid.exclude(full_device_mask(df))
 
     def toggle_auto_nan_filter():
         if auto_nan_checked.get():
@@ -1,12 +1,16 @@
 import pandas as pd
 
+#columns the evaluation needs internally (lab_id -> entry_id index, see build_entry_index), not part of the exported data
+INTERNAL_COLUMNS = ["entry_id"]
+
+
 def generate_csv_raw_file(file_path, raw_data):
     raw_data_real_withoutNaN = raw_data['efficiency'].notna().sum()
     raw_data_real_withNaN = len(raw_data['efficiency'])
     raw_NaN_data_yield = f"{100* raw_data_real_withoutNaN/ (raw_data_real_withNaN)} %"
     r_zusatzdaten = {"Data Yield (all data - NaN) / all data": [raw_NaN_data_yield]}
     raw_zusatzdaten = pd.DataFrame(r_zusatzdaten)
-    df_raw_copy = pd.concat([raw_data, raw_zusatzdaten], ignore_index=True)
+    df_raw_copy = pd.concat([raw_data.drop(columns=INTERNAL_COLUMNS, errors="ignore"), raw_zusatzdaten], ignore_index=True)
     df_raw_copy.to_csv(file_path, sep=";", index=False)
     return
 
@@ -15,6 +19,6 @@ def generate_csv_filtered_file(file_path, raw_data, filtered_data):
     absolute_data_yield = f"{100 * len(filtered_data['efficiency']) / len(raw_data['efficiency'])} %"
     f_zusatzdaten = {"(all data - NaNs - filtered data) / all data": [absolute_data_yield]}
     filtered_zusatzdaten = pd.DataFrame(f_zusatzdaten)
-    df_filtered_copy = pd.concat([filtered_data, filtered_zusatzdaten], ignore_index=True)
+    df_filtered_copy = pd.concat([filtered_data.drop(columns=INTERNAL_COLUMNS, errors="ignore"), filtered_zusatzdaten], ignore_index=True)
     df_filtered_copy.to_csv(file_path, sep=";", index=False)
     return
\ No newline at end of file
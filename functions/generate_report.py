@@ -1,18 +1,55 @@
+import matplotlib as mpl
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
 from functions.plotting_functions import plot_JV_curves, plot_box_and_scatter, plot_EQE_curves, plot_MPP_curves, plot_hysteresis
+from functions.curve_store import CurveStore
+from functions.api_calls_get_data import build_entry_index
+from functions.calculate_statistics import calculate_summary_statistics, anova_tukey_tables
+
+try:
+    import fitz  # PyMuPDF, merges the pdf pages rendered by the workers
+except ImportError:
+    fitz = None
 
 ### Updated Function to Generate PDF Report ###__________________________________________________________________________
 
 import re
 import os
+import io
+import pickle
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Export profiles: savefig options per format and the point count above which dense artists (scatter clouds of an axis,
+# long MPP traces) are rasterized at the dpi of the profile, the rest of the figure stays vector. None: no rasterizing.
+# A vector point costs ~500 bytes in svg and ~60 bytes in pdf, a rasterized axis ~0.5 MB, so svg switches earlier.
+EXPORT_PROFILES = {
+    'pdf': dict(savefig=dict(format='pdf', dpi=300, transparent=True, bbox_inches='tight'), raster_threshold=20000),
+    'svg': dict(savefig=dict(format='svg', dpi=300, bbox_inches="tight", facecolor="white"), raster_threshold=5000),
+}
+
+def merge_export_profiles(changes=None):
+    """
+    Returns EXPORT_PROFILES with the changes per format. The savefig options are merged with the defaults of the profile,
+    'dpi' is a short form of {'savefig': {'dpi': ...}}, e.g. {'svg': {'dpi': 150}}.
+    """
+    profiles = {}
+    for name, profile in EXPORT_PROFILES.items():
+        change = dict((changes or {}).get(name, {}))
+        savefig = {**profile['savefig'], **change.pop('savefig', {})}
+        if 'dpi' in change:
+            savefig['dpi'] = change.pop('dpi')
+        profiles[name] = {**profile, **change, 'savefig': savefig}
+    return profiles
 
 # Sanitize filename (remove invalid characters)
 def sanitize_filename(filename):
     return re.sub(r'[\/:*?"<>|]', '_', filename)
 
 # Generate PDF Report
-def generate_pdf_report(df, result_df, best_df, include_plots, report_title, nomad_url, token, filter_cycle_boolean):
+def generate_pdf_report(df, result_df, best_df, include_plots, report_title, nomad_url, token, filter_cycle_boolean, cache=None,
+                        render_workers=None, export_profiles=None):
     """
     Generates a PDF report with selected plots and data tables.
 
@@ -26,6 +63,12 @@ def generate_pdf_report(df, result_df, best_df, include_plots, report_title, nom
                               - 'EQE'
                               - 'MPP'
                               - 'Table'
+                              - 'Statistics'
+        cache (ArchiveCache): optional cache for the downloaded curves.
+        render_workers (int): number of processes that render the figures, None for one per core (at most one per figure),
+                              1 renders everything in this process.
+        export_profiles (dict): changes of EXPORT_PROFILES per format, see merge_export_profiles, e.g.
+                                {'svg': {'dpi': 150, 'raster_threshold': None}} or {'pdf': {'savefig': {'dpi': 600}}}.
     """
     # Split the path and file name
     directory, file_name = os.path.split(report_title)
@@ -53,103 +96,223 @@ def generate_pdf_report(df, result_df, best_df, include_plots, report_title, nom
     df = df.dropna(subset=['efficiency'])  # Drop rows with NaN values in 'efficiency'
     result_df = result_df.dropna(subset=['maximum_efficiency']) # Drop rows with NaN values in 'maximum_efficiency'
 
-    with PdfPages(report_title) as pdf:
-        # Include JV Curves
-        if include_plots.get('JV', False):
-            fig_max = plot_JV_curves(result_df, 'maximum_efficiency', nomad_url, token)
-            if include_plots.get('Picture', False):
-                fig_max.savefig(directory+"/"+ file_name[:-4]+"_Best_JV.svg", format='svg', dpi = 800, bbox_inches = "tight", facecolor="white")
-            pdf.savefig(fig_max, dpi=300, transparent=True, bbox_inches='tight')
-            plt.close(fig_max)
-
-            fig_med = plot_JV_curves(result_df, 'closest_median', nomad_url, token)
-            if include_plots.get('Picture', False):
-                fig_med.savefig(directory+"/"+ file_name[:-4]+"_Median_JV.svg", format='svg', dpi = 800, bbox_inches = "tight", facecolor="white")
-            pdf.savefig(fig_med, dpi=300, transparent=True, bbox_inches='tight')
-            plt.close(fig_med)
-
-        # Include Box and Scatter Plots for PCE, FF, Voc, Jsc
-        if include_plots.get('Box+Scatter', False):
-            SeparateScanDir = include_plots.get('SeparateScan', False)
-            fig = plot_box_and_scatter(df, filter_cycle_boolean, 'variation', SeparateScanDir)
-            if include_plots.get('Picture', False):
-                fig.savefig(directory+"/"+ file_name[:-4]+"_boxplot.svg", format='svg', dpi = 800, bbox_inches = "tight", facecolor="white")
-            pdf.savefig(fig, dpi=300, transparent=True, bbox_inches='tight')
-            plt.close(fig)
+    # Download the curves of all samples that are plotted at once
+    curve_store = CurveStore(nomad_url, token, cache=cache, entry_index=build_entry_index(df))
+    needed_ids = []
+    if include_plots.get('JV', False):
+        needed_ids += result_df['maximum_efficiency_id'].tolist() + result_df['closest_median_id'].tolist()
+    if include_plots.get('EQE', False) or include_plots.get('MPP', False):
+        needed_ids += result_df['maximum_efficiency_id'].tolist()
+    curve_store.prefetch(needed_ids)
 
-        if include_plots.get('Hysteresis', False):
-            fig_hys = plot_hysteresis(df)
-            if include_plots.get('Picture', False):
-                fig_hys.savefig(directory+"/"+ file_name[:-4]+"_Hysteresis_JV.svg", format='svg', dpi = 800, bbox_inches = "tight", facecolor="white")
-            pdf.savefig(fig_hys, dpi=300, transparent=True, bbox_inches='tight')
-            plt.close(fig)
+    profiles = merge_export_profiles(export_profiles)
+
+    # Every part of the report is one job, the jobs are rendered in parallel and put together in this order
+    picture = include_plots.get('Picture', False)
+    def svg_path(suffix):
+        return directory + "/" + file_name[:-4] + suffix if picture else None
+
+    jobs = []
+    # Include JV Curves
+    if include_plots.get('JV', False):
+        jobs.append((plot_JV_curves, (result_df, 'maximum_efficiency', nomad_url, token, curve_store), svg_path("_Best_JV.svg")))
+        jobs.append((plot_JV_curves, (result_df, 'closest_median', nomad_url, token, curve_store), svg_path("_Median_JV.svg")))
 
-        # Include EQE Curves
-        if include_plots.get('EQE', False):
-            fig_eqe = plot_EQE_curves(df, result_df, nomad_url, token)
-            if include_plots.get('Picture', False):
-                fig_eqe.savefig(directory+"/"+ file_name[:-4]+"_EQE.svg", format='svg', dpi = 800, bbox_inches = "tight", facecolor="white")
-            pdf.savefig(fig_eqe, dpi=300, transparent=True, bbox_inches='tight')
-            plt.close(fig_eqe)
-
-        # Include MPP Curves
-        if include_plots.get('MPP', False):
-            fig_mpp = plot_MPP_curves(df, result_df, nomad_url, token)
-            if include_plots.get('Picture', False):
-                fig_mpp.savefig(directory+"/"+ file_name[:-4]+"_MPP_JV.svg", format='svg', dpi = 800, bbox_inches = "tight", facecolor="white")
-            pdf.savefig(fig_mpp, dpi=300, transparent=True, bbox_inches='tight')
-            plt.close(fig_mpp)
-
-        # Include Results Table
-        if include_plots.get('Table', False):
-            #Preparing results table
-            #Insert line breaks in 'ID' fields (or any other long columns)
-            for col in rounded_result_df.columns:
-                if 'ID' in col:  # Assuming 'ID' columns might be too wide
-                    rounded_result_df[col] = rounded_result_df[col].apply(lambda x: insert_line_breaks(str(x)) if isinstance(x, str) else x)
-            # Create a figure for the table
-            fig_table, ax_table = plt.subplots(figsize=(12, 6))
-            ax_table.axis('off')  # Hide axis
-            # Add the table to the figure
-            table = ax_table.table(cellText=rounded_result_df.values, colLabels=result_df.columns, loc='center', cellLoc='center')
-            # Set column widths
-            max_width = 15  # Set a max column width for readability
-            col_widths = []
-            
-            # Calculate the max length of content in each column
-            for i, column in enumerate(rounded_result_df.columns):
-                max_len = max(rounded_result_df[column].apply(lambda x: len(str(x)) if isinstance(x, str) else 0))  # Find max length of text in column
-                col_widths.append(min(max_len, max_width))  # Set the width to max length or max width
-            # Manually set column widths based on calculated values
-            for i, width in enumerate(col_widths):
-                table.auto_set_column_width([i])  # This will set the width for each column individually
-            # Save table to PDF
-            pdf.savefig(fig_table, dpi=300, transparent=True, bbox_inches='tight')
-            plt.close(fig_table)
-                    #Preparing best results table
-            # Create a figure for the table
-            fig_table2, ax_table2 = plt.subplots(figsize=(12, 6))
-            ax_table2.axis('off')  # Hide axis
-            # Add the table to the figure
-            table2 = ax_table2.table(cellText=rounded_best_df.values, colLabels=best_df.columns, loc='center', cellLoc='center')
-             
-            # Set column widths
-            max_width = 15  # Set a max column width for readability
-            col_widths = []
-            # Calculate the max length of content in each column
-            for i, column in enumerate(rounded_best_df.columns):
-                max_len = max(rounded_best_df[column].apply(lambda x: len(str(x)) if isinstance(x, str) else 0))  # Find max length of text in column
-                col_widths.append(min(max_len, max_width))  # Set the width to max length or max width
-                    # Manually set column widths based on calculated values
-            for i, width in enumerate(col_widths):
-                table2.auto_set_column_width([i])  # This will set the width for each column individually
-            # Save table to PDF
-            pdf.savefig(fig_table2, dpi=300, transparent=True, bbox_inches='tight')
-            plt.close(fig_table2)
+    # Include Box and Scatter Plots for PCE, FF, Voc, Jsc
+    if include_plots.get('Box+Scatter', False):
+        SeparateScanDir = include_plots.get('SeparateScan', False)
+        jobs.append((plot_box_and_scatter, (df, filter_cycle_boolean, 'variation', SeparateScanDir), svg_path("_boxplot.svg")))
+
+    if include_plots.get('Hysteresis', False):
+        jobs.append((plot_hysteresis, (df,), svg_path("_Hysteresis_JV.svg")))
+
+    # Include EQE Curves
+    if include_plots.get('EQE', False):
+        jobs.append((plot_EQE_curves, (df, result_df, nomad_url, token, curve_store), svg_path("_EQE.svg")))
+
+    # Include MPP Curves
+    if include_plots.get('MPP', False):
+        jobs.append((plot_MPP_curves, (df, result_df, nomad_url, token, curve_store), svg_path("_MPP_JV.svg")))
+
+    # Include Results Table
+    if include_plots.get('Table', False):
+        jobs.append((data_table_figures, (rounded_result_df, result_df.columns, rounded_best_df, best_df.columns), None))
+
+    # Include statistics tables (summary with confidence intervals, ANOVA, Tukey)
+    if include_plots.get('Statistics', False):
+        jobs.append((statistics_table_figures, (df,), None))
+
+    results = run_render_jobs([(*job, profiles) for job in jobs], render_workers)
+    pages = [page for job_pages, _ in results for page in job_pages]
+    exports = [export for _, job_exports in results for export in job_exports]
+    exports += write_pdf(pages, report_title, profiles['pdf'])
+    print_export_report(exports)
 
     print("PDF report generated successfully.")
     return(directory, file_name)
 
+### Rendering of the report parts ###____________________________________________________________________________________
+
+def render_figures(builder, args, svg_path=None, profiles=EXPORT_PROFILES):
+    """
+    Builds the figure(s) of one report part with builder(*args) and renders them, runs in a worker process.
+    If svg_path is given, the figure is saved there as svg too.
+    Returns one page per figure (pdf bytes if PyMuPDF can merge them, otherwise the pickled figure) and the exports
+    (see export_figure).
+    """
+    figures = builder(*args)
+    if not isinstance(figures, list):
+        figures = [figures]
+    pages = []
+    exports = []
+    for number, fig in enumerate(figures, start=1):
+        name = os.path.basename(svg_path) if svg_path else f"{builder.__name__} {number}"
+        if svg_path:
+            exports.append(export_figure(fig, svg_path, profiles['svg'], name))
+        if fitz is not None:
+            buffer = io.BytesIO()
+            exports.append(export_figure(fig, buffer, profiles['pdf'], name))
+            pages.append(buffer.getvalue())
+        else:
+            pages.append(pickle.dumps(fig))
+        plt.close(fig)
+    return pages, exports
+
+def dense_artists(fig, threshold):
+    """
+    Returns the artists of fig that are worth rasterizing: all scatter collections of an axis if the axis has more than
+    threshold scatter points together, and every line with more than threshold points.
+    """
+    artists = []
+    for ax in fig.axes:
+        collections = [collection for collection in ax.collections if len(collection.get_offsets()) > 1]
+        if sum(len(collection.get_offsets()) for collection in collections) > threshold:
+            artists += collections
+        artists += [line for line in ax.lines if len(line.get_xdata()) > threshold]
+    return artists
+
+def export_figure(fig, target, profile, name=""):
+    """
+    Saves fig with an export profile, the dense artists are rasterized only for this export.
+    target: file path, buffer or PdfPages
+    Returns a dict with the name, format, size in bytes (None for PdfPages), seconds and number of rasterized artists.
+    """
+    start = time.perf_counter()
+    threshold = profile.get('raster_threshold')
+    rasterized = [artist for artist in (dense_artists(fig, threshold) if threshold else []) if not artist.get_rasterized()]
+    for artist in rasterized:
+        artist.set_rasterized(True)
+    try:
+        if isinstance(target, PdfPages):
+            target.savefig(fig, **{key: value for key, value in profile['savefig'].items() if key != 'format'})
+        else:
+            fig.savefig(target, **profile['savefig'])
+    finally:
+        for artist in rasterized:
+            artist.set_rasterized(False)
+    if isinstance(target, str):
+        size = os.path.getsize(target)
+    else:
+        size = target.tell() if hasattr(target, 'tell') else None
+    return dict(name=name, format=profile['savefig']['format'], size=size, seconds=time.perf_counter() - start,
+                rasterized=len(rasterized))
+
+def print_export_report(exports):
+    """prints size and time of every exported figure."""
+    for export in exports:
+        size = f"{export['size'] / 1e6:7.2f} MB" if export['size'] is not None else "      - MB"
+        rasterized = f", {export['rasterized']} layers rasterized" if export['rasterized'] else ""
+        print(f"{export['format']:>3} {size} {export['seconds']:6.2f} s  {export['name']}{rasterized}")
+
+def apply_rc_params(rc_params):
+    """initializer of the render workers, uses the plot style of the parent process."""
+    mpl.rcParams.update(rc_params)
+
+def run_render_jobs(jobs, render_workers=None):
+    """
+    Renders the jobs (builder, args, svg_path, profiles) in a process pool and returns their (pages, exports) in the order of the jobs.
+    """
+    if render_workers is None:
+        render_workers = min(len(jobs), os.cpu_count() or 1)
+    if render_workers <= 1 or len(jobs) <= 1:
+        return [render_figures(*job) for job in jobs]
+    # spawn: the workers must not inherit the threads and the Tk state of the GUI. They only import the default style,
+    # so the rcParams set at runtime (plot style tool) are handed over, the workers keep their own backend
+    rc_params = {key: value for key, value in mpl.rcParams.items() if key != 'backend'}
+    with ProcessPoolExecutor(max_workers=render_workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=apply_rc_params, initargs=(rc_params,)) as executor:
+        return list(executor.map(render_figures, *zip(*jobs)))
+
+def write_pdf(pages, report_title, profile=EXPORT_PROFILES['pdf']):
+    """puts the rendered pages together into the pdf report, returns the exports of the pages rendered here."""
+    if fitz is not None:
+        report = fitz.open()
+        for page in pages:
+            with fitz.open(stream=page, filetype='pdf') as part:
+                report.insert_pdf(part)
+        report.save(report_title)
+        report.close()
+        return []
+    exports = []
+    with PdfPages(report_title) as pdf:
+        for number, page in enumerate(pages, start=1):
+            fig = pickle.loads(page)
+            exports.append(export_figure(fig, pdf, profile, f"page {number}"))
+            plt.close(fig)
+    return exports
+
+def data_table_figures(rounded_result_df, result_columns, rounded_best_df, best_columns):
+    """builds the results table and the best results table."""
+    #Insert line breaks in 'ID' fields (or any other long columns)
+    rounded_result_df = rounded_result_df.copy()
+    for col in rounded_result_df.columns:
+        if 'ID' in col:  # Assuming 'ID' columns might be too wide
+            rounded_result_df[col] = rounded_result_df[col].apply(lambda x: insert_line_breaks(str(x)) if isinstance(x, str) else x)
+    return [data_table_figure(rounded_result_df, result_columns), data_table_figure(rounded_best_df, best_columns)]
+
+def data_table_figure(table_df, columns):
+    """builds a figure with the table."""
+    # Create a figure for the table
+    fig_table, ax_table = plt.subplots(figsize=(12, 6))
+    ax_table.axis('off')  # Hide axis
+    # Add the table to the figure
+    table = ax_table.table(cellText=table_df.values, colLabels=columns, loc='center', cellLoc='center')
+    # Set the width of each column individually
+    for i in range(len(table_df.columns)):
+        table.auto_set_column_width([i])
+    return fig_table
+
+def statistics_table_figures(df):
+    """builds the statistics tables: summary with confidence intervals, ANOVA and Tukey."""
+    summary_df = calculate_summary_statistics(df)
+    anova_df, tukey_df = anova_tukey_tables(df)
+    figures = []
+    for title, table_df in [("Summary statistics (95% bootstrap CI of the mean)", summary_df),
+                            ("ANOVA between variations", anova_df),
+                            ("Tukey HSD (significant metrics)", tukey_df)]:
+        figures += table_figures(table_df, title)
+    return figures
+
+def table_figures(table_df, title, rows_per_page=30):
+    """
+    Renders a DataFrame as table figures, long tables are split over several pages.
+    Returns a list of figures (none for an empty table).
+    """
+    table_df = table_df.map(lambda x: round(x, 3) if isinstance(x, float) else x)
+    figures = []
+    for start in range(0, len(table_df), rows_per_page):
+        page = table_df.iloc[start:start + rows_per_page]
+        fig, ax = plt.subplots(figsize=(12, 1 + 0.3 * len(page)))
+        ax.axis('off')
+        ax.set_title(title)
+        table = ax.table(cellText=page.astype(str).values, colLabels=list(page.columns), loc='center', cellLoc='center')
+        # a fixed font size, the automatic one measures every cell again and again
+        table.auto_set_font_size(False)
+        table.set_fontsize(8)
+        table.auto_set_column_width(list(range(len(page.columns))))
+        figures.append(fig)
+    return figures
+
 def insert_line_breaks(text):
     """
     Insert line breaks after every 15 characters at the first '_'.
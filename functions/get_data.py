@@ -1,63 +1,134 @@
+import hashlib
 
-from matplotlib.backends.backend_pdf import PdfPages
 from openpyxl import load_workbook
+import numpy as np
 import pandas as pd
 
-from functions.api_calls_get_data import get_entryid, get_quantity_over_jv
+from functions.api_calls_get_data import (get_entryid, get_quantity_over_jv, extract_quantity_over_jv, fetch_new_linked_archives,
+                                          fetch_linked_archives, build_table_required, DEFAULT_MAX_WORKERS, DEFAULT_CHUNK_SIZE)
+
+#Standard JV parameters to get
+JV_QUANTITIES = ["efficiency", "fill_factor", "open_circuit_voltage", "short_circuit_current_density"]
+#timezone of the parsed measurement times (parse_datetime_column), the NOMAD times are UTC
+DATETIME_TIMEZONE = "UTC"
 
 
 ### Function to get data from excel and server  ###_____________________________________________________________________________________
 
 def get_data_excel_to_df(excel_file_path, nomad_url, token, key=["peroTF_CR_SpinBox_SpinCoating"], 
-    columns_from_excel=[['sample_id', 5], ['variation', 6]]) -> pd.DataFrame:
+    columns_from_excel=[['sample_id', 5], ['variation', 6]], max_workers=DEFAULT_MAX_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE,
+    cache=None, cache_mode="revalidate", high_water=None) -> pd.DataFrame:
     """columns_from excel: list of pairs of column name and column number (starting at 0) that will be read from the excel file.
+    max_workers: maximal number of parallel requests to the NOMAD server
+    chunk_size: number of samples whose measurements are fetched with one query (None for one query per sample)
+    cache: optional ArchiveCache, unchanged measurements are then read from disk instead of downloaded again
+    cache_mode: how the cache is used, see api_calls_get_data.CACHE_MODES
+    high_water: optional dict, filled with the high-water marks of the samples for refresh_batch_data
     """
-    #print(columns_from_excel)
-    #file_path = path + "ExperimentsInfo.xlsx"  
-    
-    workbook = load_workbook(filename=excel_file_path, data_only=True)
-    sheet = workbook.active  # Access the active worksheet
-
-    # Extract data from  specified columns, by default 6 (sample_id) and 7 (variation)
-    data = []
-    for row in sheet.iter_rows(min_row=3, values_only=True):
-        current_row = []
-        for pair in columns_from_excel:
-            current_row.append(row[pair[1]])
-        data.append(current_row)
-    #print(data)
-    # Convert the extracted data to a DataFrame
-    column_titles = [pair[0] for pair in columns_from_excel]
-    
-    excel_df = pd.DataFrame(data, columns=column_titles)
+    excel_df = read_experiment_sheet(excel_file_path, columns_from_excel)
     excel_df = excel_df.dropna(subset=["sample_id"])
-    excel_df = excel_df[~excel_df["sample_id"].isin(["#NAME?", "KIT_____"])]
+    excel_df = excel_df[~excel_df["sample_id"].isin(INVALID_SAMPLE_IDS)]
     
-    df, quantities = get_batch_data(excel_df["sample_id"].unique().tolist(), nomad_url, token, key=key)
+    df, quantities = get_batch_data(excel_df["sample_id"].unique().tolist(), nomad_url, token, key=key, max_workers=max_workers, chunk_size=chunk_size,
+                                    cache=cache, cache_mode=cache_mode, high_water=high_water)
     # Merge with the existing DataFrame on 'sample_id'
     # Assume `df` is your existing DataFrame
-    df = excel_df.merge(df, on="sample_id", how="left")
+    # 'entry_id' stays as a column, it is the lab_id -> entry_id index for the plots (see build_entry_index)
+    df = excel_df.merge(df.reset_index(), on="sample_id", how="left")
 
     # Print the updated DataFrame
     #print(df)
     return df
 
 
+### Streaming Excel ingestion ###__________________________________________________________________________________________________
+
+EXCEL_FIRST_ROW = 3  # row 1: title, row 2: column names
+INVALID_SAMPLE_IDS = ("#NAME?", "KIT_____")  # formula results of empty rows in the planning sheets
+EMPTY_ROWS_STOP = 500  # reading stops after this many rows without a sample_id
+EXCEL_CACHE_SIZE = 8
+
+_sheet_cache = {}  # (file hash, columns) -> DataFrame
+
+
+def file_hash(file_path, block_size=1 << 20):
+    """sha1 of the file content, changes whenever the file is saved again."""
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _is_sample_id(value):
+    if value is None or value in INVALID_SAMPLE_IDS:
+        return False
+    return not isinstance(value, str) or bool(value.strip())
+
+
+def read_experiment_sheet(excel_file_path, columns_from_excel=[['sample_id', 5], ['variation', 6]], use_cache=True) -> pd.DataFrame:
+    """reads the columns of columns_from_excel from the active sheet of the experiment workbook.
+    The workbook is streamed in read-only mode and only up to the last requested column, reading stops after the
+    last sample_id (trailing template rows are skipped). Parsed sheets are cached by file hash.
+    columns_from_excel: list of pairs of column name and column number (starting at 0)
+    """
+    columns = tuple((name, index) for name, index in columns_from_excel)
+    key = (file_hash(excel_file_path), columns) if use_cache else None
+    if key in _sheet_cache:
+        return _sheet_cache[key].copy()
+
+    titles = [name for name, _ in columns]
+    indices = [index for _, index in columns]
+    width = max(indices) + 1
+    sample_position = titles.index("sample_id") if "sample_id" in titles else None
+
+    data = []
+    last_sample_row = 0
+    empty_rows = 0
+    workbook = load_workbook(filename=excel_file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        for row in sheet.iter_rows(min_row=EXCEL_FIRST_ROW, max_col=width, values_only=True):
+            if len(row) < width:  # rows of read-only sheets end at their last cell
+                row = row + (None,) * (width - len(row))
+            data.append([row[index] for index in indices])
+            if sample_position is None:
+                continue
+            if _is_sample_id(data[-1][sample_position]):
+                last_sample_row = len(data)
+                empty_rows = 0
+            else:
+                empty_rows += 1
+                if empty_rows >= EMPTY_ROWS_STOP:
+                    break
+    finally:
+        workbook.close()  # read-only workbooks keep the file open
+    if sample_position is not None:
+        data = data[:last_sample_row]
+
+    excel_df = pd.DataFrame(data, columns=titles)
+    if key is not None:
+        if len(_sheet_cache) >= EXCEL_CACHE_SIZE:
+            _sheet_cache.pop(next(iter(_sheet_cache)))
+        _sheet_cache[key] = excel_df.copy()
+    return excel_df
+
+
 ### Function to get data from the server and process it ###_________________________________________________________________________
 
-def get_batch_data(sample_ids, nomad_url, token, quantities=["name"], key=["peroTF_CR_SpinBox_SpinCoating"]):
+def get_batch_data(sample_ids, nomad_url, token, quantities=["name"], key=["peroTF_CR_SpinBox_SpinCoating"], max_workers=DEFAULT_MAX_WORKERS,
+                   chunk_size=DEFAULT_CHUNK_SIZE, cache=None, cache_mode="revalidate", high_water=None):
     #Get the NOMAD ID
     samples_of_batch = get_entryid(sample_ids, nomad_url, token)
     #samples_of_batch = [(sample_id, get_entryid(sample_id, nomad_url, token)) for sample_id in sample_ids]
 
-    #Standard JV parameters to get
-    jv_quantities=["efficiency",\
-                   "fill_factor",\
-                   "open_circuit_voltage",\
-                   "short_circuit_current_density"]
-    
     #Get data
-    df = get_quantity_over_jv(samples_of_batch, key, quantities, jv_quantities, nomad_url, token)
+    df = get_quantity_over_jv(samples_of_batch, key, quantities, JV_QUANTITIES, nomad_url, token,
+                              max_workers=max_workers, chunk_size=chunk_size, cache=cache, cache_mode=cache_mode,
+                              high_water=high_water)
+
+    # Parse the measurement times once, the filters compare the typed column
+    df["datetime"] = parse_datetime_column(df["datetime"])
     
     #Extract Information from ID
     #df['last_digit'] = df['sample_id'].str.extract('(\d)$').astype(int)[0]
@@ -75,7 +146,70 @@ def get_batch_data(sample_ids, nomad_url, token, quantities=["name"], key=["pero
     return df, quantities
 
 
+### Incremental refresh ###________________________________________________________________________________________________________
 
+def refresh_batch_data(df, high_water, nomad_url, token, quantities=["name"], key=["peroTF_CR_SpinBox_SpinCoating"],
+                       max_workers=DEFAULT_MAX_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE, cache=None) -> pd.DataFrame:
+    """
+    adds the JV measurements that were uploaded since the last load to a loaded DataFrame, only the new entries are downloaded.
+    df: DataFrame of get_data_excel_to_df (with the column 'entry_id')
+    high_water: high-water marks filled by get_data_excel_to_df, they are updated here
+    quantities, key: like for get_batch_data
 
-
+    returns: df with the new rows, sorted by sample like the excel sheet
+    """
+    required = build_table_required(quantities, JV_QUANTITIES)
+    new_links, marks = fetch_new_linked_archives(high_water, nomad_url, token, max_workers=max_workers, chunk_size=chunk_size,
+                                                 cache=cache, required=required)
+    changed = {entry_id: mark["sample_id"] for entry_id, mark in high_water.items() if new_links.get(entry_id)}
+
+    # samples with their first JV measurements have no process quantities in df yet, all their entries are needed
+    loaded_jv = set(df.loc[df["px#"].notna(), "sample_id"])
+    first_jv = [entry_id for entry_id, sample_id in changed.items() if sample_id not in loaded_jv
+                and any("JVmeasurement" in link["archive"]["metadata"]["entry_type"] for link in new_links[entry_id])]
+    if first_jv:
+        new_links.update(fetch_linked_archives(first_jv, nomad_url, token, max_workers=max_workers, chunk_size=chunk_size,
+                                               cache=cache, required=required))
+    samples = pd.DataFrame({"entry_id": list(changed), "entry_name": list(changed.values())})
+    new_rows = extract_quantity_over_jv(samples, new_links, key, quantities, JV_QUANTITIES).reset_index()
+    high_water.update(marks)
+    if new_rows.empty:
+        return df
+
+    # the excel columns are taken from the loaded rows of the sample, the process quantities too if they were not fetched again
+    loaded = df.drop_duplicates(subset="sample_id").set_index("sample_id")
+    for quantity in quantities:
+        new_rows[quantity] = new_rows[quantity].fillna(new_rows["sample_id"].map(loaded[quantity]))
+    excel_columns = [column for column in df.columns if column not in new_rows.columns]
+    new_rows = new_rows.merge(loaded[excel_columns], left_on="sample_id", right_index=True)[df.columns]
+    new_rows["datetime"] = parse_datetime_column(new_rows["datetime"])
+
+    # samples without measurements so far had one empty row from the merge with the excel sheet
+    placeholder = df["sample_id"].isin(new_rows["sample_id"]) & df["px#"].isna()
+    combined = pd.concat([df[~placeholder], new_rows], ignore_index=True)
+    sample_order = pd.Index(pd.unique(df["sample_id"]))
+    order = np.argsort(sample_order.get_indexer(combined["sample_id"]), kind="stable")
+    return combined.iloc[order].reset_index(drop=True)
+
+
+### Datetime parsing ###_____________________________________________________________________________________________________________
+
+def parse_datetime_column(series: pd.Series) -> pd.Series:
+    """
+    Parses a column of measurement times into a datetime64 column in DATETIME_TIMEZONE (all values at once).
+    Handles the ISO format ('2025-08-21T12:01:28+00:00', converted to DATETIME_TIMEZONE, so the offset is kept)
+    and the simple format ('2025-08-21 13:01'), times without offset are taken as DATETIME_TIMEZONE.
+    Values that are no ISO8601 (e.g. '21.08.2025 13:01') are parsed one by one with dayfirst, like the old parser.
+    Values that can't be parsed become NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if series.dt.tz is None:
+            return series.dt.tz_localize(DATETIME_TIMEZONE)
+        return series.dt.tz_convert(DATETIME_TIMEZONE)
+    text = series.astype("string")
+    parsed = pd.to_datetime(text, format="ISO8601", errors="coerce", utc=True)
+    failed = parsed.isna() & text.notna()
+    if failed.any():
+        parsed[failed] = pd.to_datetime(text[failed], format="mixed", dayfirst=True, errors="coerce", utc=True)
+    return parsed.dt.tz_convert(DATETIME_TIMEZONE)
 
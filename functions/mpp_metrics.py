@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+from functions.curve_store import CurveStore
+
+
+### Degradation metrics of MPP tracking curves ###_______________________________________________________________________________________
+# All curves of a batch are put one after the other into one array, the windowed sums and fits are calculated for all curves at once
+# with cumulative sums and np.add.reduceat per curve (no python loop over the points or the curves).
+
+#metrics of every MPP curve, added to the JV data as 'mpp_<metric>' (add_mpp_metrics)
+MPP_METRICS = ['P_max', 't_max', 'T90', 'T90_extrapolated', 'T80', 'T80_extrapolated', 'burn_in', 'linear_decay_rate', 'exp_decay_rate']
+#points of the moving average used to find the maximum and the T90/T80 crossings (noise of the tracking)
+SMOOTH_POINTS = 21
+#curves with fewer points get no metrics
+MIN_POINTS = 3
+
+
+def _moving_average(values, starts, ends, seg, half):
+    """centered moving average over 2*half+1 points, the window is cut at the start and end of every curve."""
+    index = np.arange(len(values))
+    csum = np.concatenate(([0.0], np.cumsum(values)))
+    lo = np.maximum(index - half, starts[seg])
+    hi = np.minimum(index + half + 1, ends[seg])
+    return (csum[hi] - csum[lo]) / (hi - lo)
+
+
+def _linear_fits(x, y, mask, starts):
+    """least squares line y = slope * x + intercept per curve over the points where mask is True, NaN with less than 2 points."""
+    def total(values):
+        return np.add.reduceat(np.where(mask, values, 0.0), starts)
+    n, sx, sy = total(np.ones_like(x)), total(x), total(y)
+    sxx, sxy = total(x * x), total(x * y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (n * sxy - sx * sy) / (n * sxx - sx ** 2)
+        intercept = (sy - slope * sx) / n
+    return slope, intercept
+
+
+def degradation_metrics(curves, smooth_points=SMOOTH_POINTS) -> pd.DataFrame:
+    """
+    degradation metrics of MPP tracking curves.
+    curves: list of (time, pce) arrays, time in s
+    returns one row per curve with the columns MPP_METRICS:
+        P_max, t_max: maximum of the smoothed pce and its time
+        T90, T80: time at which the smoothed pce drops below 90 / 80 % of P_max after the maximum. If the curve never gets there, the
+                  line fitted from the maximum on is extrapolated (T.._extrapolated is True), NaN if the curve does not decay
+        burn_in: initial loss in % of P_max, difference between P_max and the exponential fit of the second half of the curve (after
+                 the maximum) at t_max
+        linear_decay_rate: slope of the linear fit from the maximum on in % of P_max per hour (positive = loss)
+        exp_decay_rate: decay constant k of pce = A * exp(-k t) fitted from the maximum on, in 1/h
+    """
+    result = pd.DataFrame(np.nan, index=range(len(curves)), columns=MPP_METRICS)
+    result[['T90_extrapolated', 'T80_extrapolated']] = False
+
+    cleaned = []
+    for time, pce in curves:
+        time, pce = np.asarray(time, dtype=float), np.asarray(pce, dtype=float)
+        valid = np.isfinite(time) & np.isfinite(pce)
+        cleaned.append((time[valid], pce[valid]))
+    used = [number for number, (time, _) in enumerate(cleaned) if len(time) >= MIN_POINTS]
+    if not used:
+        return result
+
+    # all curves in one array, seg is the number of the curve of every point
+    lengths = np.array([len(cleaned[number][0]) for number in used])
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    ends = starts + lengths
+    seg = np.repeat(np.arange(len(used)), lengths)
+    t = np.concatenate([cleaned[number][0] for number in used])
+    p = np.concatenate([cleaned[number][1] for number in used])
+    order = np.lexsort((t, seg))  # time sorted within each curve
+    t, p = t[order], p[order]
+    index = np.arange(len(t))
+    no_index = len(t)
+
+    # Maximum of the smoothed curve, first point if it is reached more than once
+    smooth = _moving_average(p, starts, ends, seg, max(smooth_points, 1) // 2)
+    p_max = np.maximum.reduceat(smooth, starts)
+    i_max = np.minimum.reduceat(np.where(smooth == p_max[seg], index, no_index), starts)
+    t_max = t[i_max]
+    after = index >= i_max[seg]
+
+    # Linear and exponential fit from the maximum on, x relative to t_max for precision
+    x = t - t_max[seg]
+    slope, intercept = _linear_fits(x, p, after, starts)
+    positive = after & (p > 0)
+    exp_slope, _ = _linear_fits(x, np.log(np.where(positive, p, 1.0)), positive, starts)
+
+    # Burn-in: exponential fit of the second half of the curve after the maximum, its value at t_max compared to P_max
+    x_end = t[ends - 1] - t_max
+    late = positive & (x >= x_end[seg] / 2)
+    _, late_log_intercept = _linear_fits(x, np.log(np.where(late, p, 1.0)), late, starts)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics = {
+            'P_max': p_max,
+            't_max': t_max,
+            'burn_in': np.clip(100 * (1 - np.exp(late_log_intercept) / p_max), 0, None),
+            'linear_decay_rate': -100 * 3600 * slope / p_max,
+            'exp_decay_rate': -3600 * exp_slope,
+        }
+        for name, fraction in (('T90', 0.9), ('T80', 0.8)):
+            target = fraction * p_max
+            # first point after the maximum below the target, the crossing is interpolated with the point before
+            first = np.minimum.reduceat(np.where(after & (smooth < target[seg]), index, no_index), starts)
+            reached = first < no_index
+            below = np.where(reached, first, i_max)
+            above = np.maximum(below - 1, 0)
+            crossing = t[above] + (target - smooth[above]) * (t[below] - t[above]) / (smooth[below] - smooth[above])
+            extrapolated = t_max + (target - intercept) / slope
+            metrics[name] = np.where(reached, crossing, np.where(slope < 0, extrapolated, np.nan))
+            metrics[f'{name}_extrapolated'] = ~reached & (slope < 0)
+
+    for name, values in metrics.items():
+        result.loc[used, name] = values
+    return result
+
+
+def get_mpp_metrics(sample_ids, nomad_url, token, cache=None, entry_index=None, curve_store=None) -> pd.DataFrame:
+    """
+    degradation metrics of every MPP tracking entry of the samples.
+    curve_store: CurveStore with the MPP curves (e.g. of a report), otherwise the curves are fetched
+    returns: DataFrame with sample_id, mpp_entry (number of the entry of the sample) and MPP_METRICS
+    """
+    store = curve_store or CurveStore(nomad_url, token, entry_types=['MPPTracking'], cache=cache, entry_index=entry_index)
+    sample_ids = [sample_id for sample_id in dict.fromkeys(sample_ids) if sample_id is not None and sample_id == sample_id]
+    store.prefetch(sample_ids)
+
+    rows, curves = [], []
+    for sample_id in sample_ids:
+        for number, mpp_data in enumerate(store.get(sample_id, 'MPPTracking')):
+            if mpp_data.get('time') is None or mpp_data.get('efficiency') is None:
+                continue
+            rows.append((sample_id, number))
+            curves.append((mpp_data['time'], mpp_data['efficiency']))
+    entries = pd.DataFrame(rows, columns=['sample_id', 'mpp_entry'])
+    return pd.concat([entries, degradation_metrics(curves)], axis=1)
+
+
+def add_mpp_metrics(df, metrics) -> pd.DataFrame:
+    """
+    adds the metrics of the best MPP entry (highest P_max) of every sample as columns 'mpp_<metric>' to the JV data,
+    so they can be filtered and plotted like the JV parameters. Columns of an earlier call are replaced, samples without MPP get NaN.
+    """
+    best = metrics.sort_values('P_max', ascending=False, kind='stable', na_position='last').drop_duplicates('sample_id')
+    best = best.set_index('sample_id')[MPP_METRICS].add_prefix('mpp_')
+    df = df.drop(columns=[column for column in best.columns if column in df.columns])
+    return df.join(best, on='sample_id')
@@ -8,8 +8,17 @@ from matplotlib.ticker import MaxNLocator
 import numpy as np
 import pandas as pd
 import math
-from scipy.stats import linregress
 from functions.api_calls_get_data import get_specific_data_of_sample
+from functions.calculate_statistics import hysteresis_index, JV_METRICS
+from functions.mpp_metrics import degradation_metrics
+
+
+def get_curves(sample_id, entry_type, nomad_url, token, curve_store=None, entry_index=None):
+    """returns the entries of entry_type of a sample, from the curve store if one is given, otherwise from the server.
+    entry_index: lab_id -> entry_id of the loaded data, saves the id lookup on the server"""
+    if curve_store is not None:
+        return curve_store.get(sample_id, entry_type)
+    return get_specific_data_of_sample(sample_id, entry_type, nomad_url, token, entry_index=entry_index)
 
 def get_smart_axis_limits(data, quantity_name):
     """
@@ -82,6 +91,65 @@ def get_smart_axis_limits(data, quantity_name):
         else:
             return math.floor(y_min * 100) / 100, math.ceil(y_max * 100) / 100
 
+#maximal number of plotted points per MPP curve, longer traces are downsampled with downsample_lttb
+MPP_POINT_BUDGET = 2000
+#time range of the MPP plot in s, None: the whole tracking
+MPP_TIME_RANGE = None
+
+def clip_to_range(x, y, xmin, xmax):
+    """
+    Keeps the points of a curve with sorted x inside [xmin, xmax] and one neighbour on each side,
+    so the line still runs to the edge of the axis. Non finite points are dropped.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y = x[finite], y[finite]
+    start = max(np.searchsorted(x, xmin, side='left') - 1, 0)
+    stop = min(np.searchsorted(x, xmax, side='right') + 1, len(x))
+    return x[start:stop], y[start:stop]
+
+def downsample_lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling of a curve to n_out points, keeps the shape (peaks, drops) of the curve.
+    The first and the last point are kept, from every bucket in between the point that spans the largest triangle with
+    the point selected before and the mean of the next bucket.
+
+    Args:
+        x, y: arrays of the curve, x sorted
+        n_out: number of points that are returned, curves with less points are returned unchanged
+
+    Returns:
+        tuple: (x, y) of the selected points
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    # n_out - 2 buckets between the first and the last point, bucket k holds the points edges[k]:edges[k+1]
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    sum_x = np.concatenate(([0.0], np.cumsum(x)))
+    sum_y = np.concatenate(([0.0], np.cumsum(y)))
+    counts = np.diff(edges)
+    mean_x = (sum_x[edges[1:]] - sum_x[edges[:-1]]) / counts
+    mean_y = (sum_y[edges[1:]] - sum_y[edges[:-1]]) / counts
+    # the triangle of bucket k ends at the mean of bucket k+1, the one of the last bucket at the last point
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for k in range(n_out - 2):
+        start, stop = edges[k], edges[k + 1]
+        # twice the triangle area of (a, point, next mean) for all points of the bucket
+        area = np.abs((x[a] - next_x[k]) * (y[start:stop] - y[a]) - (x[a] - x[start:stop]) * (next_y[k] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[k + 1] = a
+    return x[selected], y[selected]
+
 # Custom color palette for specific groups (Daniel's colors)
 DANIEL_COLORS = {
     'RepA': '#001898',
@@ -110,7 +178,7 @@ DANIEL_COLORS = {
 
 ### Function to plot JV curves ###______________________________________________________________________________________________________
 
-def plot_JV_curves(result_df, curve_type, nomad_url, token):
+def plot_JV_curves(result_df, curve_type, nomad_url, token, curve_store=None, entry_index=None):
 
     fig, ax = plt.subplots()
     
@@ -132,7 +200,7 @@ def plot_JV_curves(result_df, curve_type, nomad_url, token):
     max_Voc = 0
     PCE = None
     for index, row in result_df.iterrows():
-        jv_data = get_specific_data_of_sample(row[f'{curve_type}_id'], "JVmeasurement", nomad_url, token)
+        jv_data = get_curves(row[f'{curve_type}_id'], "JVmeasurement", nomad_url, token, curve_store, entry_index)
         found_curve = False  # Flag to stop both loops
         for cell in jv_data:
             for i in range(2):
@@ -194,7 +262,7 @@ def plot_JV_curves(result_df, curve_type, nomad_url, token):
 
 ### Function to plot EQE curves ###_____________________________________________________________________________________________________
 
-def plot_EQE_curves(df, result_df, nomad_url, token):
+def plot_EQE_curves(df, result_df, nomad_url, token, curve_store=None, entry_index=None):
     
     max_EQE = .0
     wellenlenge_min = np.inf
@@ -211,16 +279,18 @@ def plot_EQE_curves(df, result_df, nomad_url, token):
     for index, row in result_df.iterrows():
         try:
             # Data from server
-            eqe_data = get_specific_data_of_sample(row[f'maximum_efficiency_id'], 'EQEmeasurement', nomad_url, token)
+            eqe_data = get_curves(row[f'maximum_efficiency_id'], 'EQEmeasurement', nomad_url, token, curve_store, entry_index)
             # See if data is returned
             eqe_data[0]
         except IndexError:
             # Sort df by maximum efficiency and try again
             variation = row['category']
             sorted_df = df[df['variation'] == variation].sort_values(by='efficiency', ascending=False)
+            if curve_store is not None:
+                curve_store.prefetch(sorted_df['sample_id'].unique())
             for _, sorted_row in sorted_df.iterrows():
                 try:
-                    eqe_data = get_specific_data_of_sample(sorted_row[f'sample_id'], 'EQEmeasurement', nomad_url, token)
+                    eqe_data = get_curves(sorted_row[f'sample_id'], 'EQEmeasurement', nomad_url, token, curve_store, entry_index)
                     eqe_data[0]
                     break
                 except IndexError:
@@ -273,7 +343,14 @@ def plot_EQE_curves(df, result_df, nomad_url, token):
 
 ### Function to plot MPP curves ###_____________________________________________________________________________________________________
 
-def plot_MPP_curves(df, result_df, nomad_url, token):
+def plot_MPP_curves(df, result_df, nomad_url, token, curve_store=None, entry_index=None, point_budget=MPP_POINT_BUDGET,
+                    time_range=MPP_TIME_RANGE):
+    """
+    point_budget: maximal number of plotted points per curve (None: all), T80 is calculated with all points
+    time_range: (start, end) of the time axis in s, None: the whole tracking of the longest curve
+    """
+    xmin, xmax = time_range if time_range is not None else (0, None)
+    t_end = 0  # end of the longest curve, used if xmax is None
     
     fig, ax = plt.subplots()
     
@@ -287,15 +364,17 @@ def plot_MPP_curves(df, result_df, nomad_url, token):
         #Data from server
         try:
             # Data from server
-            mpp_data = get_specific_data_of_sample(row[f'maximum_efficiency_id'],'MPPTracking', nomad_url, token)            # See if data is returned
+            mpp_data = get_curves(row[f'maximum_efficiency_id'],'MPPTracking', nomad_url, token, curve_store, entry_index)            # See if data is returned
             mpp_data[0]
         except IndexError:
             # Sort df by maximum efficiency and try again
             variation = row['category']
             sorted_df = df[df['variation'] == variation].sort_values(by='efficiency', ascending=False)
+            if curve_store is not None:
+                curve_store.prefetch(sorted_df['sample_id'].unique())
             for _, sorted_row in sorted_df.iterrows():
                 try:
-                    mpp_data = get_specific_data_of_sample(sorted_row[f'sample_id'], 'MPPTracking', nomad_url, token)
+                    mpp_data = get_curves(sorted_row[f'sample_id'], 'MPPTracking', nomad_url, token, curve_store, entry_index)
                     mpp_data[0]
                     break
                 except IndexError:
@@ -310,28 +389,21 @@ def plot_MPP_curves(df, result_df, nomad_url, token):
         voltage_array = mpp_data[0]['voltage']
         last_pce = mpp_data[0]['properties']['last_pce']
 
-        # Schritt 1: Maximum finden
-        max_idx = np.argmax(pce_array)
-        P_max = pce_array[max_idx]
-        P_80 = 0.8 * P_max
-
-        # Schritt 2: Fit ab Maximum
-        x_fit = time_array[max_idx:]
-        y_fit = pce_array[max_idx:]
-        slope, intercept, *_ = linregress(x_fit, y_fit)
-
-        # Schritt 3: Schnittpunkt mit P_80 berechnen
-        # P_80 = slope * x_T80 + intercept  →  x_T80 = (P_80 - intercept) / slope
-        x_T80 = (P_80 - intercept) / slope
-        #Plot
-        ax.plot(time_array, pce_array, label=f"{row['category']} | T80 = {x_T80:.1f}s", color=colors[index])
-        ax.hlines(y=max(pce_array), xmin=0, xmax=300, colors=colors[index], linestyles='--', linewidth=.5)
-        print(row[f'maximum_efficiency_id'])
+        # T80 of the smoothed curve, extrapolated if the curve does not get there (see mpp_metrics)
+        x_T80 = degradation_metrics([(time_array, pce_array)]).loc[0, 'T80']
+        #Plot, only the visible part and downsampled to the point budget
+        plot_time, plot_pce = clip_to_range(time_array, pce_array, xmin, xmax if xmax is not None else np.inf)
+        curve_end = np.nanmax(time_array, initial=0)
+        t_end = max(t_end, curve_end)
+        if point_budget:
+            plot_time, plot_pce = downsample_lttb(plot_time, plot_pce, point_budget)
+        ax.plot(plot_time, plot_pce, label=f"{row['category']} | T80 = {x_T80:.1f}s", color=colors[index])
+        ax.hlines(y=max(pce_array), xmin=xmin, xmax=xmax if xmax is not None else curve_end, colors=colors[index], linestyles='--', linewidth=.5)
                         
  
     # Plot settings
     ax.legend()
-    ax.set_xlim(0, 300)
+    ax.set_xlim(xmin, xmax if xmax is not None else (t_end or None))
     #ax.set_ylim(0, 25)
     ax.set_title(f'MPP Tracking')
     ax.set_xlabel('Time (s)')
@@ -446,140 +518,53 @@ def plot_box_and_scatter(df, filter_cycle_boolean, quantity=['variation'], Separ
     fig, axes = plt.subplots(2, 2, figsize=(15, 10))  # 2x2 grid of subplots
     axes = axes.flatten()  # Flatten to make indexing easier
     
-    positions = [i + 1 for i in range(len(sorted_groups))]  # Define positions for each group
+    # Box of every row: index of its variation, with SeparateScanDir two boxes per variation (backwards, forwards)
+    variation_code = pd.factorize(df[quantity], use_na_sentinel=False)[0]
+    box_index = np.arange(len(sorted_groups))
+    if SeparateScanDir:
+        direction = df['scan_direction'].map({'backwards': 0, 'forwards': 1}).to_numpy(dtype=float)
+        box = np.where(np.isnan(direction), -1, 2 * variation_code + np.nan_to_num(direction)).astype(int)
+        # backwards scans shifted to the left, forwards scans to the right of the variation tick
+        box_positions = (box_index + 1) / 2 + np.where(box_index % 2 == 0, 0.3, 0.2)
+    else:
+        box = variation_code
+        box_positions = box_index + 1.0
+
+    # Marker and transparency of the points: one style, or one per cycle (rows without cycle are not shown then)
+    if filter_cycle_boolean or df['Cycle#'].isna().all():
+        markers = [scatter_cycle_marker[1]]
+        alphas = [0.9]
+        point_marker = np.zeros(len(df), dtype=int)
+    else:
+        cycles = sorted(df['Cycle#'].dropna().unique())
+        markers = [scatter_cycle_marker.get(k + 1, 'o') for k in range(len(cycles))]
+        alphas = [max(0.9 - k / len(df['Cycle#'].unique()), 0) for k in range(len(cycles))]
+        point_marker = pd.Index(cycles).get_indexer(df['Cycle#'])
+
+    # Jitter of all points at once, the rows of every marker style as one array
+    shown = np.flatnonzero((box >= 0) & (point_marker >= 0))
+    shown = shown[np.argsort(point_marker[shown], kind='stable')]
+    jittered_x = np.full(len(df), np.nan)
+    jittered_x[shown] = box_positions[box[shown]] + np.random.normal(loc=0, scale=0.05, size=len(shown))
+    marker_rows = np.split(shown, np.cumsum(np.bincount(point_marker[shown], minlength=len(markers)))[:-1])
 
     for i, ax in enumerate(axes):
+        values = df[jv_quantity[i]].to_numpy(dtype=float)
+
+        # All boxes with one boxplot call, the values sorted by box
+        rows = np.flatnonzero((box >= 0) & ~np.isnan(values))
+        rows = rows[np.argsort(box[rows], kind='stable')]
+        box_data = np.split(values[rows], np.cumsum(np.bincount(box[rows], minlength=len(box_index)))[:-1])
+        boxes = ax.boxplot(box_data, positions=box_positions, showmeans=False, showfliers=False, widths=0.4, patch_artist=True,
+                           boxprops=dict(edgecolor='black'), medianprops=dict(color='red'))
+        for patch, color in zip(boxes['boxes'], colors):
+            patch.set_facecolor(color)
+
+        # One scatter per marker style with the points of all groups (one marker per collection keeps the svg small)
+        for marker, alpha, points in zip(markers, alphas, marker_rows):
+            points = points[~np.isnan(values[points])]
+            ax.scatter(jittered_x[points], values[points], color='black', alpha=alpha, zorder=2, s=25, marker=marker)
 
-        # Draw the box plot without fliers and with colors
-        medianprops = dict(color='red')
-        for j, (group, color) in enumerate(zip(sorted_groups, colors)):
-            if SeparateScanDir:
-                # Separate data into backward and forward scan directions
-                if group.endswith("_bw"):
-                    base_group = group[:-3]  # Remove "_bw" suffix
-                    group_data = df[
-                        (df[quantity].astype(str) == str(base_group)) & 
-                        (df['scan_direction'] == 'backwards')
-                    ][jv_quantity[i]].dropna()
-                    # Apply shift to the left for backward scans
-                    group_position = positions[j]/2 + 0.3
-                elif group.endswith("_fw"):
-                    base_group = group[:-3]  # Remove "_fw" suffix
-                    group_data = df[
-                        (df[quantity].astype(str) == str(base_group)) & 
-                        (df['scan_direction'] == 'forwards')
-                    ][jv_quantity[i]].dropna()
-                    # Apply shift to the right for forward scans
-                    group_position = positions[j]/2 + 0.2
-            else:
-                # Group data by variation only
-                group_data = df[df[quantity].astype(str) == str(group)][jv_quantity[i]].dropna()
-                group_position = positions[j]
-
-            # Plot the boxplot
-            ax.boxplot(group_data, positions=[group_position], showmeans=False, showfliers=False, widths=0.4, patch_artist=True,
-                       boxprops=dict(facecolor=color, color='black'),
-                       medianprops=medianprops)
-            
-        if filter_cycle_boolean: #hier optimum
-            for j, group in enumerate(sorted_groups):
-                    if SeparateScanDir:
-                        # Separate data into backward and forward scan directions
-                        if group.endswith("_bw"):
-                            base_group = group[:-3]  # Remove "_bw" suffix
-                            group_data = df[
-                                (df[quantity] == base_group) & 
-                                (df['scan_direction'] == 'backwards')
-                            ][jv_quantity[i]].dropna()
-                            # Apply shift to the left for backward scans
-                            group_position = positions[j]/2 + 0.3
-                        elif group.endswith("_fw"):
-                            base_group = group[:-3]  # Remove "_fw" suffix
-                            group_data = df[
-                                (df[quantity] == base_group) & 
-                                (df['scan_direction'] == 'forwards') 
-                            ][jv_quantity[i]].dropna()
-                            # Apply shift to the right for forward scans
-                            group_position = positions[j]/2 + 0.2
-                    else:
-                        # Group data by variation only
-                        group_data = df[(df[quantity] == group)][jv_quantity[i]].dropna()
-                        group_position = positions[j]
-
-                    # Add jitter to x positions
-                    jittered_x = np.random.normal(loc=group_position, scale=0.05, size=len(group_data))
-                    ax.scatter(jittered_x, group_data, color='black', alpha=0.9, zorder=2, s=25, marker='o')
-
-        else: #falls nur nans sind geht das hier schief das muss extra abgedeckt werden
-            if df['Cycle#'].isna().all():
-                alpha = 0.9 
-                # Overlay the scatter plot with black points
-                for j, group in enumerate(sorted_groups):
-                    if SeparateScanDir:
-                        # Separate data into backward and forward scan directions
-                        if group.endswith("_bw"):
-                            base_group = group[:-3]  # Remove "_bw" suffix
-                            group_data = df[
-                                (df[quantity] == base_group) & 
-                                (df['scan_direction'] == 'backwards') 
-                            ][jv_quantity[i]].dropna()
-                            # Apply shift to the left for backward scans
-                            group_position = positions[j]/2 + 0.3
-                        elif group.endswith("_fw"):
-                            base_group = group[:-3]  # Remove "_fw" suffix
-                            group_data = df[
-                                (df[quantity] == base_group) & 
-                                (df['scan_direction'] == 'forwards') 
-                            ][jv_quantity[i]].dropna()
-                            # Apply shift to the right for forward scans
-                            group_position = positions[j]/2 + 0.2
-                    else:
-                        # Group data by variation only
-                        group_data = df[(df[quantity] == group)][jv_quantity[i]].dropna()
-                        group_position = positions[j]
-
-                    # Add jitter to x positions
-                    jittered_x = np.random.normal(loc=group_position, scale=0.05, size=len(group_data))
-                    ax.scatter(jittered_x, group_data, color='black', alpha=alpha, zorder=2, s=25, marker=scatter_cycle_marker[1])
-
-                
-            else:
-                for k, cyclegroup in enumerate(sorted(df['Cycle#'].dropna().unique())):
-                    alpha = 0.9 - k / len(df['Cycle#'].unique())
-                    # Overlay the scatter plot with black points
-                    for j, group in enumerate(sorted_groups):
-                        if SeparateScanDir:
-                            # Separate data into backward and forward scan directions
-                            if group.endswith("_bw"):
-                                base_group = group[:-3]  # Remove "_bw" suffix
-                                group_data = df[
-                                    (df[quantity] == base_group) & 
-                                    (df['scan_direction'] == 'backwards') &
-                                    (df['Cycle#'] == cyclegroup)
-                                ][jv_quantity[i]].dropna()
-                                # Apply shift to the left for backward scans
-                                group_position = positions[j]/2 + 0.3
-                            elif group.endswith("_fw"):
-                                base_group = group[:-3]  # Remove "_fw" suffix
-                                group_data = df[
-                                    (df[quantity] == base_group) & 
-                                    (df['scan_direction'] == 'forwards') &
-                                    (df['Cycle#'] == cyclegroup)
-                                ][jv_quantity[i]].dropna()
-                                # Apply shift to the right for forward scans
-                                group_position = positions[j]/2 + 0.2
-                        else:
-                            # Group data by variation only
-                            group_data = df[(df[quantity] == group) & (df['Cycle#'] == cyclegroup)][jv_quantity[i]].dropna()
-                            group_position = positions[j]
-
-                        # Add jitter to x positions
-                        jittered_x = np.random.normal(loc=group_position, scale=0.05, size=len(group_data))
-                        ax.scatter(jittered_x, group_data, color='black', alpha=alpha, zorder=2, s=25, marker=scatter_cycle_marker[k+1])
-        
-
-        
-        
         # Axis label and Ticks
         ax.set_ylabel(f"{jv_quantity_labels[jv_quantity[i]]}", size=16)
         ax.set_xticks([i + 1 for i in range(len(sorted_variations))])
@@ -618,20 +603,11 @@ def plot_box_and_scatter(df, filter_cycle_boolean, quantity=['variation'], Separ
     return fig
 
 #hysteresis plot function
-def plot_hysteresis(df): #quantity is here default 'variation'
-
-    # Berechnung der Quotienten für jede Variation
-    quotient_data = []
-    for i, variation in enumerate(df['variation'].unique()):
-        subset = df[df['variation'] == variation]
-        backwards = subset[subset['scan_direction'] == 'backwards']['efficiency'].values
-        forwards = subset[subset['scan_direction'] == 'forwards']['efficiency'].values
-        
-        quotient = (backwards - forwards) / backwards  # Elementweise Division
-        for q in quotient:
-            quotient_data.append({'variation': variation, 'quotient': q})
+def plot_hysteresis(df, metric='efficiency'): #quantity is here default 'variation'
 
-    df_quotient = pd.DataFrame(quotient_data)
+    # Hysterese (backwards - forwards) / backwards, Scans gepaart über sample_id, px# und Cycle#
+    df_quotient = hysteresis_index(df, metrics={metric: JV_METRICS.get(metric, metric)})
+    df_quotient = df_quotient.rename(columns={'hysteresis_index': 'quotient'})
 
     # Farben für die Boxplots
     base_colors = plt.cm.viridis(np.linspace(0, 0.95, len(df_quotient['variation'].unique())))
@@ -667,7 +643,7 @@ def plot_hysteresis(df): #quantity is here default 'variation'
         ax.scatter(jittered_x, group_data, color='black', alpha=0.9, zorder=2, s=25)
 
     # Achsenbeschriftung
-    ax.set_ylabel("Hysteresis", size=16)
+    ax.set_ylabel("Hysteresis" if metric == 'efficiency' else f"Hysteresis ({JV_METRICS.get(metric, metric)})", size=16)
     ax.set_xticks(positions)
     ax.set_xticklabels(sorted_variations, size=14)
     ax.yaxis.set_major_locator(MaxNLocator(nbins=6, steps=[1, 2, 5, 10])) 
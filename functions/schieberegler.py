@@ -4,32 +4,28 @@ import pandas as pd
 from datetime import datetime, timedelta
 from tkinter import messagebox
 
+from functions.get_data import parse_datetime_column, DATETIME_TIMEZONE
+from functions.filter_spec import FilterSpec, FilterPreview, PARAMETER_COLUMNS, filter_best_efficiency
+
 global cycle_optimizing
 cycle_optimizing = False
 
-def parse_datetime_safe(dt_str):
-    """Parse datetime string handling both ISO format (with T) and simple format"""
-    try:
-        if 'T' in dt_str:
-            # ISO format: '2025-08-21T12:01:28+00:00'
-            # Parse and ignore timezone for local comparison
-            return pd.to_datetime(dt_str).replace(tzinfo=None)
-        else:
-            # Simple format: '2025-08-21 13:01'
-            return pd.to_datetime(dt_str)
-    except:
-        return None
-
-def filter_best_efficiency(df):  
-    # Index der Zeilen mit maximaler Effizienz je Gruppe finden
-    idx = df.groupby(['sample_id', 'variation', 'px#', 'scan_direction'])['efficiency'].idxmax()
+#cycles of the active cycle buttons, None keeps all
+selected_cycles = None
 
-    # Nur diese Zeilen behalten (Reihenfolge bleibt wie im Original-DF)
-    df_filtered = df.loc[idx].sort_index()
+#live preview of the remaining cells in the filter window
+filter_preview = None
+preview_text = None
 
-    return df_filtered
+#FilterSpec of the last main_filter call, saved with the dataset (see dataset_store)
+last_filter_spec = None
 
-def create_cycle_buttons(parent, cycles, filtered_df):
+def create_cycle_buttons(parent, cycles, filtered_df, on_change=None):
+    """
+    Buttons to switch cycles on and off and the checkbox for the best cycle (of the active cycles).
+    The state is kept per cycle, the DataFrame is not changed.
+    on_change: optional function that gets the active cycles and the state of the checkbox after every click.
+    """
     frame = ttk.Frame(parent)
     frame.pack(fill=tk.X, padx=20, pady=10)
 
@@ -37,40 +33,29 @@ def create_cycle_buttons(parent, cycles, filtered_df):
     title_label.pack(pady=5, padx=10)
 
     buttons = {}
+    active = {cycle: True for cycle in cycles}
 
     # Variable für Checkbox
     best_efficiency_var = tk.BooleanVar(value=False)
 
+    def notify():
+        if on_change is not None:
+            on_change([cycle for cycle, on in active.items() if on], best_efficiency_var.get())
+
     # Funktion zum Umschalten der Buttons
     def toggle_cycle(cycle):
-        if best_efficiency_var.get():  # Wenn Checkbox aktiv ist, kein Umschalten erlauben
-            return
+        active[cycle] = not active[cycle]  # Wechsel zwischen True/False
+        buttons[cycle]["bg"] = "green" if active[cycle] else "red"
+        notify()
 
-        if cycle not in filtered_df["Cycle#"].values:
-            print(f"Warnung: Cycle {cycle} not found in data!")
-            return
-
-        current_status = filtered_df.loc[filtered_df["Cycle#"] == cycle, "cyclefilter"]
-        if not current_status.empty:
-            new_status = not current_status.iloc[0]  # Wechsel zwischen True/False
-            filtered_df.loc[filtered_df["Cycle#"] == cycle, "cyclefilter"] = new_status
-            buttons[cycle]["bg"] = "red" if not new_status else "green"
-            #print(f"Cycle {cycle} ist jetzt {'aktiv' if new_status else 'deaktiviert'}")
-
-    # Funktion für die Checkbox
+    # Funktion für die Checkbox, der beste Zyklus wird aus den aktiven Zyklen gewählt
     def toggle_best_efficiency():
         global cycle_optimizing
-        if best_efficiency_var.get():
-            cycle_optimizing = True
-            for btn in buttons.values():
-                btn.config(bg="gray", state=tk.DISABLED)  # Buttons deaktivieren und grau färben
-        else:
-            cycle_optimizing = False
-            for cycle, btn in buttons.items():
-                btn.config(bg="green", state=tk.NORMAL)  # Buttons aktivieren und zurücksetzen
+        cycle_optimizing = best_efficiency_var.get()
+        notify()
 
     # Checkbox erstellen
-    checkbox = ttk.Checkbutton(frame, text="Only best cycle?", variable=best_efficiency_var, command=toggle_best_efficiency)
+    checkbox = ttk.Checkbutton(frame, text="Only best cycle (of the active cycles)?", variable=best_efficiency_var, command=toggle_best_efficiency)
     checkbox.pack(pady=5)
 
     # Button-Frame erstellen
@@ -84,6 +69,23 @@ def create_cycle_buttons(parent, cycles, filtered_df):
 
     return best_efficiency_var  # Checkbox-Variable zurückgeben
 
+#format of the datetime entries, the times are shown and typed in DATETIME_TIMEZONE like the parsed datetime column
+DATETIME_ENTRY_FORMAT = "%Y-%m-%d %H:%M"
+
+def slider_datetime(seconds) -> pd.Timestamp:
+    """datetime bound of a slider position (seconds since 1970), in DATETIME_TIMEZONE."""
+    return pd.Timestamp(seconds, unit='s', tz=DATETIME_TIMEZONE)
+
+def entry_datetime(text) -> pd.Timestamp:
+    """datetime bound of an entry field, the typed time is taken as DATETIME_TIMEZONE. Raises ValueError for other formats."""
+    return pd.Timestamp(datetime.strptime(text, DATETIME_ENTRY_FORMAT)).tz_localize(DATETIME_TIMEZONE)
+
+def datetime_text(value) -> str:
+    """text of a datetime bound for the entry fields, in DATETIME_TIMEZONE."""
+    timestamp = pd.Timestamp(value)
+    timestamp = timestamp.tz_convert(DATETIME_TIMEZONE) if timestamp.tz is not None else timestamp
+    return timestamp.strftime(DATETIME_ENTRY_FORMAT)
+
 # Funktion, um die Dual-Slider zu erstellen
 def create_dual_slider(parent, title, min_val, max_val, init_min, init_max, slider_id, update_df_func, first_slider):
     frame = ttk.Frame(parent)
@@ -94,7 +96,7 @@ def create_dual_slider(parent, title, min_val, max_val, init_min, init_max, slid
         separator = ttk.Separator(frame, orient="horizontal")
         separator.pack(fill=tk.X, padx=20, pady=5)
 
-    title_label = ttk.Label(frame, text=title)
+    title_label = ttk.Label(frame, text=f"{title} ({DATETIME_TIMEZONE})" if title == "Datetime" else title)
     title_label.pack(pady=5, padx=10)
 
     canvas_width = 350
@@ -139,7 +141,7 @@ def create_dual_slider(parent, title, min_val, max_val, init_min, init_max, slid
                 # Calculate new datetime value
                 ratio = (x - 10) / (canvas_width - 20)
                 new_timestamp = min_val_calc + ratio * (max_val_calc - min_val_calc)
-                new_min = datetime.fromtimestamp(new_timestamp)
+                new_min = slider_datetime(new_timestamp)
             else:
                 new_min = min_val + ((x - 10) / (canvas_width - 20)) * (max_val - min_val)
             canvas.coords(slider1, x, 10, x, 30)
@@ -153,7 +155,7 @@ def create_dual_slider(parent, title, min_val, max_val, init_min, init_max, slid
                 # Calculate new datetime value
                 ratio = (x - 10) / (canvas_width - 20)
                 new_timestamp = min_val_calc + ratio * (max_val_calc - min_val_calc)
-                new_max = datetime.fromtimestamp(new_timestamp)
+                new_max = slider_datetime(new_timestamp)
             else:
                 new_max = min_val + ((x - 10) / (canvas_width - 20)) * (max_val - min_val)
             canvas.coords(slider2, x, 10, x, 30)
@@ -167,15 +169,9 @@ def create_dual_slider(parent, title, min_val, max_val, init_min, init_max, slid
         
         # Special handling for datetime display
         if title == "Datetime":
-            # current_min and current_max are now datetime objects, not timestamps
-            if isinstance(current_min, pd.Timestamp):
-                min_date = current_min.to_pydatetime()
-                max_date = current_max.to_pydatetime()
-            else:
-                min_date = current_min
-                max_date = current_max
-            min_var.set(min_date.strftime("%Y-%m-%d %H:%M"))
-            max_var.set(max_date.strftime("%Y-%m-%d %H:%M"))
+            # current_min and current_max are datetime objects in DATETIME_TIMEZONE, not timestamps
+            min_var.set(datetime_text(current_min))
+            max_var.set(datetime_text(current_max))
         else:
             min_var.set(current_min)
             max_var.set(current_max)
@@ -184,9 +180,9 @@ def create_dual_slider(parent, title, min_val, max_val, init_min, init_max, slid
     def update_from_entry(event=None):
         try:
             if title == "Datetime":
-                # Handle datetime input - keep as datetime objects, not timestamps
-                new_min = datetime.strptime(min_var.get(), "%Y-%m-%d %H:%M")
-                new_max = datetime.strptime(max_var.get(), "%Y-%m-%d %H:%M")
+                # Handle datetime input - keep as datetime objects in DATETIME_TIMEZONE, not timestamps
+                new_min = entry_datetime(min_var.get())
+                new_max = entry_datetime(max_var.get())
                 
                 # For slider positioning, we need to convert to timestamps temporarily
                 new_min_ts = new_min.timestamp()
@@ -224,15 +220,9 @@ def create_dual_slider(parent, title, min_val, max_val, init_min, init_max, slid
 
     # Variablen für Eingabefelder
     if title == "Datetime":
-        # init_min and init_max are now datetime objects, not timestamps
-        if isinstance(init_min, pd.Timestamp):
-            init_min_date = init_min.to_pydatetime()
-            init_max_date = init_max.to_pydatetime()
-        else:
-            init_min_date = init_min
-            init_max_date = init_max
-        min_var = tk.StringVar(value=init_min_date.strftime("%Y-%m-%d %H:%M"))
-        max_var = tk.StringVar(value=init_max_date.strftime("%Y-%m-%d %H:%M"))
+        # init_min and init_max are datetime objects in DATETIME_TIMEZONE, not timestamps
+        min_var = tk.StringVar(value=datetime_text(init_min))
+        max_var = tk.StringVar(value=datetime_text(init_max))
         entry_width = 15
     else:
         min_var = tk.StringVar(value=str(init_min))
@@ -290,6 +280,12 @@ def open_sliders_window(filter_window, df_min_max_bounds, master, cycles, filter
 
     canvas.bind_all("<MouseWheel>", _on_mouse_wheel)
 
+    # Live-Vorschau: wie viele Zellen die Filter überstehen
+    global preview_text
+    preview_text = tk.StringVar(value=filter_preview.summary_text() if filter_preview is not None else "")
+    preview_label = ttk.Label(scrollable_frame, textvariable=preview_text, justify="left")
+    preview_label.pack(fill=tk.X, padx=20, pady=5)
+
     # Schieberegler erstellen
     for i, row in df_min_max_bounds.iterrows():
         # Use same function for all parameters, including datetime
@@ -309,7 +305,7 @@ def open_sliders_window(filter_window, df_min_max_bounds, master, cycles, filter
     if cycles is not None and len(cycles) > 0:
         print("Creating cycle buttons...")
         filtered_df["Cycle#"] = filtered_df["Cycle#"].astype(int)  # Erzwinge `int`-Typisierung
-        best_efficiency_var = create_cycle_buttons(scrollable_frame, cycles, filtered_df)
+        best_efficiency_var = create_cycle_buttons(scrollable_frame, cycles, filtered_df, on_change=update_preview_cycles)
     else:
         print("No cycles found or cycles is None")
         best_efficiency_var = False
@@ -352,8 +348,8 @@ def schieberegler_main(filter_window, filtered_df, master, cycles):
             # Don't convert here, just check if datetime data exists
             datetime_data = filtered_df['datetime'].dropna()
             if len(datetime_data) > 0:
-                # Convert to timezone-naive datetime objects (treat as local time)
-                datetime_series = pd.to_datetime(datetime_data)
+                # Datetime objects in get_data.DATETIME_TIMEZONE, parsed when the data was loaded
+                datetime_series = parse_datetime_column(datetime_data)
                 min_datetime_raw = datetime_series.min()
                 max_datetime_raw = datetime_series.max()
                 
@@ -386,6 +382,9 @@ def schieberegler_main(filter_window, filtered_df, master, cycles):
 
     df_min_max_self = df_min_max_bounds.copy()
 
+    global filter_preview
+    filter_preview = FilterPreview(filtered_df, FilterSpec.from_bounds(df_min_max_self))
+
     best_efficiency_var = open_sliders_window(filter_window, df_min_max_bounds, master, cycles, filtered_df)
 
     return best_efficiency_var
@@ -393,16 +392,41 @@ def schieberegler_main(filter_window, filtered_df, master, cycles):
 # Update-Funktion für den DataFrame
 def update_df_func(slider_id, param, value):
     df_min_max_self.at[slider_id, param] = value
+    update_preview(slider_id)
+
+# Vorschau nach einer Slider-Bewegung, nur die Maske dieses Parameters wird neu berechnet
+def update_preview(slider_id):
+    if filter_preview is None or preview_text is None:
+        return
+    column = PARAMETER_COLUMNS.get(df_min_max_self.at[slider_id, 'Parameter'])
+    if column is not None:
+        filter_preview.update_range(column, df_min_max_self.at[slider_id, 'Min'], df_min_max_self.at[slider_id, 'Max'])
+        preview_text.set(filter_preview.summary_text())
+
+def update_preview_cycles(cycles, best_cycle):
+    global selected_cycles
+    selected_cycles = cycles
+    if filter_preview is None or preview_text is None:
+        return
+    filter_preview.update_cycles(cycles)
+    filter_preview.update_best_cycle(best_cycle)
+    preview_text.set(filter_preview.summary_text())
 
 def main_filter(df_default_werte, master):
-    global cycle_optimizing
-    
+    global cycle_optimizing, selected_cycles, filter_preview, last_filter_spec
+    cycle_optimizing = False
+    selected_cycles = None
+    filter_preview = None
+
     filtered_df = df_default_werte.copy() #zuerst kopie definieren
-    filtered_df['cyclefilter'] = True
 
     # NaNs entfernen
     filtered_df = filtered_df.dropna(subset=['efficiency', 'fill_factor', 'open_circuit_voltage', 'short_circuit_current_density'])
 
+    if 'datetime' in filtered_df.columns:
+        # The column is parsed at load time already (get_data.parse_datetime_column), strings are parsed here once
+        filtered_df['datetime'] = parse_datetime_column(filtered_df['datetime'])
+
     filter_window = tk.Toplevel(master)
     filter_window.title("Data Filters")
     filter_window.geometry("400x800")
@@ -420,81 +444,22 @@ def main_filter(df_default_werte, master):
 
     #print("jetzt richtig?: ", cycle_optimizing)
 
-    # Apply datetime filter if datetime parameter exists
-    datetime_row = df_min_max_self[df_min_max_self["Parameter"] == "Datetime"]
-    if not datetime_row.empty and 'datetime' in filtered_df.columns:
-        try:
-            # Get datetime filter values (already datetime objects)
-            min_filter_dt = datetime_row["Min"].values[0]
-            max_filter_dt = datetime_row["Max"].values[0]
-            
-            # Convert pd.Timestamp to datetime if needed
-            if isinstance(min_filter_dt, pd.Timestamp):
-                min_filter_dt = min_filter_dt.to_pydatetime()
-                max_filter_dt = max_filter_dt.to_pydatetime()
-            
-            print(f"Datetime filter range: {min_filter_dt.strftime('%Y-%m-%d %H:%M')} to {max_filter_dt.strftime('%Y-%m-%d %H:%M')}")
-            
-            original_count = len(filtered_df)
-            
-            # Parse data datetime strings and filter using proper datetime comparison
-            filtered_df['datetime_parsed'] = filtered_df['datetime'].apply(parse_datetime_safe)
-            filtered_df = filtered_df[filtered_df['datetime_parsed'].notna()]  # Remove unparseable dates
-            
-            # Filter using datetime objects (proper semantic comparison)
-            filtered_df = filtered_df[
-                (filtered_df['datetime_parsed'] >= min_filter_dt) & 
-                (filtered_df['datetime_parsed'] <= max_filter_dt)
-            ]
-            
-            # Clean up temporary column
-            filtered_df = filtered_df.drop(columns=['datetime_parsed'])
-            
-            print(f"Datetime filter applied: {original_count} -> {len(filtered_df)} rows")
-            
-        except Exception as e:
-            print(f"Error applying datetime filter: {e}")
-
-    #filtergrößen:
-    min_pce = df_min_max_self[df_min_max_self["Parameter"] == "PCE"]["Min"].values[0]
-    max_pce = df_min_max_self[df_min_max_self["Parameter"] == "PCE"]["Max"].values[0]
-    min_ff = df_min_max_self[df_min_max_self["Parameter"] == "FF"]["Min"].values[0]
-    max_ff = df_min_max_self[df_min_max_self["Parameter"] == "FF"]["Max"].values[0]
-    min_jsc = df_min_max_self[df_min_max_self["Parameter"] == "Jsc"]["Min"].values[0]
-    max_jsc = df_min_max_self[df_min_max_self["Parameter"] == "Jsc"]["Max"].values[0]
-    min_voc = df_min_max_self[df_min_max_self["Parameter"] == "Voc"]["Min"].values[0]
-    max_voc = df_min_max_self[df_min_max_self["Parameter"] == "Voc"]["Max"].values[0]
-
-    #nach NaN filter jetzt aktiveer datenfilter
-    print(f"Before performance filters: {len(filtered_df)} rows")
-    filtered_df = filtered_df[(filtered_df['efficiency'] >= min_pce) & (filtered_df['efficiency'] <= max_pce)]
-    filtered_df = filtered_df[(filtered_df['fill_factor'] >= min_ff) & (filtered_df['fill_factor'] <= max_ff)]
-    filtered_df = filtered_df[(filtered_df['open_circuit_voltage'] >= min_voc) & (filtered_df['open_circuit_voltage'] <= max_voc)]
-    filtered_df = filtered_df[(filtered_df['short_circuit_current_density'] >= min_jsc) & (filtered_df['short_circuit_current_density'] <= max_jsc)]
-    print(f"After performance filters: {len(filtered_df)} rows")
-    
-    if 'datetime' in filtered_df.columns and len(filtered_df) > 0:
-        print(f"Datetime range after performance filters: {filtered_df['datetime'].min()} to {filtered_df['datetime'].max()}")
-    
     if filtered_df['Cycle#'].isna().all():
         cycle_optimizing = False
 
-    if cycle_optimizing:
-        print("Applying best cycle filter...")
-        print(f"Before best cycle filter: {len(filtered_df)} rows")
-        filtered_df = filter_best_efficiency(filtered_df)
-        print(f"After best cycle filter: {len(filtered_df)} rows")
-    else:
-        if filtered_df["Cycle#"].notna().all():
-            print("Applying cycle selection filter...")
-            print(f"Before cycle selection filter: {len(filtered_df)} rows")
-            filtered_df = filtered_df[filtered_df["cyclefilter"] == True]  # Nur aktive Zyklen behalten
-            print(f"After cycle selection filter: {len(filtered_df)} rows")
-    
+    # Zyklen der aktiven Buttons, nur wenn alle Messungen eine Zyklusnummer haben
+    active_cycles = selected_cycles if filtered_df["Cycle#"].notna().all() else None
+
+    # Alle Grenzen (Datetime, PCE, FF, Voc, Jsc) und die Zyklen in einer Maske, danach ggf. der beste Zyklus
+    filter_spec = FilterSpec.from_bounds(df_min_max_self, cycles=active_cycles, best_cycle=cycle_optimizing)
+    last_filter_spec = filter_spec
+    print(f"Before filters: {len(filtered_df)} rows")
+    filtered_df = filter_spec.apply(filtered_df, selector=filter_preview.selector if filter_preview is not None else None)
+    print(f"After filters{' (best cycle)' if cycle_optimizing else ''}: {len(filtered_df)} rows")
+
     if 'datetime' in filtered_df.columns and len(filtered_df) > 0:
         print(f"Final datetime range: {filtered_df['datetime'].min()} to {filtered_df['datetime'].max()}")
         
-    filtered_df = filtered_df.drop(columns=["cyclefilter"])  # Spalte entfernen, bevor DataFrame zurückgegeben wird
 
     #if the column 'Cycles#' are just Nones, the plotting function cant plot the scatter plot
     #if filtered_df["Cycle#"].isna().all():
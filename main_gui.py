@@ -1,40 +1,20 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from tkinterdnd2 import DND_FILES, TkinterDnD #drag and drop window
-import requests
-import pandas as pd 
 import os, sys
-import numpy as np
-
-if not getattr(sys, 'frozen', False):  #only import in development environment
-    from kedro.config import OmegaConfigLoader
-    from kedro.framework.project import settings
-
-from functions.get_data import get_data_excel_to_df
-from functions.calculate_statistics import calculate_statistics
-from functions.generate_report import generate_pdf_report
-from functions.generate_csv_data import generate_csv_raw_file, generate_csv_filtered_file
-from functions.schieberegler import main_filter
-from functions.freier_filter import freier_filter
-from functions.UVVis_merge_Eln import UVVis_merge
-from functions.Renaming_Measurements_and_Folders import Renaming_folders
-from functions.Create_Excel_GUI_2 import Excel_GUI
-from functions.EQE_Joshua_extern import GUI_fuer_Joshuas_EQE
-from functions.rename_JV_Daniel import measurement_file_organizer
-from functions.Tandem_Puri_JV_split import tandem_puri_jv_split
-from functions.UVVis_plotting import UVVis_plotting   
-from functions.plot_style import open_style_tool  
-from functions.latin_hypercube_sampling import latin_hypercube_sampling_gui
+import multiprocessing
+
+# The evaluation and tool modules (matplotlib, scipy, statsmodels, sympy, ...) are imported when they are used first,
+# so the window opens quickly. preload_modules loads the evaluation modules in the background afterwards.
+from functions.archive_cache import get_default_cache
 from functions.maingui_utils import ToolTip
 
-#spinner imports
-from PIL import Image, ImageTk, ImageSequence, ImageOps
 import threading
 from pathlib import Path
 
-#set default plot style - can be rewritten later with functions.plot_style
-import matplotlib as mpl
-mpl.rcParams.update({
+#default plot style - can be rewritten later with functions.plot_style. matplotlib is slow to import, so the style is
+#applied by apply_default_plot_style in the background after start or before the first task, whatever comes first
+DEFAULT_PLOT_STYLE = {
     "text.usetex": False,          
     "font.family": "sans-serif",   
     "font.sans-serif": ["Arial"],  
@@ -45,7 +25,18 @@ mpl.rcParams.update({
     "legend.fontsize": 13,
     "lines.linewidth": 1.5,
     "figure.dpi": 600,
-})
+}
+_plot_style_lock = threading.Lock()
+_plot_style_applied = False
+
+def apply_default_plot_style():
+    """sets DEFAULT_PLOT_STYLE once, later calls keep the style of the plot style tool."""
+    global _plot_style_applied
+    with _plot_style_lock:
+        if not _plot_style_applied:
+            import matplotlib as mpl
+            mpl.rcParams.update(DEFAULT_PLOT_STYLE)
+            _plot_style_applied = True
 
 # Globale Variablen für Spinner
 frames = []
@@ -64,6 +55,9 @@ token = None
 directory = None
 file_name = None
 filter_cycle_boolean = None
+filter_spec = None
+high_water = {} # high-water marks of the loaded samples, for loading only new measurements (refresh_batch_data)
+loaded_file_path = None
 nomad_url = "http://elnserver.lti.kit.edu/nomad-oasis/api/v1"
 uvvis_unit_mode = "wavelength" # default for UVVis plotting for the toggle button
 
@@ -89,6 +83,7 @@ def login_handler():
         if not username or not password:
             messagebox.showerror("Error", "Please insert name and password.")
             return
+        import requests
         try:
             response = requests.post(f"{nomad_url}/auth/token", data={"grant_type": "password", "username": username, "password": password})
             response.raise_for_status()
@@ -118,19 +113,30 @@ def handle_drop(event):
     
 def load_data():
     def task_load_data():
-        global data, filtered_data, filter_cycle_boolean
-        if not selected_file_path:
+        global data, filtered_data, filter_cycle_boolean, filter_spec, high_water, loaded_file_path
+        # the same batch again: only the measurements that were uploaded since the last load are downloaded
+        refresh = (data is not None and bool(high_water) and selected_file_path in (None, loaded_file_path)
+                   and messagebox.askyesno("Load data", "Only load the measurements that are new since the last load?"))
+        if not refresh and not selected_file_path:
             messagebox.showerror("Error", "Please choose Excel first.")
             return
         try:
             #columns to check for 'nan' strings, that are not interpreted as NaN
             cols = ["efficiency", "fill_factor", "open_circuit_voltage", "short_circuit_current_density"]
-            data = get_data_excel_to_df(selected_file_path, nomad_url, token)
+            from functions.get_data import get_data_excel_to_df, refresh_batch_data
+            if refresh:
+                data = refresh_batch_data(data, high_water, nomad_url, token, cache=get_default_cache())
+            else:
+                high_water = {}
+                data = get_data_excel_to_df(selected_file_path, nomad_url, token, cache=get_default_cache(), high_water=high_water)
+                loaded_file_path = selected_file_path
+            import numpy as np
             data[cols] = data[cols].replace('nan', np.nan)
             
             #reset values for new loaded data
             filtered_data = None
             filter_cycle_boolean = None
+            filter_spec = None
         except Exception as e:
             try:
                 root.after(0, lambda : messagebox.showerror("Error", f"Data could not be loaded: {e}"))
@@ -141,12 +147,14 @@ def load_data():
 # Daten filtern
 def filter_data():
     def task_filter_data():
-        global filtered_data, data, filter_cycle_boolean
+        global filtered_data, data, filter_cycle_boolean, filter_spec
         if data is None:
             messagebox.showerror("Error", "Please load your data first!")
             return
         try:
-            filtered_data, _, filter_cycle_boolean = main_filter(data, master=root)
+            from functions import schieberegler
+            filtered_data, _, filter_cycle_boolean = schieberegler.main_filter(data, master=root)
+            filter_spec = schieberegler.last_filter_spec
             #print(filtered_data)
             canvas.bind_all("<MouseWheel>", lambda e: canvas.yview_scroll(-1 * (e.delta // 120), "units"))  # Für Windows
         except Exception as e:
@@ -161,6 +169,7 @@ def calculate_stats():
             messagebox.showerror("Error", "Please load data first!")
             return
         try:
+            from functions.calculate_statistics import calculate_statistics
             stats, best = calculate_statistics(filtered_data if filtered_data is not None else data)
         except Exception as e:
             root.after(0, lambda : messagebox.showerror("Error", f"Calculate statistics gone wrong: {e}"))
@@ -176,6 +185,7 @@ def csv_raw_export():
         else:
             path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV-Dateien", "*.csv")])
             if path:
+                from functions.generate_csv_data import generate_csv_raw_file
                 generate_csv_raw_file(path, data)
     run_with_spinner(task_csv_raw_export)
 
@@ -188,9 +198,61 @@ def csv_filtered_export():
         else:
             path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV-Dateien", "*.csv")])
             if path:
+                from functions.generate_csv_data import generate_csv_filtered_file
                 generate_csv_filtered_file(path, filtered_data, data)
     run_with_spinner(task_csv_filtered_export)
 
+# Auswertung als Parquet-Datensatz speichern und wieder öffnen (ohne NOMAD)
+def dataset_save():
+    def task_dataset_save():
+        global data, filtered_data, stats, best, filter_spec, filter_cycle_boolean
+        if data is None:
+            root.after(0, lambda : messagebox.showerror("Error", "Please load data first!"))
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".evaldataset", filetypes=[("Evaluation dataset", "*.evaldataset")])
+        if path:
+            try:
+                from functions.dataset_store import save_dataset
+                save_dataset(path, data, filtered_data, stats, best, filter_spec, filter_cycle_boolean, high_water)
+            except Exception as e:
+                root.after(0, lambda : messagebox.showerror("Error", f"Dataset could not be saved: {e}"))
+    run_with_spinner(task_dataset_save)
+
+def dataset_open():
+    def task_dataset_open():
+        global data, filtered_data, stats, best, filter_spec, filter_cycle_boolean, high_water, selected_file_path, loaded_file_path
+        path = filedialog.askdirectory(title="Choose a saved dataset (.evaldataset folder)")
+        if path:
+            try:
+                from functions.dataset_store import load_dataset
+                dataset = load_dataset(path)
+                data, filtered_data = dataset["raw"], dataset["filtered"]
+                stats, best = dataset["stats"], dataset["best"]
+                filter_spec, filter_cycle_boolean = dataset["filter_spec"], dataset["filter_cycle_boolean"]
+                high_water, selected_file_path, loaded_file_path = dataset["high_water"], None, None
+                root.after(0, lambda : file_path_label.config(text=f"Opened dataset: {path}"))
+            except Exception as e:
+                root.after(0, lambda : messagebox.showerror("Error", f"Dataset could not be opened: {e}"))
+    run_with_spinner(task_dataset_open)
+
+# T80/T90, Burn-in und Abbaurate aller MPP-Messungen als Spalten mpp_<metric> an die Daten anhängen
+def mpp_metrics_add():
+    def task_mpp_metrics_add():
+        global data, filtered_data
+        if data is None:
+            root.after(0, lambda : messagebox.showerror("Error", "Please load data first!"))
+            return
+        try:
+            from functions.mpp_metrics import get_mpp_metrics, add_mpp_metrics
+            metrics = get_mpp_metrics(data['sample_id'], nomad_url, token, cache=get_default_cache())
+            data = add_mpp_metrics(data, metrics)
+            if filtered_data is not None:
+                filtered_data = add_mpp_metrics(filtered_data, metrics)
+            root.after(0, lambda : show_auto_close_message("MPP metrics", f"Metrics of {metrics['sample_id'].nunique()} samples with MPP tracking added."))
+        except Exception as e:
+            root.after(0, lambda e=e: messagebox.showerror("Error", f"MPP metrics could not be calculated: {e}"))
+    run_with_spinner(task_mpp_metrics_add)
+
 def set_plot_style():
     def task_set_plot_style():
         try:
@@ -202,12 +264,14 @@ def set_plot_style():
 
 def free_filter_for_halfstacks():
     def task_free_filter_for_halfstacks():
-        global filtered_data, data
+        global filtered_data, data, filter_spec
         if data is None:
             root.after(0, lambda : messagebox.showerror("Error", f"Please load your data first!: {e}"))
             return
         try:
+            from functions.freier_filter import freier_filter
             filtered_data = freier_filter(data, master=root)
+            filter_spec = None  # rows picked by hand, no spec to save
 
             #ausgabe der gefilterten daten
             #common_cols = list(data.columns.intersection(filtered_data.columns))
@@ -240,6 +304,7 @@ def UVVis_plotting_function():
         data_to_plot = filtered_data if filtered_data is not None else data
 
         try:
+            from functions.UVVis_plotting import UVVis_plotting
             UVVis_plotting(data_to_plot, file_path, nomad_url, token, unit = uvvis_unit_mode)
         except Exception as e:
             root.after(0, lambda : messagebox.showerror("Error", f"UVVis plotting gone wrong: {e}"))
@@ -261,6 +326,7 @@ def toggle_uvvis_unit():
 def merge_UVVis_files():
     def task_merge_UVVis_files():
         try:
+            from functions.UVVis_merge_Eln import UVVis_merge
             UVVis_merge(master=root)
         except:
             root.after(0, lambda : messagebox.showerror("Error", "Something went wrong with the UVVis merging."))
@@ -269,6 +335,7 @@ def merge_UVVis_files():
 def Rename_folders_and_measurements():
     def task_Rename_folders_and_measurements():
         try:
+            from functions.Renaming_Measurements_and_Folders import Renaming_folders
             Renaming_folders(master=root)
         except:
             root.after(0, lambda : messagebox.showerror("Error", "Something went wrong with the renaming."))
@@ -277,6 +344,7 @@ def Rename_folders_and_measurements():
 def excel_creator_function():
     def task_excel_creator_function():
         try:
+            from functions.Create_Excel_GUI_2 import Excel_GUI
             Excel_GUI(master=root)
         except:
             root.after(0, lambda : messagebox.showerror("Error", "Something went wrong with the Excel creator."))
@@ -285,6 +353,7 @@ def excel_creator_function():
 def EQE_Joshua():
     def task_EQE_Joshua():
         try:
+            from functions.EQE_Joshua_extern import GUI_fuer_Joshuas_EQE
             GUI_fuer_Joshuas_EQE(master=root)
         except:
             root.after(0, lambda : messagebox.showerror("Error", "Something went wrong with the EQE plotting."))
@@ -293,6 +362,7 @@ def EQE_Joshua():
 def Rename_JV_files():
     def task_Rename_JV_files():
         try:
+            from functions.rename_JV_Daniel import measurement_file_organizer
             measurement_file_organizer(master=root)
         except:
             root.after(0, lambda : messagebox.showerror("Error", "Something went wrong with the JV file renaming."))
@@ -301,6 +371,7 @@ def Rename_JV_files():
 def spilt_puri_tandem_files():
     def task_spilt_puri_tandem_files():
         try:
+            from functions.Tandem_Puri_JV_split import tandem_puri_jv_split
             tandem_puri_jv_split(master=root)
         except Exception as e:
             root.after(0, lambda : messagebox.showerror("Error", f"Something went wrong with the tandem splitting: {e}"))
@@ -309,6 +380,7 @@ def spilt_puri_tandem_files():
 def latin_hypercube_sampler():
     def task_latin_hypercube_sampler():
         try:
+            from functions.latin_hypercube_sampling import latin_hypercube_sampling_gui
             latin_hypercube_sampling_gui(master=root)
         except Exception as e:
             root.after(0, lambda : messagebox.showerror("Error", f"Something went wrong with the latin hypercube sampler: {e}"))
@@ -317,6 +389,7 @@ def latin_hypercube_sampler():
 def generate_report():
     def task_generate_report():
         global data, stats, directory, file_name, filtered_data, best, filter_cycle_boolean
+        from functions.generate_report import generate_pdf_report
 
         if data is None or stats is None:
             root.after(0, lambda : messagebox.showerror("Error", "Please load data and calculate statistics first."))
@@ -331,6 +404,7 @@ def generate_report():
             "EQE": eqe_var.get(),
             "MPP": mpp_var.get(),
             "Table": table_var.get(), 
+            "Statistics": statistics_var.get(),
             "Picture": picture_var.get(),
         }
 
@@ -339,10 +413,10 @@ def generate_report():
             return
 
         try:
-            directory, file_name = generate_pdf_report(filtered_data, stats, best, selected_plots_uebergeben, file_path, nomad_url, token, filter_cycle_boolean)
+            directory, file_name = generate_pdf_report(filtered_data, stats, best, selected_plots_uebergeben, file_path, nomad_url, token, filter_cycle_boolean, cache=get_default_cache())
         except:
             try:
-                directory, file_name = generate_pdf_report(data, stats, best, selected_plots_uebergeben, file_path, nomad_url, token,filter_cycle_boolean)
+                directory, file_name = generate_pdf_report(data, stats, best, selected_plots_uebergeben, file_path, nomad_url, token,filter_cycle_boolean, cache=get_default_cache())
             except Exception as e:
                 root.after(0, lambda : messagebox.showerror("Error", f"Failed to generate report: {e}"))
     run_with_spinner(task_generate_report)
@@ -362,335 +436,364 @@ def toggle_plot_options():
         plot_options_frame.grid_remove()  # Nur das Frame verstecken
         toggle_button.config(text="▶ Show Plot Options")  # Button bleibt sichtbar
     else:
-        plot_options_frame.grid(row=16, column=0, pady=5, sticky="n")  # Wieder anzeigen
+        plot_options_frame.grid(row=18, column=0, pady=5, sticky="n")  # Wieder anzeigen
         toggle_button.config(text="▼ Hide Plot Options")
 
 
-# Hauptfenster erstellen
-root = TkinterDnD.Tk()
-root.title("Script for NOMAD data evaluation")
-root.geometry("600x600")
-#root.iconbitmap(os.path.join(os.path.dirname(__file__), "GUI.ico"))
-
-# Spinner functions
-# get the spinner
-def resource_path(relative_path):
-    """Gibt den Pfad zur Datei zurück – kompatibel mit .exe (PyInstaller)."""
-    if hasattr(sys, '_MEIPASS'):
-        return os.path.join(sys._MEIPASS, relative_path) #in case of .exe
-    return os.path.join(os.path.abspath("."), relative_path) #in case of programming mode
-
-def init_spinner_ui(master):
-    global gif_label, status_label, frames
-
-    TARGET_SIZE = (100, 100)
-
-    try:
-        # Use project-relative giffolder path (avoid duplicating repository folder name)
-        gif_path = resource_path(os.path.join("giffolder", "spinner.gif"))
-        # Fallback: if resource_path did not locate the file (e.g. different cwd), try next to this script
-        if not os.path.exists(gif_path):
-            alt = os.path.join(os.path.dirname(__file__), "giffolder", "spinner.gif")
-            if os.path.exists(alt):
-                gif_path = alt
-        gif = Image.open(gif_path)
-        frames.clear()  # falls neu initialisiert
-
-        for frame in ImageSequence.Iterator(gif):
-            frame_resized = frame.copy().convert("RGBA").resize(TARGET_SIZE, Image.LANCZOS)
-            frames.append(ImageTk.PhotoImage(frame_resized))
-
-        gif_label.config(image=frames[0])
-    except Exception as e:
-        print("Fehler beim Laden von spinner.gif:", e)
-
-# === Spinner-Steuerung ===
-def show_spinner():
-    global animating
-    animating = True
-    status_label.config(text="Working...", style="StatusWorking.TLabel")
-    update_spinner_frame(current_frame_index)  # ✅ Starte dort, wo zuletzt aufgehört
-
-def update_spinner_frame(idx):
-    global current_frame_index
-    if not animating or not frames:
-        return
-    gif_label.config(image=frames[idx])
-    gif_label.image = frames[idx]  # Referenz halten
-    current_frame_index = idx      # 🧠 Merke den aktuellen Frame
-    root.after(100, update_spinner_frame, (idx + 1) % len(frames))
-
-def hide_spinner():
-    global animating
-    animating = False
-    status_label.config(text="Done", style="StatusReady.TLabel")
-
-# === Wrapper-Funktion für lange Aufgaben ===
-def run_with_spinner(task_function):
-    def task():
+# Lädt die Module der Auswertung im Hintergrund, nachdem das Fenster offen ist (kein Warten beim ersten Klick)
+PRELOAD_MODULES = ["functions.get_data", "functions.schieberegler", "functions.calculate_statistics", "functions.generate_report"]
+
+def preload_modules():
+    import importlib
+    apply_default_plot_style()
+    for module in PRELOAD_MODULES:
         try:
-            task_function()
+            importlib.import_module(module)
         except Exception as e:
-            messagebox.showerror("Error", str(e))
-        finally:
-            root.after(0, hide_spinner)
-    show_spinner()
-    threading.Thread(target=task, daemon=True).start()
-
-# Styling mit ttk
-style = ttk.Style()
-style.configure("TButton", font=("Arial", 10), padding=5)
-style.configure("Hover.TButton", background="lightblue")
-style.configure("TCheckbutton", font=("Arial", 10))
-style.configure("Hover.TCheckbutton", background="lightgray")
-style.configure("StatusReady.TLabel", foreground="green")
-style.configure("StatusWorking.TLabel", foreground="orange")
-
-
-# Haupt-Frame mit Scroll-Funktion
-main_frame = tk.Frame(root)
-main_frame.pack(fill=tk.BOTH, expand=True)
-
-canvas = tk.Canvas(main_frame)
-scrollbar = ttk.Scrollbar(main_frame, orient=tk.VERTICAL, command=canvas.yview)
-scrollable_frame = ttk.Frame(canvas)
-
-def update_scrollregion(event=None):
-    scrollable_frame.update_idletasks()  # Stellt sicher, dass alle Widgets gerendert wurden
-    canvas.configure(scrollregion=canvas.bbox("all"))  # Setzt die Scrollregion korrekt
-
-scrollable_frame.bind("<Configure>", update_scrollregion)
-
-
-window_id = canvas.create_window((0, 0), window=scrollable_frame, anchor="center")
-def update_canvas_size(event):
-    canvas.itemconfig(window_id, width=canvas.winfo_width())
-    update_scrollregion()  # Scrollregion erneut setzen
-
-canvas.bind("<Configure>", update_canvas_size)
-
-canvas.configure(yscrollcommand=scrollbar.set)
-canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-canvas.bind_all("<MouseWheel>", lambda e: canvas.yview_scroll(-1 * (e.delta // 120), "units"))
-
-scrollable_frame.columnconfigure(0, weight=1)
-
-# Login-Eingabe
-ttk.Label(scrollable_frame, text="NOMAD Login (name and password)", font=("Helvetica", 12, "bold")).grid(row=0, column=0, pady=5, sticky="n")
-
-username_entry = ttk.Entry(scrollable_frame, width=30)
-username_entry.grid(row=1, column=0, pady=5)
-
-password_entry = ttk.Entry(scrollable_frame, width=30, show="*")
-password_entry.grid(row=2, column=0, pady=5)
-
-# Fragezeichen für Login-Felder
-username_help = tk.Label(scrollable_frame, text="❓", fg="gray", cursor="hand2")
-username_help.grid(row=1, column=1, padx=5)
-ToolTip(username_help, "Please insert your NOMAD name or email here.")
-
-password_help = tk.Label(scrollable_frame, text="❓", fg="gray", cursor="hand2")
-password_help.grid(row=2, column=1, padx=5)
-ToolTip(password_help, "Please insert your NOMAD password here.")
-
-# Buttons mit tatsächlichen Funktionsaufrufen
-buttons_info1 = [ #buttons für die kopfzeile
-    ("Login", login_handler, "Click here to log in to the NOMAD oasis."),
-    ("Load corresponding Data from NOMAD OASIS", load_data, "Download data with the choosen Excel file.")
-]
-
-row_index = 3
-for text, command, tooltip in buttons_info1:
-    if row_index == 4:
-        row_index += 2
-    btn = ttk.Button(scrollable_frame, text=text, command=command)
-    btn.grid(row=row_index, column=0, pady=5)
-    apply_hover_effect(btn, "TButton", "Hover.TButton")
+            print(f"Preloading {module} failed: {e}")
+
+
+# The GUI is only built when the script is started, not when the report workers import it (multiprocessing spawn)
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # needed for the worker processes of the .exe (PyInstaller)
+    # Hauptfenster erstellen
+    root = TkinterDnD.Tk()
+    root.title("Script for NOMAD data evaluation")
+    root.geometry("600x600")
+    #root.iconbitmap(os.path.join(os.path.dirname(__file__), "GUI.ico"))
+
+    # Spinner functions
+    # get the spinner
+    def resource_path(relative_path):
+        """Gibt den Pfad zur Datei zurück – kompatibel mit .exe (PyInstaller)."""
+        if hasattr(sys, '_MEIPASS'):
+            return os.path.join(sys._MEIPASS, relative_path) #in case of .exe
+        return os.path.join(os.path.abspath("."), relative_path) #in case of programming mode
+
+    def init_spinner_ui(master):
+        global gif_label, status_label, frames
+        from PIL import Image, ImageTk, ImageSequence
+
+        TARGET_SIZE = (100, 100)
+
+        try:
+            # Use project-relative giffolder path (avoid duplicating repository folder name)
+            gif_path = resource_path(os.path.join("giffolder", "spinner.gif"))
+            # Fallback: if resource_path did not locate the file (e.g. different cwd), try next to this script
+            if not os.path.exists(gif_path):
+                alt = os.path.join(os.path.dirname(__file__), "giffolder", "spinner.gif")
+                if os.path.exists(alt):
+                    gif_path = alt
+            gif = Image.open(gif_path)
+            frames.clear()  # falls neu initialisiert
+
+            for frame in ImageSequence.Iterator(gif):
+                frame_resized = frame.copy().convert("RGBA").resize(TARGET_SIZE, Image.LANCZOS)
+                frames.append(ImageTk.PhotoImage(frame_resized))
+
+            gif_label.config(image=frames[0])
+        except Exception as e:
+            print("Fehler beim Laden von spinner.gif:", e)
+
+    # === Spinner-Steuerung ===
+    def show_spinner():
+        global animating
+        animating = True
+        status_label.config(text="Working...", style="StatusWorking.TLabel")
+        update_spinner_frame(current_frame_index)  # ✅ Starte dort, wo zuletzt aufgehört
+
+    def update_spinner_frame(idx):
+        global current_frame_index
+        if not animating or not frames:
+            return
+        gif_label.config(image=frames[idx])
+        gif_label.image = frames[idx]  # Referenz halten
+        current_frame_index = idx      # 🧠 Merke den aktuellen Frame
+        root.after(100, update_spinner_frame, (idx + 1) % len(frames))
+
+    def hide_spinner():
+        global animating
+        animating = False
+        status_label.config(text="Done", style="StatusReady.TLabel")
+
+    # === Wrapper-Funktion für lange Aufgaben ===
+    def run_with_spinner(task_function):
+        def task():
+            try:
+                apply_default_plot_style()
+                task_function()
+            except Exception as e:
+                messagebox.showerror("Error", str(e))
+            finally:
+                root.after(0, hide_spinner)
+        show_spinner()
+        threading.Thread(target=task, daemon=True).start()
+
+    # Styling mit ttk
+    style = ttk.Style()
+    style.configure("TButton", font=("Arial", 10), padding=5)
+    style.configure("Hover.TButton", background="lightblue")
+    style.configure("TCheckbutton", font=("Arial", 10))
+    style.configure("Hover.TCheckbutton", background="lightgray")
+    style.configure("StatusReady.TLabel", foreground="green")
+    style.configure("StatusWorking.TLabel", foreground="orange")
+
+
+    # Haupt-Frame mit Scroll-Funktion
+    main_frame = tk.Frame(root)
+    main_frame.pack(fill=tk.BOTH, expand=True)
+
+    canvas = tk.Canvas(main_frame)
+    scrollbar = ttk.Scrollbar(main_frame, orient=tk.VERTICAL, command=canvas.yview)
+    scrollable_frame = ttk.Frame(canvas)
+
+    def update_scrollregion(event=None):
+        scrollable_frame.update_idletasks()  # Stellt sicher, dass alle Widgets gerendert wurden
+        canvas.configure(scrollregion=canvas.bbox("all"))  # Setzt die Scrollregion korrekt
+
+    scrollable_frame.bind("<Configure>", update_scrollregion)
+
+
+    window_id = canvas.create_window((0, 0), window=scrollable_frame, anchor="center")
+    def update_canvas_size(event):
+        canvas.itemconfig(window_id, width=canvas.winfo_width())
+        update_scrollregion()  # Scrollregion erneut setzen
+
+    canvas.bind("<Configure>", update_canvas_size)
+
+    canvas.configure(yscrollcommand=scrollbar.set)
+    canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    canvas.bind_all("<MouseWheel>", lambda e: canvas.yview_scroll(-1 * (e.delta // 120), "units"))
+
+    scrollable_frame.columnconfigure(0, weight=1)
+
+    # Login-Eingabe
+    ttk.Label(scrollable_frame, text="NOMAD Login (name and password)", font=("Helvetica", 12, "bold")).grid(row=0, column=0, pady=5, sticky="n")
+
+    username_entry = ttk.Entry(scrollable_frame, width=30)
+    username_entry.grid(row=1, column=0, pady=5)
+
+    password_entry = ttk.Entry(scrollable_frame, width=30, show="*")
+    password_entry.grid(row=2, column=0, pady=5)
+
+    # Fragezeichen für Login-Felder
+    username_help = tk.Label(scrollable_frame, text="❓", fg="gray", cursor="hand2")
+    username_help.grid(row=1, column=1, padx=5)
+    ToolTip(username_help, "Please insert your NOMAD name or email here.")
+
+    password_help = tk.Label(scrollable_frame, text="❓", fg="gray", cursor="hand2")
+    password_help.grid(row=2, column=1, padx=5)
+    ToolTip(password_help, "Please insert your NOMAD password here.")
+
+    # Buttons mit tatsächlichen Funktionsaufrufen
+    buttons_info1 = [ #buttons für die kopfzeile
+        ("Login", login_handler, "Click here to log in to the NOMAD oasis."),
+        ("Load corresponding Data from NOMAD OASIS", load_data, "Download data with the choosen Excel file.")
+    ]
+
+    row_index = 3
+    for text, command, tooltip in buttons_info1:
+        if row_index == 4:
+            row_index += 2
+        btn = ttk.Button(scrollable_frame, text=text, command=command)
+        btn.grid(row=row_index, column=0, pady=5)
+        apply_hover_effect(btn, "TButton", "Hover.TButton")
     
-    help_label = tk.Label(scrollable_frame, text="❓", fg="gray", cursor="hand2")
-    help_label.grid(row=row_index, column=1, padx=5)
-    ToolTip(help_label, tooltip)
+        help_label = tk.Label(scrollable_frame, text="❓", fg="gray", cursor="hand2")
+        help_label.grid(row=row_index, column=1, padx=5)
+        ToolTip(help_label, tooltip)
     
-    row_index += 1
+        row_index += 1
 
-# Zeile im Grid für Button + Dropfeld
-row_index = 4  # z. B. anpassen, je nachdem wo du bist
+    # Zeile im Grid für Button + Dropfeld
+    row_index = 4  # z. B. anpassen, je nachdem wo du bist
 
-# Frame für Button + Drag-Drop
-file_frame = ttk.Frame(scrollable_frame)
-file_frame.grid(row=4, column=0, columnspan=2, pady=5, sticky="n")
+    # Frame für Button + Drag-Drop
+    file_frame = ttk.Frame(scrollable_frame)
+    file_frame.grid(row=4, column=0, columnspan=2, pady=5, sticky="n")
 
-# Button
-select_button = ttk.Button(file_frame, text="Select File", command=select_file)
-select_button.grid(row=0, column=0, padx=(0, 10))
+    # Button
+    select_button = ttk.Button(file_frame, text="Select File", command=select_file)
+    select_button.grid(row=0, column=0, padx=(0, 10))
 
-drop_label = ttk.Label(file_frame, text="⬇️ Drag & Drop Excel file", relief="ridge", padding=5)
-drop_label.grid(row=0, column=1)
+    drop_label = ttk.Label(file_frame, text="⬇️ Drag & Drop Excel file", relief="ridge", padding=5)
+    drop_label.grid(row=0, column=1)
 
-apply_hover_effect(select_button, "TButton", "Hover.TButton")
+    open_dataset_button = ttk.Button(file_frame, text="Open Dataset", command=dataset_open)
+    open_dataset_button.grid(row=0, column=2, padx=(10, 0))
+    ToolTip(open_dataset_button, "Open an evaluation saved with 'Save Dataset', no NOMAD download needed.")
 
-# Drop-Ziel registrieren
-drop_label.drop_target_register(DND_FILES)
-drop_label.dnd_bind('<<Drop>>', handle_drop)
+    apply_hover_effect(select_button, "TButton", "Hover.TButton")
+    apply_hover_effect(open_dataset_button, "TButton", "Hover.TButton")
 
-# Hilfe-Icon separat rechts
-file_help = tk.Label(scrollable_frame, text="❓", fg="gray", cursor="hand2")
-file_help.grid(row=row_index, column=1, padx=5)
-ToolTip(file_help, "Choose Excel file or drag it here.")
+    # Drop-Ziel registrieren
+    drop_label.drop_target_register(DND_FILES)
+    drop_label.dnd_bind('<<Drop>>', handle_drop)
 
+    # Hilfe-Icon separat rechts
+    file_help = tk.Label(scrollable_frame, text="❓", fg="gray", cursor="hand2")
+    file_help.grid(row=row_index, column=1, padx=5)
+    ToolTip(file_help, "Choose Excel file or drag it here.")
 
-file_path_label = ttk.Label(scrollable_frame, text="data path: ", foreground="gray")
-file_path_label.grid(row=5, column=0, pady=5)
 
-#spinner positioning
-spinner_frame = ttk.Frame(scrollable_frame)
-spinner_frame.grid(row=7, column=0, columnspan=2, pady=(5, 5), sticky="ew")
-status_label = ttk.Label(spinner_frame, text="Ready", style="StatusReady.TLabel", anchor="center")
-status_label.pack()
-gif_label = ttk.Label(spinner_frame)
-gif_label.pack()
+    file_path_label = ttk.Label(scrollable_frame, text="data path: ", foreground="gray")
+    file_path_label.grid(row=5, column=0, pady=5)
 
-init_spinner_ui(spinner_frame)
+    #spinner positioning
+    spinner_frame = ttk.Frame(scrollable_frame)
+    spinner_frame.grid(row=7, column=0, columnspan=2, pady=(5, 5), sticky="ew")
+    status_label = ttk.Label(spinner_frame, text="Ready", style="StatusReady.TLabel", anchor="center")
+    status_label.pack()
+    gif_label = ttk.Label(spinner_frame)
+    gif_label.pack()
 
+    init_spinner_ui(spinner_frame)
 
-notebook = ttk.Notebook(scrollable_frame)
-frame1 = ttk.Frame(notebook)
-frame2 = ttk.Frame(notebook)
-frame3 = ttk.Frame(notebook)
 
-for frame in [frame1, frame2, frame3]:
-    frame.columnconfigure(0, weight=1)  # zentriert  alle objekte die in den frames drin sind
+    notebook = ttk.Notebook(scrollable_frame)
+    frame1 = ttk.Frame(notebook)
+    frame2 = ttk.Frame(notebook)
+    frame3 = ttk.Frame(notebook)
 
+    for frame in [frame1, frame2, frame3]:
+        frame.columnconfigure(0, weight=1)  # zentriert  alle objekte die in den frames drin sind
 
-notebook.add(frame1, text="solar cell data evaluation")
-notebook.add(frame2, text="halfstack data evaluation")
-notebook.add(frame3, text="tools")
-notebook.grid(row=8, column=0, columnspan=2, pady=10, sticky="ew")
 
+    notebook.add(frame1, text="solar cell data evaluation")
+    notebook.add(frame2, text="halfstack data evaluation")
+    notebook.add(frame3, text="tools")
+    notebook.grid(row=8, column=0, columnspan=2, pady=10, sticky="ew")
 
-buttons_info2 = [ #buttons für das erste notebook
-    ("Filter your data", filter_data, "Filter your data if wished (optional and repeatable)."),
-    ("Calculate Statistics", calculate_stats, "Calculate the statistics of your data."),
-    ("Generate CSV (raw data)", csv_raw_export, "Export your raw data as csv (optional and repeatable)."),
-    ("Generate CSV (filtered data)", csv_filtered_export, "Export your filtered data as csv (optional and repeatable)."),
-    ("Plot style", set_plot_style, "Set the plot style (optional and repeatable)."),
-    ("Generate Report", generate_report, "Export your report with your wished plots and informations (optional and repeatable).")
-]
-
-row_index = 9
-for text, command, tooltip in buttons_info2:
-    btn = ttk.Button(frame1, text=text, command=command)
-    btn.grid(row=row_index, column=0, pady=5)
-    apply_hover_effect(btn, "TButton", "Hover.TButton")
-    
-    help_label = tk.Label(frame1, text="❓", fg="gray", cursor="hand2")
-    help_label.grid(row=row_index, column=1, padx=5)
-    ToolTip(help_label, tooltip)
-    
-    row_index += 1
 
+    buttons_info2 = [ #buttons für das erste notebook
+        ("Filter your data", filter_data, "Filter your data if wished (optional and repeatable)."),
+        ("Calculate Statistics", calculate_stats, "Calculate the statistics of your data."),
+        ("Add MPP metrics", mpp_metrics_add, "Add T80/T90, burn-in and decay rates of the MPP tracking as columns mpp_... to your data, e.g. for the free filter or the csv export (optional)."),
+        ("Generate CSV (raw data)", csv_raw_export, "Export your raw data as csv (optional and repeatable)."),
+        ("Generate CSV (filtered data)", csv_filtered_export, "Export your filtered data as csv (optional and repeatable)."),
+        ("Save Dataset", dataset_save, "Save raw data, filtered data, statistics and filter as Parquet dataset, reopen it with 'Open Dataset' (optional and repeatable)."),
+        ("Plot style", set_plot_style, "Set the plot style (optional and repeatable)."),
+        ("Generate Report", generate_report, "Export your report with your wished plots and informations (optional and repeatable).")
+    ]
 
-toggle_button = tk.Button(frame1, text="▶ Show Plot Options", command=toggle_plot_options)
-toggle_button.grid(row=15, column=0, pady=10)  # Stelle sicher, dass der Button über den Optionen bleibt
-
-apply_hover_effect(toggle_button, "TButton", "Hover.TButton")
-
-# Frame für Checkboxen (zunächst versteckt)
-plot_options_frame = tk.Frame(frame1)
-plot_options_frame.grid(row=16, column=0, pady=5, sticky="n")
-plot_options_frame.grid_remove()
-
-# Checkbox-Variablen für Plots
-jv_var = tk.BooleanVar(value=True)
-box_var = tk.BooleanVar(value=True)
-separate_scan_var = tk.BooleanVar(value=True)
-hysteresis = tk.BooleanVar(value=False)
-eqe_var = tk.BooleanVar(value=False)
-mpp_var = tk.BooleanVar(value=False)
-table_var = tk.BooleanVar(value=True)
-picture_var = tk.BooleanVar(value=False)
-
-# Checkboxen
-plot_options = [
-    ("JV Curves", jv_var, "Plots the median and best JVs for each variation."),
-    ("Box + Scatter Plots", box_var, "Plots the box and scatter plots for your batch statistics."),
-    ("Separate Backwards/Forwards", separate_scan_var, "Adds the reverse and forwards differentiation to your box and scatter plots."),
-    ("Hysteresis plot", hysteresis, "Plots the hysteresis as a box + scatter plot."),
-    ("EQE Curves", eqe_var, "Plot EQE data - of the best availabe sample for each variation"),
-    ("MPP Curves", mpp_var, "Plots the MPP tracking - of the best availabe sample for each variation"),
-    ("Data Table", table_var, "Adds a table with the most important informations to your PDF."), 
-    ("Generate pictures", picture_var, "Saves all plots as svg vector files additionally to the pdf report.")
-]
-
-for idx, (text, var, tooltip) in enumerate(plot_options):
-    check = ttk.Checkbutton(plot_options_frame, text=text, variable=var, style="TCheckbutton")
-    check.grid(row=idx, column=0, sticky="w", padx=10)
-    apply_hover_effect(check, "TCheckbutton", "Hover.TCheckbutton")
-    ToolTip(check, tooltip)
-
-#ende frame no 1
-buttons_info3 = [ #buttons für frame 2
-    ("Halfstack filter", free_filter_for_halfstacks, "Filter your data for halfstacks if wished (optional and repeatable)."), 
-    ("UVVis plotting", UVVis_plotting_function, "Plot your UVVis data with the band gaps."),
-]
-
-uvvis_toggle_button = ttk.Button(frame2, text="wavelength [nm]", command=toggle_uvvis_unit)
-uvvis_toggle_button.grid(row=row_index+2, column=0, pady=5, sticky="w")
-
-# Optional: Tooltip & Hover
-apply_hover_effect(uvvis_toggle_button, "TButton", "Hover.TButton")
-help_label = tk.Label(frame2, text="❓", fg="gray", cursor="hand2")
-help_label.grid(row=row_index, column=1, padx=5)
-ToolTip(help_label, "Toggle between wavelength [nm] and photon energy [eV].")
-
-row_index += 1
-
-for text, command, tooltip in buttons_info3:
-    btn = ttk.Button(frame2, text=text, command=command)
-    btn.grid(row=row_index, column=0, pady=5)
-    apply_hover_effect(btn, "TButton", "Hover.TButton")
+    row_index = 9
+    for text, command, tooltip in buttons_info2:
+        btn = ttk.Button(frame1, text=text, command=command)
+        btn.grid(row=row_index, column=0, pady=5)
+        apply_hover_effect(btn, "TButton", "Hover.TButton")
     
+        help_label = tk.Label(frame1, text="❓", fg="gray", cursor="hand2")
+        help_label.grid(row=row_index, column=1, padx=5)
+        ToolTip(help_label, tooltip)
+    
+        row_index += 1
+
+
+    toggle_button = tk.Button(frame1, text="▶ Show Plot Options", command=toggle_plot_options)
+    toggle_button.grid(row=17, column=0, pady=10)  # Stelle sicher, dass der Button über den Optionen bleibt
+
+    apply_hover_effect(toggle_button, "TButton", "Hover.TButton")
+
+    # Frame für Checkboxen (zunächst versteckt)
+    plot_options_frame = tk.Frame(frame1)
+    plot_options_frame.grid(row=18, column=0, pady=5, sticky="n")
+    plot_options_frame.grid_remove()
+
+    # Checkbox-Variablen für Plots
+    jv_var = tk.BooleanVar(value=True)
+    box_var = tk.BooleanVar(value=True)
+    separate_scan_var = tk.BooleanVar(value=True)
+    hysteresis = tk.BooleanVar(value=False)
+    eqe_var = tk.BooleanVar(value=False)
+    mpp_var = tk.BooleanVar(value=False)
+    table_var = tk.BooleanVar(value=True)
+    statistics_var = tk.BooleanVar(value=False)
+    picture_var = tk.BooleanVar(value=False)
+
+    # Checkboxen
+    plot_options = [
+        ("JV Curves", jv_var, "Plots the median and best JVs for each variation."),
+        ("Box + Scatter Plots", box_var, "Plots the box and scatter plots for your batch statistics."),
+        ("Separate Backwards/Forwards", separate_scan_var, "Adds the reverse and forwards differentiation to your box and scatter plots."),
+        ("Hysteresis plot", hysteresis, "Plots the hysteresis as a box + scatter plot."),
+        ("EQE Curves", eqe_var, "Plot EQE data - of the best availabe sample for each variation"),
+        ("MPP Curves", mpp_var, "Plots the MPP tracking - of the best availabe sample for each variation"),
+        ("Data Table", table_var, "Adds a table with the most important informations to your PDF."), 
+        ("Statistics tables", statistics_var, "Adds PCE, FF, Voc and Jsc statistics with confidence intervals, ANOVA and Tukey tables per variation, scan direction and cycle."),
+        ("Generate pictures", picture_var, "Saves all plots as svg vector files additionally to the pdf report.")
+    ]
+
+    for idx, (text, var, tooltip) in enumerate(plot_options):
+        check = ttk.Checkbutton(plot_options_frame, text=text, variable=var, style="TCheckbutton")
+        check.grid(row=idx, column=0, sticky="w", padx=10)
+        apply_hover_effect(check, "TCheckbutton", "Hover.TCheckbutton")
+        ToolTip(check, tooltip)
+
+    #ende frame no 1
+    buttons_info3 = [ #buttons für frame 2
+        ("Halfstack filter", free_filter_for_halfstacks, "Filter your data for halfstacks if wished (optional and repeatable)."), 
+        ("UVVis plotting", UVVis_plotting_function, "Plot your UVVis data with the band gaps."),
+    ]
+
+    uvvis_toggle_button = ttk.Button(frame2, text="wavelength [nm]", command=toggle_uvvis_unit)
+    uvvis_toggle_button.grid(row=row_index+2, column=0, pady=5, sticky="w")
+
+    # Optional: Tooltip & Hover
+    apply_hover_effect(uvvis_toggle_button, "TButton", "Hover.TButton")
     help_label = tk.Label(frame2, text="❓", fg="gray", cursor="hand2")
     help_label.grid(row=row_index, column=1, padx=5)
-    ToolTip(help_label, tooltip)
-    
+    ToolTip(help_label, "Toggle between wavelength [nm] and photon energy [eV].")
+
     row_index += 1
 
-buttons_info4 = [ #buttons für frame 3
-    ("UVVis merge", merge_UVVis_files, "Merge your UVVis R & T files."),
-    ("Old data renaming", Rename_folders_and_measurements, "Rename your folders and measurements."),
-    ("Excel creator for NOMAD", excel_creator_function, "Create an Excel file for NOMAD."),
-    ("Short EQE plotting", EQE_Joshua, "Use a short EQE plotting tool for not uploaded data."),
-    ("Rename JV files", Rename_JV_files, "Use a script to rename your JV files to the correct NOMAD format. Adds .jv to the end of the filename and changes the cycle and pixel info to be read properly"), 
-    ("Puri JV split", spilt_puri_tandem_files, "Split the Puri files to old JV format."),
-    ("Latin Hypercube Sampling", latin_hypercube_sampler, "Generate Sample configurations with LHS")
-]
-
-row_index = 1
-for text, command, tooltip in buttons_info4:
-    btn = ttk.Button(frame3, text=text, command=command)
-    btn.grid(row=row_index, column=0, pady=5)
-    apply_hover_effect(btn, "TButton", "Hover.TButton")
+    for text, command, tooltip in buttons_info3:
+        btn = ttk.Button(frame2, text=text, command=command)
+        btn.grid(row=row_index, column=0, pady=5)
+        apply_hover_effect(btn, "TButton", "Hover.TButton")
     
-    help_label = tk.Label(frame3, text="❓", fg="gray", cursor="hand2")
-    help_label.grid(row=row_index, column=1, padx=5)
-    ToolTip(help_label, tooltip)
+        help_label = tk.Label(frame2, text="❓", fg="gray", cursor="hand2")
+        help_label.grid(row=row_index, column=1, padx=5)
+        ToolTip(help_label, tooltip)
     
-    row_index += 1
+        row_index += 1
+
+    buttons_info4 = [ #buttons für frame 3
+        ("UVVis merge", merge_UVVis_files, "Merge your UVVis R & T files."),
+        ("Old data renaming", Rename_folders_and_measurements, "Rename your folders and measurements."),
+        ("Excel creator for NOMAD", excel_creator_function, "Create an Excel file for NOMAD."),
+        ("Short EQE plotting", EQE_Joshua, "Use a short EQE plotting tool for not uploaded data."),
+        ("Rename JV files", Rename_JV_files, "Use a script to rename your JV files to the correct NOMAD format. Adds .jv to the end of the filename and changes the cycle and pixel info to be read properly"), 
+        ("Puri JV split", spilt_puri_tandem_files, "Split the Puri files to old JV format."),
+        ("Latin Hypercube Sampling", latin_hypercube_sampler, "Generate Sample configurations with LHS")
+    ]
+
+    row_index = 1
+    for text, command, tooltip in buttons_info4:
+        btn = ttk.Button(frame3, text=text, command=command)
+        btn.grid(row=row_index, column=0, pady=5)
+        apply_hover_effect(btn, "TButton", "Hover.TButton")
+    
+        help_label = tk.Label(frame3, text="❓", fg="gray", cursor="hand2")
+        help_label.grid(row=row_index, column=1, padx=5)
+        ToolTip(help_label, tooltip)
+    
+        row_index += 1
+
+    #load credentials from credentials.yml in kedro conf
+    #if you are unsure how to use this, read the top-level readme in Bayesian_Optimization
+    if not getattr(sys, 'frozen', False):  #only import in development environment
+        try:
+            from kedro.config import OmegaConfigLoader
+            path_to_credentials = os.path.dirname(os.path.abspath(sys.argv[0])) + "\\Bayesian_Optimization\\bayesian-optimization\\conf"
+            conf_loader = OmegaConfigLoader(conf_source=path_to_credentials)
+            credentials = conf_loader["credentials"]
+            if 'nomad_db' in credentials:
+                username_entry.insert(0, credentials['nomad_db']['username'])
+                password_entry.insert(0, credentials['nomad_db']['password'])
+                #show_auto_close_message('Credentials loaded!', 'Credentials loaded from file.\nYou still need to press Login')
+        except Exception as e:
+            print(f"Credentials konnten nicht geladen werden: {e}")
 
-#load credentials from credentials.yml in kedro conf
-#if you are unsure how to use this, read the top-level readme in Bayesian_Optimization
-if not getattr(sys, 'frozen', False):  #only import in development environment
-    try:
-        path_to_credentials = os.path.dirname(os.path.abspath(sys.argv[0])) + "\\Bayesian_Optimization\\bayesian-optimization\\conf"
-        conf_loader = OmegaConfigLoader(conf_source=path_to_credentials)
-        credentials = conf_loader["credentials"]
-        if 'nomad_db' in credentials:
-            username_entry.insert(0, credentials['nomad_db']['username'])
-            password_entry.insert(0, credentials['nomad_db']['password'])
-            #show_auto_close_message('Credentials loaded!', 'Credentials loaded from file.\nYou still need to press Login')
-    except Exception as e:
-        print(f"Credentials konnten nicht geladen werden: {e}")
-
-root.mainloop()
\ No newline at end of file
+    root.after(500, lambda: threading.Thread(target=preload_modules, daemon=True).start())
+    root.mainloop()
\ No newline at end of file